@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware', # First, so request timings include the other middleware (removes itself when METRICS_ENABLED is off)
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -138,3 +139,72 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5500",
 ]
 
+# Response headers the frontend is allowed to read
+CORS_EXPOSE_HEADERS = [
+    "X-Next-Cursor",
+    "ETag",
+    "X-Readings-Resolution",
+]
+
+# Token -> user and sensor ownership cache (per process, set TTL to 0 to disable)
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60")) # Seconds an entry is trusted
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000")) # Max entries per cache, least recently used are dropped
+
+# Readings ingest
+READINGS_BATCH_MAX_SIZE = int(os.getenv("READINGS_BATCH_MAX_SIZE", "1000")) # Max items per batch upload
+READINGS_BULK_BATCH_SIZE = int(os.getenv("READINGS_BULK_BATCH_SIZE", "500")) # Rows per INSERT statement
+READINGS_IMPORT_CHUNK_SIZE = int(os.getenv("READINGS_IMPORT_CHUNK_SIZE", "5000")) # Rows per transaction in import_readings
+
+# Write-behind ingest: POST /readings queues the reading in a local file and answers 202,
+# the process_ingest_queue command writes the queue to the database in batches (see core/ingestqueue.py)
+INGEST_QUEUE_ENABLED = os.getenv("INGEST_QUEUE_ENABLED", "False").lower() == "true"
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", str(BASE_DIR / "data" / "ingest-queue.sqlite3")) # Shared by the web processes and the worker
+INGEST_QUEUE_MAX_SIZE = int(os.getenv("INGEST_QUEUE_MAX_SIZE", "100000")) # Queued readings before POSTs get 503
+INGEST_QUEUE_FSYNC = os.getenv("INGEST_QUEUE_FSYNC", "True").lower() == "true" # Sync the file on every POST (False: faster, a power cut can lose the last readings)
+INGEST_FLUSH_SIZE = int(os.getenv("INGEST_FLUSH_SIZE", "5000")) # Readings per worker transaction
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0")) # Seconds a reading waits at most for a full batch
+
+# Serve the sensor endpoints and the readings list/create with async views (run under an ASGI server)
+API_ASYNC = os.getenv("API_ASYNC", "False").lower() == "true"
+
+# Readings list
+READINGS_MAX_PAGE_SIZE = int(os.getenv("READINGS_MAX_PAGE_SIZE", "1000")) # Hard cap on readings per response
+READINGS_MAX_BUCKETS = int(os.getenv("READINGS_MAX_BUCKETS", "10000")) # Hard cap on buckets per aggregate response
+READINGS_ALIGNED_MAX_SENSORS = int(os.getenv("READINGS_ALIGNED_MAX_SENSORS", "50")) # Hard cap on sensors per aligned readings request
+READINGS_EXPORT_CHUNK_SIZE = int(os.getenv("READINGS_EXPORT_CHUNK_SIZE", "2000")) # Rows fetched per cursor round trip
+
+# Live reading streams (Server-Sent Events)
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000")) # Events buffered per client before it has to catch up from the database
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", "1000")) # Max readings replayed on resume, a bigger gap sends a reset event
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15")) # Keepalive comment interval
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "600")) # Streams end after this, browsers reconnect with Last-Event-ID
+SSE_RESYNC_SECONDS = float(os.getenv("SSE_RESYNC_SECONDS", "0")) # Also check the database this often, for writes made by other processes (0 = never)
+
+# Readings storage
+READINGS_RETENTION_MONTHS = int(os.getenv("READINGS_RETENTION_MONTHS", "0")) # Keep raw readings this many months, 0 keeps them forever
+READINGS_PARTITIONS_AHEAD = int(os.getenv("READINGS_PARTITIONS_AHEAD", "3")) # Monthly partitions created ahead of time
+READINGS_ARCHIVE_DIR = os.getenv("READINGS_ARCHIVE_DIR", "") # Expired readings are saved here as CSV before removal, empty disables
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "5000")) # Readings of a deleted sensor removed per transaction by purge_deleted_sensors
+READINGS_COMPACTION = os.getenv("READINGS_COMPACTION", "") # e.g. "30d:5m,365d:1h": 5-minute averages after 30 days, hourly after a year; empty keeps raw readings
+READINGS_COMPACTION_DAYS = int(os.getenv("READINGS_COMPACTION_DAYS", "1")) # Days compacted per sensor and step in one compact_readings run
+
+# Anomaly scoring of new readings (see core/anomalies.py)
+ANOMALY_DETECTION_ENABLED = os.getenv("ANOMALY_DETECTION_ENABLED", "True").lower() == "true" # Score readings as they are written, one more query per write
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05")) # Weight of a new reading in the moving average, about 1/ALPHA readings of memory
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "4")) # Standard deviations from the average that count as an anomaly
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "30")) # Readings a sensor needs before its readings are scored
+
+# Django cache, used for readings query results. The default is a memory cache per process; for one
+# shared by all workers set e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://redis:6379/1 (needs the redis package)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+READINGS_CACHE_TTL = int(os.getenv("READINGS_CACHE_TTL", "300")) # Seconds a cached readings query is kept, 0 disables the cache
+
+# Request metrics in Prometheus format at /api/metrics (per process, see core/metrics.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "") # Bearer token for the scraper; staff users' tokens work too, empty allows staff only
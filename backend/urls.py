@@ -15,14 +15,21 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # Main URL configuration for the Django project with admin and API routes
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from ninja import NinjaAPI # NinjaAPI instance that will handle API endpoints
 from core.api import router as core_router # import router
 from core.api import readings_router
 from core.auth import router as auth_router
+from core.fastjson import ORJSONRenderer
 
-api = NinjaAPI()
+api = NinjaAPI(renderer=ORJSONRenderer()) # orjson instead of json.dumps for all responses
+if settings.API_ASYNC:
+    # Mounted first so they answer their URLs, the other endpoints still come from the sync routers
+    from core.api_async import router as core_async_router, readings_router as readings_async_router
+    api.add_router("/", core_async_router)
+    api.add_router("/", readings_async_router)
 api.add_router("/", core_router) # Sensors endpoint
 api.add_router("/auth", auth_router) # Auth endpoint
 api.add_router("/", readings_router) # Readings endpoint
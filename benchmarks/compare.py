@@ -0,0 +1,65 @@
+# Compares two result files of benchmarks/suite.py and flags regressions.
+# A benchmark regresses when its p50 latency grows by more than --threshold (and by more than
+# --min-ms, so sub-millisecond noise doesn't count) or when it runs more queries than before.
+# Exits with status 1 when something regressed, so it can gate CI.
+#
+# Run with:
+#   python benchmarks/compare.py benchmarks/results/old.json benchmarks/results/new.json
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Returns rows of (name, old stats, new stats, change, regressed) for benchmarks in both files
+def compare(old, new, threshold, min_ms):
+    rows = []
+    for name, after in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            continue
+        change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] > 0 else 0.0
+        slower = change > threshold and after["p50_ms"] - before["p50_ms"] > min_ms
+        more_queries = after["queries"] > before["queries"]
+        rows.append((name, before, after, change, slower or more_queries))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown, 0.2 = 20 %%")
+    parser.add_argument("--min-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    for label, report in (("old", old), ("new", new)):
+        meta = report["meta"]
+        print(f"{label}: {meta.get('commit') or '?'} {meta['database']} {meta['created']}")
+    if old["meta"].get("options") != new["meta"].get("options"):
+        print("warning: the runs used different options, sizes may not match")
+
+    rows = compare(old, new, args.threshold, args.min_ms)
+    print(f"\n{'benchmark':<45} {'old p50':>10} {'new p50':>10} {'change':>8} {'queries':>9}")
+    for name, before, after, change, regressed in rows:
+        queries = f"{before['queries']}->{after['queries']}"
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<45} {before['p50_ms']:>10.3f} {after['p50_ms']:>10.3f} {change:>+8.1%} {queries:>9}{flag}")
+
+    missing = sorted(set(old["results"]) ^ set(new["results"]))
+    if missing:
+        print(f"\nOnly in one of the files: {', '.join(missing)}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s)")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Load test for comparing the sync (WSGI / runserver) and async (ASGI / uvicorn) modes.
+# Opens N concurrent keep-alive connections that each send requests back to back for a while,
+# then prints requests/s and latency percentiles per concurrency level.
+# Only needs the standard library, so it runs outside the container too.
+#
+# Run with:
+#   python benchmarks/concurrency.py --url http://localhost:8000 --token <token> --sensor 1 --connections 1 10 50 100
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status
+
+
+# One client: a keep-alive connection sending requests until `deadline`, think_time seconds apart
+async def _client(host, port, request, deadline, think_time, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+        if think_time:
+            await asyncio.sleep(think_time)
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(url, token, connections, duration, think_time):
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = (
+        f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"Authorization: Bearer {token}\r\nConnection: keep-alive\r\n\r\n"
+    ).encode()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(parts.hostname, parts.port or 80, request, deadline, think_time, latencies, errors)
+        for _ in range(connections)
+    ])
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies) or [0.0]
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "connections": connections,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(pick(0.50), 1),
+        "p95_ms": round(pick(0.95), 1),
+        "p99_ms": round(pick(0.99), 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--token", required=True, help="API token of the sensor owner")
+    parser.add_argument("--sensor", type=int, required=True, help="Sensor id to read")
+    parser.add_argument("--path", default="/api/sensors/{sensor}/readings?limit=100", help="Request path")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=0, help="Pause between requests of one client")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + args.path.format(sensor=args.sensor)
+    results = [
+        asyncio.run(run_level(url, args.token, n, args.duration, args.think_time)) for n in args.connections
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'conns':>6} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(
+            f"{r['connections']:>6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
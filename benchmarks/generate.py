@@ -0,0 +1,73 @@
+# Synthetic readings in the layout of sensor_readings_wide.csv (timestamp, device_id, temperature, humidity).
+# Every device gets one reading per interval: a daily temperature cycle around its own base value
+# plus a slow random walk and noise, and humidity around 45 % that moves against the temperature.
+# Rows are grouped by device like the seed file, and the same seed always gives the same file.
+#
+# Run with:
+#   python benchmarks/generate.py --sensors 50 --readings 20000 --out /tmp/readings.csv
+import argparse
+import csv
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+FIELDS = ("timestamp", "device_id", "temperature", "humidity")
+
+
+def device_name(index, prefix="device"):
+    return f"{prefix}-{index + 1:03d}"
+
+
+# Yields (timestamp, device_id, temperature, humidity) for `sensors` devices with `readings` rows each.
+# missing_humidity is the share of rows without a humidity value.
+def generate_rows(sensors, readings, start=START, interval=60, seed=1, prefix="device", missing_humidity=0.0):
+    rng = random.Random(seed)
+    step = timedelta(seconds=interval)
+    for index in range(sensors):
+        name = device_name(index, prefix)
+        base = rng.uniform(19.5, 24.0)
+        walk = 0.0
+        for i in range(readings):
+            ts = start + i * step
+            day = (ts.hour * 3600 + ts.minute * 60 + ts.second) / 86400
+            walk = max(-1.5, min(1.5, walk + rng.gauss(0, 0.03)))
+            temperature = base + 1.2 * math.sin(2 * math.pi * (day - 0.3)) + walk + rng.gauss(0, 0.15)
+            if rng.random() < missing_humidity:
+                humidity = None
+            else:
+                humidity = min(100.0, max(0.0, 45.5 - 0.8 * (temperature - base) + rng.gauss(0, 0.7)))
+            yield ts, name, round(temperature, 2), None if humidity is None else round(humidity, 2)
+
+
+def write_csv(path, rows):
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for ts, name, temperature, humidity in rows:
+            writer.writerow((ts.isoformat(sep=" "), name, temperature, "" if humidity is None else humidity))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic readings CSV")
+    parser.add_argument("--sensors", type=int, default=5, help="Number of devices")
+    parser.add_argument("--readings", type=int, default=1000, help="Readings per device")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between readings of a device")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefix", default="device", help="Device names are <prefix>-001, <prefix>-002, ...")
+    parser.add_argument("--missing-humidity", type=float, default=0.0, help="Share of rows without humidity")
+    parser.add_argument("--out", required=True, help="CSV file to write")
+    args = parser.parse_args()
+
+    rows = generate_rows(
+        args.sensors, args.readings, interval=args.interval, seed=args.seed,
+        prefix=args.prefix, missing_humidity=args.missing_humidity,
+    )
+    print(f"{write_csv(args.out, rows)} rows written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Benchmark suite for the API, run in-process with Django's test client against a fresh test database
+# (created like the test runner does, on whatever DATABASES points at, and dropped afterwards).
+# Measures ingest throughput, readings list latency at several table sizes, the sensor list with
+# search, and token auth overhead, and counts database queries per request. Results go to a JSON
+# file; compare two of them with benchmarks/compare.py to spot regressions between commits.
+#
+# Run with:
+#   python benchmarks/suite.py --out benchmarks/results/$(git rev-parse --short HEAD).json
+#   python benchmarks/suite.py --quick   (small sizes, for a smoke run)
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from core import authcache  # noqa: E402
+from core.importer import import_file  # noqa: E402
+from core.models import Sensor  # noqa: E402
+from generate import START, generate_rows, write_csv  # noqa: E402
+
+
+# Runs call() `repeat` times after `warmup` untimed runs. before() runs ahead of every call, untimed.
+# Returns latency percentiles in milliseconds and the usual number of queries per call.
+# The garbage collector only runs between calls, so its pauses don't land in random samples.
+def measure(call, repeat, warmup=3, before=None):
+    for _ in range(warmup):
+        if before:
+            before()
+        _check(call())
+    times, queries = [], []
+    for _ in range(repeat):
+        if before:
+            before()
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = call()
+                times.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+        _check(response)
+        queries.append(len(captured.captured_queries))
+    return summarize(times, queries)
+
+
+def summarize(times, queries):
+    ordered = sorted(times)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "runs": len(ordered),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "queries": statistics.mode(queries),
+    }
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"Benchmark request failed with {response.status_code}: {response.content[:200]!r}")
+
+
+def _user(name):
+    user = User.objects.create_user(username=name, password="bench")
+    return user, Token.objects.create(user=user).key
+
+
+def _client(key):
+    return Client(HTTP_AUTHORIZATION=f"Bearer {key}")
+
+
+def _post_json(client, url, data):
+    return client.post(url, data=json.dumps(data), content_type="application/json")
+
+
+# Single POSTs and batch uploads into one sensor each
+def bench_ingest(results, args):
+    user, key = _user("bench-ingest")
+    client = _client(key)
+    sensor = Sensor.objects.create(name="ingest-single", type="Bench", owner=user)
+    url = f"/api/sensors/{sensor.id}/readings"
+    rows = iter(generate_rows(1, args.single + 10, seed=2))
+
+    def post_one():
+        ts, _, temperature, humidity = next(rows)
+        return _post_json(client, url, {"timestamp": ts.isoformat(), "temperature": temperature, "humidity": humidity})
+
+    stats = measure(post_one, args.single)
+    stats["rows_per_s"] = round(1000 / stats["mean_ms"], 1)
+    results["ingest_single"] = stats
+
+    sensor = Sensor.objects.create(name="ingest-batch", type="Bench", owner=user)
+    url = f"/api/sensors/{sensor.id}/readings/batch"
+    rows = iter(generate_rows(1, args.batch_size * (args.batches + 3), seed=3))
+
+    def post_batch():
+        batch = []
+        for _ in range(args.batch_size):
+            ts, _, temperature, humidity = next(rows)
+            batch.append({"timestamp": ts.isoformat(), "temperature": temperature, "humidity": humidity})
+        return _post_json(client, url, batch)
+
+    stats = measure(post_batch, args.batches)
+    stats["batch_size"] = args.batch_size
+    stats["rows_per_s"] = round(args.batch_size * 1000 / stats["mean_ms"], 1)
+    results["ingest_batch"] = stats
+
+
+# Readings list of one sensor holding `size` readings: first page, a one hour window, a full page
+# and a repeated (cached) request. Readings are loaded with the bulk importer.
+def bench_list_readings(results, args):
+    user, key = _user("bench-readings")
+    client = _client(key)
+    for size in args.sizes:
+        prefix = f"readings{size}"
+        with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+            write_csv(f.name, generate_rows(1, size, seed=size, prefix=prefix, missing_humidity=0.05))
+            import_file(f.name, user, sensor_type="Bench")
+        sensor = Sensor.objects.get(owner=user, name=f"{prefix}-001")
+        url = f"/api/sensors/{sensor.id}/readings"
+        middle = START + timedelta(minutes=size // 2)
+        window = f"?timestamp_from={middle.isoformat()}&timestamp_to={(middle + timedelta(hours=1)).isoformat()}"
+        window = window.replace("+", "%2B")
+
+        with override_settings(READINGS_CACHE_TTL=0):
+            results[f"list_readings_first_page[{size}]"] = measure(lambda: client.get(url + "?limit=100"), args.repeat)
+            results[f"list_readings_window_1h[{size}]"] = measure(lambda: client.get(url + window), args.repeat)
+            results[f"list_readings_full_page[{size}]"] = measure(lambda: client.get(url), args.repeat)
+        results[f"list_readings_cached[{size}]"] = measure(lambda: client.get(url + "?limit=100"), args.repeat)
+
+
+# Sensor list of a user with many sensors, page mode and cursor mode, with and without search
+def bench_list_sensors(results, args):
+    user, key = _user("bench-sensors")
+    client = _client(key)
+    Sensor.objects.bulk_create(
+        [Sensor(name=f"room-{i:05d}", type="Env" if i % 2 else "Air", owner=user) for i in range(args.sensors)],
+        batch_size=1000,
+    )
+    last_page = max(1, (args.sensors + 9) // 10)
+    search = "room-0001" # Prefix of ten sensors
+    cases = {
+        "list_sensors_page_first": "/api/sensors",
+        "list_sensors_page_last": f"/api/sensors?page={last_page}",
+        "list_sensors_cursor_first": "/api/sensors?cursor=",
+        "list_sensors_search_page": f"/api/sensors?q={search}",
+        "list_sensors_search_cursor": f"/api/sensors?q={search}&cursor=",
+        "sensors_summary": "/api/sensors/summary",
+    }
+    for name, url in cases.items():
+        results[f"{name}[{args.sensors}]"] = measure(lambda: client.get(url), args.repeat)
+
+
+# A cheap authenticated request with the token cache warm, and with it emptied before every request
+def bench_auth(results, args):
+    user, key = _user("bench-auth")
+    client = _client(key)
+    sensor = Sensor.objects.create(name="auth", type="Bench", owner=user)
+    url = f"/api/sensors/{sensor.id}"
+    warm = measure(lambda: client.get(url), args.repeat)
+    cold = measure(lambda: client.get(url), args.repeat, before=authcache.clear)
+    results["auth_cached"] = warm
+    results["auth_uncached"] = cold
+    results["auth_overhead"] = {
+        "p50_ms": round(cold["p50_ms"] - warm["p50_ms"], 3),
+        "queries": cold["queries"] - warm["queries"],
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Amounts of a full run and of a --quick run
+FULL_DEFAULTS = {"sizes": [1000, 10000, 100000], "sensors": 2000, "single": 300, "batches": 10, "repeat": 50}
+QUICK_DEFAULTS = {"sizes": [1000, 5000], "sensors": 200, "single": 30, "batches": 3, "repeat": 10}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the API benchmarks and writes the results as JSON")
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results", "latest.json"))
+    # Amounts default to None so --quick only fills in the ones not given on the command line
+    parser.add_argument("--sizes", type=int, nargs="+", help="Readings per sensor (default 1000 10000 100000)")
+    parser.add_argument("--sensors", type=int, help="Sensors of the sensor list user (default 2000)")
+    parser.add_argument("--single", type=int, help="Single reading POSTs (default 300)")
+    parser.add_argument("--batches", type=int, help="Batch uploads (default 10)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, help="Timed requests per read benchmark (default 50)")
+    parser.add_argument("--quick", action="store_true", help="Small sizes and few repeats, for a smoke run")
+    parser.add_argument("--keepdb", action="store_true", help="Reuse the test database (it must be empty)")
+    args = parser.parse_args()
+    for name, value in (QUICK_DEFAULTS if args.quick else FULL_DEFAULTS).items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    results = {}
+    try:
+        for bench in (bench_ingest, bench_list_readings, bench_list_sensors, bench_auth):
+            started = time.perf_counter()
+            authcache.clear()
+            bench(results, args)
+            print(f"{bench.__name__}: {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "machine": platform.machine(),
+            "options": {k: v for k, v in vars(args).items() if k not in ("out", "keepdb")},
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, stats in results.items():
+        print(f"{name:<45} p50 {stats['p50_ms']:>9.3f} ms  queries {stats['queries']}")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
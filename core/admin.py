@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Sensor, Reading
+from .models import Anomaly, Sensor, Reading
 
 # Make Sensor & Reading models visible in the admin page
 admin.site.register(Sensor)
 admin.site.register(Reading)
+admin.site.register(Anomaly)
@@ -0,0 +1,76 @@
+# Readings of several sensors resampled onto one shared time grid, for comparing sensors.
+# The grid has one slot per bucket of `size` seconds from the bucket of dt_from to the bucket of dt_to,
+# aligned to the epoch like the aggregates. All sensors' buckets come from one grouped query
+# (rollups.aggregate_sensors, so whole-hour grids read the rollups); each slot holds the average
+# temperature and humidity of the sensor's readings in it, or None when it has none.
+# Alignment is index arithmetic on the bucket epoch, no per-timestamp matching between sensors.
+import csv
+import io
+from . import rollups
+from .columnar import encode_frame
+from .export import CSV_HEADER
+from .timeseries import bucket_start
+
+FORMATS = ("json", "csv", "columnar")
+
+
+# Bucket epochs of the grid, as a range
+def grid(size, dt_from, dt_to):
+    first = int(dt_from.timestamp()) // size * size
+    last = int(dt_to.timestamp()) // size * size
+    return range(first, last + size, size)
+
+
+# Returns (grid epochs, {sensor id: (temperatures, humidities)}) with one value or None per grid slot
+def align(sensor_ids, size, dt_from, dt_to):
+    epochs = grid(size, dt_from, dt_to)
+    buckets = rollups.aggregate_sensors(sensor_ids, size, dt_from, dt_to)
+    series = {}
+    for sensor_id in sensor_ids:
+        temperatures = [None] * len(epochs)
+        humidities = [None] * len(epochs)
+        for epoch, stats in buckets.get(sensor_id, {}).items():
+            slot = (epoch - epochs.start) // size
+            temperatures[slot] = stats["temperature_sum"] / stats["count"]
+            if stats["humidity_count"]:
+                humidities[slot] = stats["humidity_sum"] / stats["humidity_count"]
+        series[sensor_id] = (temperatures, humidities)
+    return epochs, series
+
+
+# JSON body: the grid once, then the values of every sensor in the requested order
+def as_json(size, epochs, series, names):
+    return {
+        "bucket_seconds": size,
+        "timestamps": [bucket_start(epoch) for epoch in epochs],
+        "sensors": [
+            {"sensor_id": sensor_id, "device_id": names[sensor_id], "temperature": temperatures, "humidity": humidities}
+            for sensor_id, (temperatures, humidities) in series.items()
+        ],
+    }
+
+
+# CSV in the columns of sensor_readings_wide.csv, one row per grid slot and sensor, time first.
+# Empty temperature and humidity where a sensor has no readings in the slot.
+def as_csv(epochs, series, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    for slot, epoch in enumerate(epochs):
+        timestamp = bucket_start(epoch)
+        for sensor_id, (temperatures, humidities) in series.items():
+            temperature, humidity = temperatures[slot], humidities[slot]
+            writer.writerow((timestamp, names[sensor_id], "" if temperature is None else temperature,
+                             "" if humidity is None else humidity))
+    return buffer.getvalue()
+
+
+# One columnar frame per sensor in the requested order, all with the grid as timestamps.
+# Temperature is NaN in slots without readings, humidity is null there (mask bit set).
+def as_columnar(epochs, series):
+    timestamps = [bucket_start(epoch) for epoch in epochs]
+    nan = float("nan")
+    return b"".join(
+        encode_frame(list(zip(timestamps, [nan if t is None else t for t in temperatures], humidities)))
+        for temperatures, humidities in series.values()
+    )
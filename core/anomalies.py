@@ -0,0 +1,72 @@
+# Anomaly scoring of readings as they are written. Every sensor keeps an exponentially weighted moving
+# average and variance per field in Sensor.anomaly_state, three floats each, and every new reading is
+# scored against them and then folded in. It runs in ingest.record_written, so single posts, batches,
+# gateway uploads, the ingest queue and imports are all scored, with one locked read of the sensor row
+# per write; the new state goes out with the snapshot UPDATE that record_written does anyway.
+# A reading more than ANOMALY_THRESHOLD standard deviations from the average is stored as an Anomaly,
+# so "anomalies since t" is a range scan of its timestamp index instead of a pass over the readings.
+# Late readings (older than the newest one folded in) are scored but don't move the average.
+import math
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from .models import Anomaly, Sensor
+
+FIELDS = ("temperature", "humidity")
+MIN_STDDEV = 0.05  # Floor of the standard deviation, so a flat signal doesn't flag its first small change
+
+
+# EWMA mean and variance after one more value (incremental form, no history needed)
+def fold(stats, value, alpha):
+    if stats is None:
+        return [value, 0.0, 1]
+    mean, variance, count = stats
+    diff = value - mean
+    increment = alpha * diff
+    return [mean + increment, (1 - alpha) * (variance + diff * increment), count + 1]
+
+
+# Standard deviations between value and the average, None while the sensor is warming up
+def zscore(stats, value):
+    if stats is None or stats[2] < settings.ANOMALY_WARMUP:
+        return None
+    mean, variance, _ = stats
+    return (value - mean) / max(math.sqrt(variance), MIN_STDDEV)
+
+
+# Naive timestamps are taken in the default time zone, as the database stores them
+def _aware(timestamp):
+    return timezone.make_aware(timestamp) if timezone.is_naive(timestamp) else timestamp
+
+
+# Scores newly inserted readings of a sensor, stores the anomalies among them and returns the new
+# anomaly_state for the sensor's UPDATE. Call it inside the insert transaction: the row lock keeps
+# two writers of the same sensor from folding into the same old state.
+def score(sensor_id, readings):
+    state = Sensor.all_objects.select_for_update().filter(pk=sensor_id).values_list("anomaly_state", flat=True).first()
+    state = dict(state or {})
+    until = _aware(datetime.fromisoformat(state["until"])) if state.get("until") else None
+    alpha = settings.ANOMALY_ALPHA
+
+    anomalies = []
+    for reading in sorted(readings, key=lambda r: _aware(r.timestamp)):
+        late = until is not None and _aware(reading.timestamp) <= until
+        for field in FIELDS:
+            value = getattr(reading, field)
+            if value is None:
+                continue
+            stats = state.get(field)
+            z = zscore(stats, value)
+            if z is not None and abs(z) > settings.ANOMALY_THRESHOLD:
+                anomalies.append(Anomaly(
+                    sensor_id=sensor_id, timestamp=reading.timestamp, field=field, value=value, expected=stats[0], score=z,
+                ))
+            if not late:
+                state[field] = fold(stats, value, alpha)
+        if not late:
+            until = _aware(reading.timestamp)
+    if until is not None:
+        state["until"] = until.isoformat()
+
+    Anomaly.objects.bulk_create(anomalies, batch_size=settings.READINGS_BULK_BATCH_SIZE)
+    return state
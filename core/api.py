@@ -1,66 +1,527 @@
 # Router file for the core app
+import math
 from ninja import Router
-from .models import Sensor, Reading
+from .models import Anomaly, Sensor, Reading
 from django.db import IntegrityError
 from typing import List
-from .schemas import SensorCreate, SensorOut, ReadingCreate, ReadingOut
-from ninja.security import HttpBearer
-from rest_framework.authtoken.models import Token
-from django.db.models import Q # Filtering with multiple fields
+from .schemas import SensorCreate, SensorOut, SensorSummaryOut, PagedSensorOut, ReadingCreate, ReadingOut, ReadingBatchOut, ReadingAggregateOut, ReadingStatsOut, AlignedReadingsOut, AnomalyOut, DeviceBatchOut, DeviceReadingCreate
+from ninja.security import APIKeyQuery, HttpBearer
+from django.db.models import Count, Max, Q # Filtering with multiple fields
 from typing import Optional
-from ninja.pagination import paginate, PageNumberPagination 
-from django.shortcuts import get_object_or_404
+from ninja import Query
+from ninja.pagination import PageNumberPagination
+from django.http import Http404
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from ninja.responses import Response
+from datetime import timedelta
+from django.http import HttpResponse, StreamingHttpResponse
+from ninja import Body
+from typing import Any
+from django.conf import settings
+from .ingest import ingest_batch, ingest_by_device, check_humidity, write_one, SensorDeleted, CREATED, DUPLICATE, INVALID
+from .pagination import encode_cursor, decode_cursor, encode_id_cursor, decode_id_cursor
+from .timeseries import lttb, parse_bucket
+from . import aligned, authcache, compaction, ingestqueue, metrics, purge, respcache, rollups, streams
+from .pubsub import sensor_topic, user_topic
+from .export import EXPORT_FORMATS
+from .columnar import CONTENT_TYPE as COLUMNAR_TYPE, encode_frame, wants_columnar
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from .fastjson import Response, json_response, rows_as_dicts, rows_response, schema_fields
+from .conditional import make_etag, not_modified, with_validators
+from .search import search_sensors
+from .stats import window_stats
+
+# Output fields in schema order, fetched with values_list by the fast list endpoints
+READING_FIELDS = schema_fields(ReadingOut)
+ANOMALY_FIELDS = schema_fields(AnomalyOut)
+SENSOR_FIELDS = schema_fields(SensorOut)
+SUMMARY_FIELDS = schema_fields(SensorSummaryOut)
+COLUMNAR_FIELDS = ("id", "timestamp", "temperature", "humidity") # Column order of encode_frame(with_ids=True)
+SENSORS_PAGE_SIZE = 10
+SENSORS_MAX_PAGE_SIZE = 100 # Cap on limit in cursor mode
 
 # Checks if the token belongs to a real user
 class TokenAuth(HttpBearer):
     def authenticate(self, request, token): # Runs when someone sends a request with a token
-        try:
-            user = Token.objects.get(key=token).user
-            return user # If correct token return the user
-        except Token.DoesNotExist:
-            return None
+        return authcache.user_for_token(token) # The user if the token is correct, otherwise None
+
+# Token in the query string (?token=...), for EventSource which can't send headers
+class QueryTokenAuth(APIKeyQuery):
+    param_name = "token"
+
+    def authenticate(self, request, key):
+        return authcache.user_for_token(key)
+
+# Accepts METRICS_TOKEN (for the Prometheus scraper) or the token of a staff user
+class MetricsAuth(HttpBearer):
+    def authenticate(self, request, token):
+        if settings.METRICS_TOKEN and constant_time_compare(token, settings.METRICS_TOKEN):
+            return True
+        user = authcache.user_for_token(token)
+        return user if user is not None and user.is_staff else None
 
 # Create a router to handle API endpoints related to sensors
 router = Router()
 # Router for all reading endpoints
 readings_router = Router(auth=TokenAuth())
 
-# Readings list (paginated and optional filter)
-@readings_router.get("/sensors/{sensor_id}/readings", response=List[ReadingOut])
-def list_readings(
-    request,
-    sensor_id: int,
-    timestamp_from: Optional[str] = None,
-    timestamp_to: Optional[str] = None,
-):
-    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
-    readings = Reading.objects.filter(sensor=sensor)
+# Get one sensor owned by user. A cached sensor is checked for a delete in another process unless
+# the endpoint finds that out anyway: from the _readings_state row it reads, or from SensorDeleted on writes.
+def _get_owned_sensor(user, sensor_id: int, verify=True):
+    sensor = authcache.owned_sensor(user, sensor_id, verify=verify)
+
+    # Return 404 if not found or not owned by user
+    if sensor is None:
+        raise Http404("No Sensor matches the given query.")
+    return sensor
+
+# Apply optional ISO 8601 timestamp_from / timestamp_to filters to a readings queryset.
+# Returns (queryset, None) or (None, 400 response) when a timestamp can't be parsed.
+def _filter_by_time(readings, timestamp_from, timestamp_to):
     if timestamp_from:
         dt_from = parse_datetime(timestamp_from)
         if not dt_from:
-            return Response({"detail": "Invalid timestamp_from (use ISO 8601)"}, status=400)
+            return None, Response({"detail": "Invalid timestamp_from (use ISO 8601)"}, status=400)
         readings = readings.filter(timestamp__gte=dt_from)
 
     if timestamp_to:
         dt_to = parse_datetime(timestamp_to)
         if not dt_to:
-            return Response({"detail": "Invalid timestamp_to (use ISO 8601)"}, status=400)
+            return None, Response({"detail": "Invalid timestamp_to (use ISO 8601)"}, status=400)
         readings = readings.filter(timestamp__lte=dt_to)
 
-    return readings.order_by("-timestamp")
+    return readings, None
 
-# Endpoint to get a list of all sensors from the database
-@router.get("/sensors", response=List[SensorOut], auth=TokenAuth()) # Requires valid endpoint to access this endpoint
-@paginate(PageNumberPagination, page_size=10) # Splits results to pages
-def list_sensors(request, q: Optional[str]= None):
-    sensors = Sensor.objects.filter(owner=request.auth) # Only show sensors that belongs to logged-in user
-    if q:
-        sensors = sensors.filter( # Filter sensors by name or type
-            Q(name__icontains=q) | Q(type__icontains=q)
+# Builds the query for one page of readings (newest first) with filters and keyset cursor.
+# Returns (rows queryset, page_size, None) or (None, None, 400 response); no query runs here,
+# so the sync and async views can evaluate it their own way.
+def _readings_page(sensor, timestamp_from, timestamp_to, limit, cursor, columns):
+    readings, error = _filter_by_time(Reading.objects.filter(sensor=sensor), timestamp_from, timestamp_to)
+    if error:
+        return None, None, error
+
+    if limit is not None and limit < 1:
+        return None, None, Response({"detail": "limit must be at least 1"}, status=400)
+    page_size = min(limit or settings.READINGS_MAX_PAGE_SIZE, settings.READINGS_MAX_PAGE_SIZE)
+
+    if cursor:
+        try:
+            after_ts, after_id = decode_cursor(cursor)
+        except ValueError:
+            return None, None, Response({"detail": "Invalid cursor"}, status=400)
+        # Continue right after the last row of the previous page (walks the (sensor, timestamp) index)
+        # The plain timestamp__lte bound lets PostgreSQL skip partitions newer than the cursor
+        readings = readings.filter(
+            Q(timestamp__lt=after_ts) | Q(timestamp=after_ts, id__lt=after_id), timestamp__lte=after_ts
         )
-    return sensors
+
+    # Fetch one extra row to know if there is a next page
+    rows = readings.order_by("-timestamp", "-id").values_list(*columns)[: page_size + 1]
+    return rows, page_size, None
+
+# Version of a sensor's readings, read fresh because cached sensor objects may hold an old one.
+# One primary key lookup, much cheaper than the page itself.
+def _readings_state(sensor_id):
+    return Sensor.objects.filter(pk=sensor_id).values_list(
+        "readings_version", "readings_modified_at", "created_at", "compaction_watermarks", "compacted_until"
+    )
+
+# Query parameters in a fixed order, so "?a=1&b=2" and "?b=2&a=1" share ETags and cache entries
+def _query_identity(request):
+    return sorted(request.GET.lists())
+
+# (ETag, Last-Modified) of a readings page, from the row of _readings_state.
+# The ETag covers the query string and the format, so every page has its own.
+# created_at tells a new sensor apart from a deleted one with the same id.
+def _readings_validators(request, sensor_id, state, columnar):
+    if state is None:
+        raise Http404("No Sensor matches the given query.") # Deleted since it was cached
+    version, modified_at, created_at = state[:3]
+    etag = make_etag("readings", sensor_id, version, modified_at, created_at, _query_identity(request), columnar)
+    return etag, modified_at or created_at
+
+# Response cache key of a readings query, or None when the cache is off
+def _readings_cache_key(request, kind, sensor_id):
+    if not respcache.enabled():
+        return None
+    state = _readings_state(sensor_id).first()
+    if state is None:
+        raise Http404("No Sensor matches the given query.") # Deleted since it was cached
+    return respcache.key(kind, sensor_id, state, _query_identity(request))
+
+# Response cache key of a stats query. A window that ends before the sensor's newest reading is closed:
+# new readings land after it, so only late readings and rewrites of old ones (which bump history_version)
+# can change its result, and its cache entry outlives the sensor's next writes.
+def _stats_cache_key(request, sensor_id, dt_to):
+    if not respcache.enabled():
+        return None
+    state = Sensor.objects.filter(pk=sensor_id).values_list(
+        "readings_version", "history_version", "last_timestamp", "created_at"
+    ).first()
+    if state is None:
+        raise Http404("No Sensor matches the given query.")
+    version, history_version, last_timestamp, created_at = state
+    if dt_to is not None and timezone.is_naive(dt_to):
+        dt_to = timezone.make_aware(dt_to)
+    if dt_to is not None and last_timestamp is not None and dt_to < last_timestamp:
+        return respcache.key("stats-closed", sensor_id, history_version, created_at, _query_identity(request))
+    return respcache.key("stats", sensor_id, version, created_at, _query_identity(request))
+
+# Builds one keyset page of sensors (ordered by id) after `cursor`, "" for the first page.
+# No COUNT runs, so every page costs the same. Returns (rows queryset, page_size, None)
+# or (None, None, 400 response) like _readings_page.
+def _sensors_keyset_page(sensors, cursor, limit):
+    if limit is not None and limit < 1:
+        return None, None, Response({"detail": "limit must be at least 1"}, status=400)
+    page_size = min(limit or SENSORS_PAGE_SIZE, SENSORS_MAX_PAGE_SIZE)
+    if cursor:
+        try:
+            sensors = sensors.filter(id__gt=decode_id_cursor(cursor)) # Walks the (owner, id) index
+        except ValueError:
+            return None, None, Response({"detail": "Invalid cursor"}, status=400)
+    return sensors.order_by("id").values_list(*SENSOR_FIELDS)[: page_size + 1], page_size, None
+
+# {"items": [...]} of a keyset page, with X-Next-Cursor when more sensors follow
+def _sensors_keyset_response(rows, page_size):
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    response = json_response({"items": rows_as_dicts(rows, SENSOR_FIELDS)})
+    if more:
+        response["X-Next-Cursor"] = encode_id_cursor(rows[-1][SENSOR_FIELDS.index("id")])
+    return response
+
+# Validators of the sensor list: any create, edit or delete changes the count or the newest updated_at
+def _sensors_validators(request, state):
+    etag = make_etag("sensors", request.auth.pk, state["count"], state["updated"], _query_identity(request))
+    return etag, state["updated"]
+
+# Turns the fetched rows of _readings_page into the JSON or columnar response, with X-Next-Cursor
+# and X-Readings-Resolution (raw or compacted, from the compaction fields of _readings_state)
+def _page_response(rows, page_size, columns, columnar, state):
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    ts_index = columns.index("timestamp")
+    resolution = compaction.describe(state[3], state[4], [row[ts_index] for row in rows])
+    if columnar:
+        response = HttpResponse(encode_frame(rows, with_ids=True), content_type=COLUMNAR_TYPE)
+    else:
+        response = rows_response(rows, columns) # No model instances or per-row validation
+    patch_vary_headers(response, ["Accept"])
+    response["X-Readings-Resolution"] = resolution
+    if more:
+        last = dict(zip(columns, rows[-1]))
+        response["X-Next-Cursor"] = encode_cursor(last["timestamp"], last["id"])
+    return response
+
+# Readings list (newest first, optional filter and keyset pagination)
+# At most READINGS_MAX_PAGE_SIZE readings are returned. If there are more,
+# the X-Next-Cursor header holds the cursor for the next page.
+# Clients that send "Accept: application/vnd.sensor-readings.columnar" get one columnar frame instead of JSON.
+# Sends ETag / Last-Modified; a matching If-None-Match gets 304 without querying the readings.
+# Pages are kept in the response cache (see respcache) until the sensor's next write.
+@readings_router.get("/sensors/{sensor_id}/readings", response=List[ReadingOut])
+def list_readings(
+    request,
+    sensor_id: int,
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=False)
+    columnar = wants_columnar(request)
+    columns = COLUMNAR_FIELDS if columnar else READING_FIELDS
+    rows, page_size, error = _readings_page(sensor, timestamp_from, timestamp_to, limit, cursor, columns)
+    if error:
+        return error
+    state = _readings_state(sensor.id).first()
+    etag, modified = _readings_validators(request, sensor.id, state, columnar)
+    cached = not_modified(request, etag, modified)
+    if cached:
+        return cached
+
+    key = respcache.key("list", etag)
+    entry = respcache.get(key)
+    if entry is None:
+        response = _page_response(list(rows), page_size, columns, columnar, state)
+        respcache.put(key, respcache.pack(response))
+    else:
+        response = respcache.unpack(entry)
+    return with_validators(response, etag, modified)
+
+# Live stream of new readings of one sensor as Server-Sent Events (text/event-stream).
+# Pass last_event_id or the Last-Event-ID header to first get the readings after that id.
+@readings_router.get("/sensors/{sensor_id}/readings/stream", auth=[TokenAuth(), QueryTokenAuth()])
+def stream_sensor_readings(request, sensor_id: int, last_event_id: Optional[int] = None):
+    sensor = _get_owned_sensor(request.auth, sensor_id)
+    readings = Reading.objects.filter(sensor_id=sensor.id)
+    return streams.open_stream(request, [sensor_topic(sensor.id)], readings, last_event_id)
+
+# Live stream of new readings of all sensors of the user, events carry sensor_id
+@readings_router.get("/readings/stream", auth=[TokenAuth(), QueryTokenAuth()])
+def stream_readings(request, last_event_id: Optional[int] = None):
+    readings = Reading.objects.filter(sensor__owner_id=request.auth.pk, sensor__deleted_at__isnull=True)
+    return streams.open_stream(request, [user_topic(request.auth.pk)], readings, last_event_id)
+
+# Readings grouped into fixed time buckets (e.g. bucket=5m), with avg/min/max/count per bucket.
+# The grouping runs in the database so only one row per bucket is sent to the client,
+# and it reads the hourly/daily rollups instead of raw readings whenever they fit.
+# Results are kept in the response cache until the sensor's next write.
+@readings_router.get("/sensors/{sensor_id}/readings/aggregate", response=ReadingAggregateOut)
+def aggregate_readings(
+    request,
+    sensor_id: int,
+    bucket: str = "5m",
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+):
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=not respcache.enabled())  # The cache key reads the state
+    dt_from = parse_datetime(timestamp_from) if timestamp_from else None
+    if timestamp_from and not dt_from:
+        return Response({"detail": "Invalid timestamp_from (use ISO 8601)"}, status=400)
+    dt_to = parse_datetime(timestamp_to) if timestamp_to else None
+    if timestamp_to and not dt_to:
+        return Response({"detail": "Invalid timestamp_to (use ISO 8601)"}, status=400)
+    try:
+        size = parse_bucket(bucket)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+
+    key = _readings_cache_key(request, "aggregate", sensor.id)
+    data = respcache.get(key)
+    if data is not None:
+        return data
+
+    buckets = rollups.aggregate(sensor.id, size, dt_from, dt_to, max_buckets=settings.READINGS_MAX_BUCKETS)
+    if len(buckets) > settings.READINGS_MAX_BUCKETS:
+        return Response({"detail": "Too many buckets, use a larger bucket or a shorter time range"}, status=400)
+
+    data = {"bucket_seconds": size, "buckets": [rollups.finalize(epoch, stats) for epoch, stats in buckets.items()]}
+    respcache.put(key, data)
+    return data
+
+# Count, mean, standard deviation, percentiles and min/max (with when they were reached) of temperature
+# and humidity over a time window, computed in the database (see core/stats.py) so no readings are sent.
+# Results are kept in the response cache; those of closed windows until a late reading lands in the past.
+@readings_router.get("/sensors/{sensor_id}/readings/stats", response=ReadingStatsOut)
+def reading_stats(
+    request,
+    sensor_id: int,
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+):
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=not respcache.enabled())  # The cache key reads the state
+    dt_to = parse_datetime(timestamp_to) if timestamp_to else None
+    readings, error = _filter_by_time(Reading.objects.filter(sensor=sensor), timestamp_from, timestamp_to)
+    if error:
+        return error
+
+    key = _stats_cache_key(request, sensor.id, dt_to)
+    data = respcache.get(key)
+    if data is not None:
+        return data
+    data = window_stats(readings)
+    respcache.put(key, data)
+    return data
+
+# Readings of several sensors resampled onto one shared time grid (see core/aligned.py), so comparing
+# N sensors takes one request: one query checks ownership and reads their versions, one grouped query
+# reads all series. sensor_ids is a comma-separated list, the grid runs from timestamp_from to timestamp_to.
+# format=csv sends the columns of sensor_readings_wide.csv, format=columnar (or the columnar Accept type)
+# one columnar frame per sensor. Results are kept in the response cache until one of the sensors' next write.
+@readings_router.get("/readings/aligned", response=AlignedReadingsOut)
+def aligned_readings(
+    request,
+    sensor_ids: str,
+    timestamp_from: str,
+    timestamp_to: str,
+    bucket: str = "5m",
+    format: Optional[str] = None,
+):
+    try:
+        ids = list(dict.fromkeys(int(part) for part in sensor_ids.split(",") if part.strip()))
+    except ValueError:
+        return Response({"detail": "sensor_ids must be a comma-separated list of sensor ids"}, status=400)
+    if not ids or len(ids) > settings.READINGS_ALIGNED_MAX_SENSORS:
+        return Response(
+            {"detail": f"sensor_ids must name between 1 and {settings.READINGS_ALIGNED_MAX_SENSORS} sensors"}, status=400
+        )
+    dt_from = parse_datetime(timestamp_from)
+    if not dt_from:
+        return Response({"detail": "Invalid timestamp_from (use ISO 8601)"}, status=400)
+    dt_to = parse_datetime(timestamp_to)
+    if not dt_to:
+        return Response({"detail": "Invalid timestamp_to (use ISO 8601)"}, status=400)
+    # Naive bounds are in the default time zone, so they compare with aware ones and fall on the same grid
+    if timezone.is_naive(dt_from):
+        dt_from = timezone.make_aware(dt_from)
+    if timezone.is_naive(dt_to):
+        dt_to = timezone.make_aware(dt_to)
+    if dt_to < dt_from:
+        return Response({"detail": "timestamp_to must not be before timestamp_from"}, status=400)
+    try:
+        size = parse_bucket(bucket)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+    if len(aligned.grid(size, dt_from, dt_to)) > settings.READINGS_MAX_BUCKETS:
+        return Response({"detail": "Too many buckets, use a larger bucket or a shorter time range"}, status=400)
+    if format is None:
+        format = "columnar" if wants_columnar(request) else "json"
+    if format not in aligned.FORMATS:
+        return Response({"detail": f"format must be one of: {', '.join(aligned.FORMATS)}"}, status=400)
+
+    rows = Sensor.objects.filter(owner=request.auth, pk__in=ids).values_list("id", "name", "readings_version", "created_at")
+    state = {row[0]: row[1:] for row in rows}
+    if len(state) < len(ids):
+        raise Http404("No Sensor matches the given query.")
+
+    key = respcache.key("aligned", [state[sensor_id] for sensor_id in ids], format, _query_identity(request))
+    entry = respcache.get(key)
+    if entry is not None:
+        return respcache.unpack(entry)
+    epochs, series = aligned.align(ids, size, dt_from, dt_to)
+    names = {sensor_id: state[sensor_id][0] for sensor_id in ids}
+    if format == "csv":
+        response = HttpResponse(aligned.as_csv(epochs, series, names), content_type="text/csv")
+    elif format == "columnar":
+        response = HttpResponse(aligned.as_columnar(epochs, series), content_type=COLUMNAR_TYPE)
+    else:
+        response = json_response(aligned.as_json(size, epochs, series, names))
+    patch_vary_headers(response, ["Accept"])
+    respcache.put(key, respcache.pack(response))
+    return response
+
+# Anomalies flagged when readings were written (see core/anomalies.py), newest first: of all the user's
+# sensors, or of one with sensor_id. `since` defaults to 24 hours ago; the query is a range scan of
+# the anomaly timestamp index, no readings are read. At most READINGS_MAX_PAGE_SIZE (or `limit`) rows.
+@readings_router.get("/anomalies", response=List[AnomalyOut])
+def list_anomalies(request, sensor_id: Optional[int] = None, since: Optional[str] = None, limit: Optional[int] = None):
+    dt_since = parse_datetime(since) if since else timezone.now() - timedelta(hours=24)
+    if not dt_since:
+        return Response({"detail": "Invalid since (use ISO 8601)"}, status=400)
+    if limit is not None and limit < 1:
+        return Response({"detail": "limit must be at least 1"}, status=400)
+    page_size = min(limit or settings.READINGS_MAX_PAGE_SIZE, settings.READINGS_MAX_PAGE_SIZE)
+
+    anomalies = Anomaly.objects.filter(timestamp__gte=dt_since)
+    if sensor_id is not None:
+        anomalies = anomalies.filter(sensor=_get_owned_sensor(request.auth, sensor_id))
+    else:
+        anomalies = anomalies.filter(sensor__owner=request.auth, sensor__deleted_at__isnull=True)
+    rows = anomalies.order_by("-timestamp", "-id").values_list(*ANOMALY_FIELDS)[:page_size]
+    return rows_response(list(rows), ANOMALY_FIELDS)
+
+# Readings thinned out to at most max_points with LTTB, oldest first.
+# Keeps peaks and dips of the chosen field so a chart of any range looks right with few points.
+# Results are kept in the response cache until the sensor's next write.
+@readings_router.get("/sensors/{sensor_id}/readings/downsample", response=List[ReadingOut])
+def downsample_readings(
+    request,
+    sensor_id: int,
+    max_points: int = 500,
+    field: str = "temperature",
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+):
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=not respcache.enabled())  # The cache key reads the state
+    readings, error = _filter_by_time(Reading.objects.filter(sensor=sensor), timestamp_from, timestamp_to)
+    if error:
+        return error
+    if field not in ("temperature", "humidity"):
+        return Response({"detail": "field must be temperature or humidity"}, status=400)
+    if max_points < 3 or max_points > settings.READINGS_MAX_PAGE_SIZE:
+        return Response(
+            {"detail": f"max_points must be between 3 and {settings.READINGS_MAX_PAGE_SIZE}"}, status=400
+        )
+    if field == "humidity":
+        readings = readings.filter(humidity__isnull=False)
+
+    key = _readings_cache_key(request, "downsample", sensor.id)
+    points = respcache.get(key)
+    if points is not None:
+        return points
+
+    # Plain tuples instead of model instances, the whole range is scanned once
+    columns = ("id", "temperature", "humidity", "timestamp")
+    rows = list(readings.order_by("timestamp").values_list(*columns))
+    value_index = columns.index(field)
+    xs = [row[3].timestamp() for row in rows]
+    ys = [row[value_index] for row in rows]
+    points = [dict(zip(columns, row)) for row in lttb(rows, xs, ys, max_points)]
+    respcache.put(key, points)
+    return points
+
+# Export all readings of a sensor (oldest first) as CSV, NDJSON or columnar frames.
+# Without a format parameter, the Accept header can ask for columnar, otherwise CSV is sent.
+# Rows are read with a chunked server-side cursor and streamed, so memory use doesn't grow with the export.
+@readings_router.get("/sensors/{sensor_id}/readings/export")
+def export_readings(
+    request,
+    sensor_id: int,
+    format: Optional[str] = None,
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+):
+    sensor = _get_owned_sensor(request.auth, sensor_id)
+    readings, error = _filter_by_time(Reading.objects.filter(sensor=sensor), timestamp_from, timestamp_to)
+    if error:
+        return error
+    if format is None:
+        format = "columnar" if wants_columnar(request) else "csv"
+    if format not in EXPORT_FORMATS:
+        return Response({"detail": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+    chunk_size = settings.READINGS_EXPORT_CHUNK_SIZE
+    rows = (
+        readings.order_by("timestamp")
+        .values_list("timestamp", "temperature", "humidity")
+        .iterator(chunk_size=chunk_size)
+    )
+    encode, content_type, extension = EXPORT_FORMATS[format]
+    response = StreamingHttpResponse(encode(rows, sensor.name, chunk_size), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="sensor-{sensor.id}-readings.{extension}"'
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+# Endpoint to get a list of all sensors from the database
+# Pages of 10 like PageNumberPagination, encoded straight from values_list tuples.
+# With a cursor parameter (empty for the first page) it pages by id instead, up to `limit`
+# sensors per page without counting them; X-Next-Cursor holds the next cursor.
+# q matches anywhere in the name or type on PostgreSQL but only their start on SQLite (see core/search.py).
+@router.get("/sensors", response=PagedSensorOut, auth=TokenAuth()) # Requires valid endpoint to access this endpoint
+def list_sensors(
+    request,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    pagination: PageNumberPagination.Input = Query(...),
+):
+    sensors = search_sensors(Sensor.objects.filter(owner=request.auth), q) # Only show sensors that belongs to logged-in user
+    if cursor is not None:
+        rows, page_size, error = _sensors_keyset_page(sensors, cursor, limit)
+        if error:
+            return error
+        return _sensors_keyset_response(list(rows), page_size)
+
+    state = Sensor.objects.filter(owner=request.auth).aggregate(count=Count("id"), updated=Max("updated_at"))
+    etag, modified = _sensors_validators(request, state)
+    # A delete doesn't move the newest updated_at, so only If-None-Match can get a 304 here
+    cached = not_modified(request, etag, modified, match_time=False)
+    if cached:
+        return cached
+
+    offset = (pagination.page - 1) * SENSORS_PAGE_SIZE
+    rows = sensors.order_by("id").values_list(*SENSOR_FIELDS)[offset : offset + SENSORS_PAGE_SIZE]
+    response = json_response({"items": rows_as_dicts(rows, SENSOR_FIELDS), "count": sensors.count()})
+    return with_validators(response, etag, modified)
+
+# All sensors of the user with their newest reading and reading count, for dashboards.
+# One query on core_sensor and no reading scans: the values come from the snapshot that ingest keeps.
+@router.get("/sensors/summary", response=List[SensorSummaryOut], auth=TokenAuth())
+def sensors_summary(request):
+    rows = Sensor.objects.filter(owner=request.auth).order_by("id").values_list(*SUMMARY_FIELDS)
+    return rows_response(rows, SUMMARY_FIELDS)
 
 # Logged in user can create a new sensor in the database
 @router.post("/sensors", response=SensorOut, auth=TokenAuth())
@@ -73,16 +534,16 @@ def create_sensor(request, data: SensorCreate):
     sensor = Sensor.objects.create(name=name, type=type_, owner=request.auth)
     return sensor
 
-# Get one sensor owned by user
-def _get_owned_sensor(user, sensor_id: int):
 
-    # Return 404 if not found or not owned by user
-    return get_object_or_404(Sensor, id=sensor_id, owner=user)
-
-# Return a sensor that belongs to the current user
+# Return a sensor that belongs to the current user, with ETag / Last-Modified from updated_at
 @router.get("/sensors/{sensor_id}", response=SensorOut, auth=TokenAuth())
-def get_sensor(request, sensor_id: int):
+def get_sensor(request, sensor_id: int, response: HttpResponse):
     sensor = _get_owned_sensor(request.auth, sensor_id)
+    etag = make_etag("sensor", sensor.id, sensor.updated_at)
+    cached = not_modified(request, etag, sensor.updated_at)
+    if cached:
+        return cached
+    with_validators(response, etag, sensor.updated_at)
     return sensor
 
 # Update a sensor
@@ -97,43 +558,147 @@ def update_sensor(request, sensor_id: int, data: SensorCreate):
 
     sensor.name = data.name
     sensor.type = type_
-    sensor.save()
+    # Only the edited fields, the cached sensor may hold an old readings_version
+    sensor.save(update_fields=["name", "type", "updated_at"])
     return sensor 
 
-# Delete a sensor and all related readings
+# Delete a sensor: it is gone from every endpoint at once, its readings are removed in the background (core/purge.py)
 @router.delete("/sensors/{sensor_id}", auth=TokenAuth())
 def delete_sensor(request, sensor_id: int):
     sensor = _get_owned_sensor(request.auth, sensor_id)
-    sensor.delete()
-    return Response({}, status=204) 
+    purge.soft_delete(sensor)
+    return Response({"detail": "Sensor deleted, its readings are removed in the background"}, status=202)
+
+# Write-behind mode: appends the reading to the ingest queue and answers 202, or 503 when the queue is full
+def queue_reading(sensor, data):
+    try:
+        queue_id = ingestqueue.enqueue(sensor.id, data.temperature, data.humidity, data.timestamp)
+    except ingestqueue.QueueFull:
+        response = Response({"detail": "Too many readings waiting to be written, retry later"}, status=503)
+        response["Retry-After"] = str(max(1, math.ceil(settings.INGEST_FLUSH_INTERVAL)))
+        return response
+    return Response({"status": "queued", "queue_id": queue_id}, status=202)
 
 # Post endpoint to create a new reading for a specific sensor
 @readings_router.post("/sensors/{sensor_id}/readings", response=ReadingOut)
 def create_reading(request, sensor_id: int, data: ReadingCreate):
 
-    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=False)
 
-    if data.humidity is not None:
-        try:
-            h = float(data.humidity)
-            if h < 0 or h > 100:
-                return Response({"detail": "humidity must be between 0 and 100"}, status=400)
-        except (TypeError, ValueError):
-            return Response({"detail": "humidity must be a number"}, status=400)
+    error = check_humidity(data.humidity)
+    if error:
+        return Response({"detail": error}, status=400)
+
+    if settings.INGEST_QUEUE_ENABLED:
+        return queue_reading(sensor, data)
 
     # Create a new reading in the database using data from the request body
     try:
-        reading = Reading.objects.create(
-            sensor=sensor,
-            temperature=data.temperature,
-            humidity=data.humidity,
-            timestamp=data.timestamp,
-     )
-
+        reading = write_one(sensor, data.temperature, data.humidity, data.timestamp)
     except IntegrityError:
         # träffar unique_together (sensor, timestamp)
         return Response({"detail": "Reading for this timestamp already exists for this sensor"}, status=400)
+    except SensorDeleted:
+        raise Http404("No Sensor matches the given query.")
 
     return Response(ReadingOut.from_orm(reading).dict(), status=201)
 
+# Post endpoint to create many readings for one sensor in a single request.
+# Items are validated one by one, so a bad item is reported instead of failing the whole batch.
+@readings_router.post(
+    "/sensors/{sensor_id}/readings/batch",
+    response=ReadingBatchOut,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/ReadingCreate"}}
+                }
+            },
+            "required": True,
+        }
+    },
+)
+def create_readings_batch(request, sensor_id: int, items: List[Any] = Body(...)):
+    sensor = _get_owned_sensor(request.auth, sensor_id, verify=False)
+
+    if len(items) > settings.READINGS_BATCH_MAX_SIZE:
+        return Response(
+            {"detail": f"A batch can contain at most {settings.READINGS_BATCH_MAX_SIZE} readings"}, status=400
+        )
+
+    try:
+        results = ingest_batch(sensor, items)
+    except IntegrityError:
+        # Another request wrote one of the timestamps between our duplicate check and the insert
+        return Response({"detail": "Readings were written concurrently for this sensor, retry the batch"}, status=409)
+    except SensorDeleted:
+        raise Http404("No Sensor matches the given query.")
+
+    statuses = [r["status"] for r in results]
+    return {
+        "created": statuses.count(CREATED),
+        "duplicates": statuses.count(DUPLICATE),
+        "invalid": statuses.count(INVALID),
+        "results": results,
+    }
+
+# Gateway upload: readings of many sensors in one request, each row names its sensor by device_id.
+# ?create_sensors=<type> creates sensors of that type for unknown devices, otherwise their rows are skipped.
+@readings_router.post(
+    "/readings/batch",
+    response=DeviceBatchOut,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    # Inlined: no endpoint takes DeviceReadingCreate as a parameter, so it isn't among the components
+                    "schema": {"type": "array", "items": DeviceReadingCreate.model_json_schema()}
+                }
+            },
+            "required": True,
+        }
+    },
+)
+def create_device_readings(request, items: List[Any] = Body(...), create_sensors: Optional[str] = None):
+    if len(items) > settings.READINGS_BATCH_MAX_SIZE:
+        return Response(
+            {"detail": f"A batch can contain at most {settings.READINGS_BATCH_MAX_SIZE} readings"}, status=400
+        )
+
+    try:
+        devices, errors = ingest_by_device(request.auth, items, sensor_type=create_sensors or None)
+    except IntegrityError:
+        return Response({"detail": "Readings were written concurrently for these sensors, retry the batch"}, status=409)
+    except SensorDeleted:
+        return Response({"detail": "A sensor was deleted while its readings were written, retry the batch"}, status=409)
+
+    return {
+        "created": sum(d["created"] for d in devices),
+        "duplicates": sum(d["duplicates"] for d in devices),
+        "invalid": len(errors),
+        "skipped": sum(d["skipped"] for d in devices),
+        "devices": devices,
+        "errors": errors,
+    }
+
+# Hit/miss counters of the token and sensor ownership caches (staff only)
+@router.get("/cache/stats", auth=TokenAuth())
+def cache_stats(request):
+    if not request.auth.is_staff:
+        return Response({"detail": "Only staff users can see cache stats"}, status=403)
+    return authcache.stats()
+
+# Request metrics of this process in Prometheus text format (404 unless METRICS_ENABLED)
+@router.get("/metrics", auth=MetricsAuth())
+def request_metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
+# Depth and lag of the write-behind ingest queue and what its worker wrote so far (staff only)
+@router.get("/ingest/queue", auth=TokenAuth())
+def ingest_queue_status(request):
+    if not request.auth.is_staff:
+        return Response({"detail": "Only staff users can see the ingest queue"}, status=403)
+    return ingestqueue.status()
@@ -0,0 +1,178 @@
+# Async versions of the sensor endpoints and the readings list/create endpoints, for ASGI servers.
+# backend/urls.py mounts these routers in front of the sync ones when API_ASYNC is set, so the
+# same URLs are served without tying up a worker thread while a client or the database is slow.
+# Reads use Django's async ORM; writes that need a transaction run in a thread with sync_to_async.
+from typing import List, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from ninja import Query, Router
+from ninja.pagination import PageNumberPagination
+from ninja.security import HttpBearer
+from . import authcache, purge, respcache
+from .api import (
+    COLUMNAR_FIELDS,
+    READING_FIELDS,
+    SENSOR_FIELDS,
+    SENSORS_PAGE_SIZE,
+    SUMMARY_FIELDS,
+    _page_response,
+    _sensors_keyset_page,
+    _sensors_keyset_response,
+    _readings_page,
+    _readings_state,
+    _readings_validators,
+    _sensors_validators,
+    queue_reading,
+)
+from .columnar import wants_columnar
+from .conditional import make_etag, not_modified, with_validators
+from .fastjson import Response, json_response, rows_as_dicts, rows_response
+from .ingest import SensorDeleted, check_humidity, write_one
+from .models import Sensor
+from .search import search_sensors
+from .schemas import PagedSensorOut, ReadingCreate, ReadingOut, SensorCreate, SensorOut, SensorSummaryOut
+
+# Same check as api.TokenAuth, without blocking the event loop
+class AsyncTokenAuth(HttpBearer):
+    async def authenticate(self, request, token):
+        return await authcache.auser_for_token(token)
+
+router = Router(auth=AsyncTokenAuth())
+readings_router = Router(auth=AsyncTokenAuth())
+
+# Same as api._get_owned_sensor
+async def _get_owned_sensor(user, sensor_id: int, verify=True):
+    sensor = await authcache.aowned_sensor(user, sensor_id, verify=verify)
+    if sensor is None:
+        raise Http404("No Sensor matches the given query.")
+    return sensor
+
+# Same as api.list_readings
+@readings_router.get("/sensors/{sensor_id}/readings", response=List[ReadingOut])
+async def list_readings(
+    request,
+    sensor_id: int,
+    timestamp_from: Optional[str] = None,
+    timestamp_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    sensor = await _get_owned_sensor(request.auth, sensor_id, verify=False)
+    columnar = wants_columnar(request)
+    columns = COLUMNAR_FIELDS if columnar else READING_FIELDS
+    rows, page_size, error = _readings_page(sensor, timestamp_from, timestamp_to, limit, cursor, columns)
+    if error:
+        return error
+    state = await _readings_state(sensor.id).afirst()
+    etag, modified = _readings_validators(request, sensor.id, state, columnar)
+    cached = not_modified(request, etag, modified)
+    if cached:
+        return cached
+
+    key = respcache.key("list", etag)
+    entry = await respcache.aget(key)
+    if entry is None:
+        response = _page_response([row async for row in rows], page_size, columns, columnar, state)
+        await respcache.aput(key, respcache.pack(response))
+    else:
+        response = respcache.unpack(entry)
+    return with_validators(response, etag, modified)
+
+# Same as api.create_reading. The insert and the rollup update share one transaction,
+# which the async ORM can't open, so that part runs in a thread.
+@readings_router.post("/sensors/{sensor_id}/readings", response=ReadingOut)
+async def create_reading(request, sensor_id: int, data: ReadingCreate):
+    sensor = await _get_owned_sensor(request.auth, sensor_id, verify=False)
+
+    error = check_humidity(data.humidity)
+    if error:
+        return Response({"detail": error}, status=400)
+
+    if settings.INGEST_QUEUE_ENABLED:
+        # The queue file is separate from the database, so any thread can append to it
+        return await sync_to_async(queue_reading, thread_sensitive=False)(sensor, data)
+
+    try:
+        reading = await sync_to_async(write_one)(sensor, data.temperature, data.humidity, data.timestamp)
+    except IntegrityError:
+        return Response({"detail": "Reading for this timestamp already exists for this sensor"}, status=400)
+    except SensorDeleted:
+        raise Http404("No Sensor matches the given query.")
+
+    return Response(ReadingOut.from_orm(reading).dict(), status=201)
+
+# Same as api.list_sensors
+@router.get("/sensors", response=PagedSensorOut)
+async def list_sensors(
+    request,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    pagination: PageNumberPagination.Input = Query(...),
+):
+    sensors = search_sensors(Sensor.objects.filter(owner=request.auth), q)
+    if cursor is not None:
+        rows, page_size, error = _sensors_keyset_page(sensors, cursor, limit)
+        if error:
+            return error
+        return _sensors_keyset_response([row async for row in rows], page_size)
+
+    state = await Sensor.objects.filter(owner=request.auth).aaggregate(count=Count("id"), updated=Max("updated_at"))
+    etag, modified = _sensors_validators(request, state)
+    cached = not_modified(request, etag, modified, match_time=False)
+    if cached:
+        return cached
+
+    offset = (pagination.page - 1) * SENSORS_PAGE_SIZE
+    rows = [row async for row in sensors.order_by("id").values_list(*SENSOR_FIELDS)[offset : offset + SENSORS_PAGE_SIZE]]
+    response = json_response({"items": rows_as_dicts(rows, SENSOR_FIELDS), "count": await sensors.acount()})
+    return with_validators(response, etag, modified)
+
+# Same as api.sensors_summary
+@router.get("/sensors/summary", response=List[SensorSummaryOut])
+async def sensors_summary(request):
+    rows = Sensor.objects.filter(owner=request.auth).order_by("id").values_list(*SUMMARY_FIELDS)
+    return rows_response([row async for row in rows], SUMMARY_FIELDS)
+
+@router.post("/sensors", response=SensorOut)
+async def create_sensor(request, data: SensorCreate):
+    name = (data.name or "").strip()
+    type_ = (data.type or "").strip()
+    if not name or not type_:
+        return Response({"detail": "name and type are required"}, status=400)
+
+    return await Sensor.objects.acreate(name=name, type=type_, owner=request.auth)
+
+@router.get("/sensors/{sensor_id}", response=SensorOut)
+async def get_sensor(request, sensor_id: int, response: HttpResponse):
+    sensor = await _get_owned_sensor(request.auth, sensor_id)
+    etag = make_etag("sensor", sensor.id, sensor.updated_at)
+    cached = not_modified(request, etag, sensor.updated_at)
+    if cached:
+        return cached
+    with_validators(response, etag, sensor.updated_at)
+    return sensor
+
+@router.put("/sensors/{sensor_id}", response=SensorOut)
+async def update_sensor(request, sensor_id: int, data: SensorCreate):
+    sensor = await _get_owned_sensor(request.auth, sensor_id)
+
+    name = (data.name or "").strip()
+    type_ = (data.type or "").strip()
+    if not name or not type_:
+        return Response({"detail": "name and type are required"}, status=400)
+
+    sensor.name = data.name
+    sensor.type = type_
+    await sensor.asave(update_fields=["name", "type", "updated_at"])
+    return sensor
+
+# Same as api.delete_sensor, the readings are purged later
+@router.delete("/sensors/{sensor_id}")
+async def delete_sensor(request, sensor_id: int):
+    sensor = await _get_owned_sensor(request.auth, sensor_id)
+    await sync_to_async(purge.soft_delete)(sensor)
+    return Response({"detail": "Sensor deleted, its readings are removed in the background"}, status=202)
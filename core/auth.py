@@ -3,7 +3,7 @@ from ninja import Router
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from ninja.responses import Response
+from .fastjson import Response
 from django.db import IntegrityError
 
 
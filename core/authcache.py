@@ -0,0 +1,185 @@
+# In-process cache for token -> user, (user, sensor id) -> sensor and (user, sensor name) -> sensor lookups.
+# Saves the token and ownership queries that every authenticated request would otherwise run.
+# Entries expire after AUTH_CACHE_TTL seconds and are dropped as soon as the token,
+# user or sensor is saved or deleted in this process (other processes rely on the TTL,
+# except for sensor deletes: see owned_sensor's verify and ingest.record_written).
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .models import Sensor
+
+MISSING = object()
+
+
+# Thread-safe LRU cache with a time to live and hit/miss counters
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # Removes every entry for which predicate(key, value) is true
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+    # Drops all entries and resets the counters
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+tokens = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)  # token key -> User
+sensors = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)  # (user id, sensor id) -> Sensor
+names = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)  # (user id, sensor name) -> Sensor
+
+
+# Returns the user that owns the token, or None if the token doesn't exist
+def user_for_token(key):
+    user = tokens.get(key)
+    if user is MISSING:
+        try:
+            user = Token.objects.select_related("user").get(key=key).user  # One query for token and user
+        except Token.DoesNotExist:
+            return None
+        tokens.set(key, user)
+    return user
+
+
+# Returns the sensor if it exists and belongs to the user, otherwise None.
+# Each caller gets its own copy, so changing it doesn't touch the cached object.
+# With verify, a cached sensor is checked against the database (one primary key lookup),
+# so a sensor deleted by another process isn't served until its entry expires.
+def owned_sensor(user, sensor_id, verify=False):
+    key = (user.pk, sensor_id)
+    sensor = sensors.get(key)
+    if sensor is not MISSING and verify and not Sensor.objects.filter(pk=sensor_id).exists():
+        forget_sensor(sensor_id)
+        return None
+    if sensor is MISSING:
+        sensor = Sensor.objects.filter(id=sensor_id, owner=user).first()
+        if sensor is None:
+            return None
+        sensors.set(key, sensor)
+    return copy.copy(sensor)
+
+
+# Returns {name: sensor} for the user's sensors with these names (unknown names are left out).
+# If names repeat, the oldest sensor wins. Names not cached are looked up together in one query.
+def sensors_named(user, sensor_names):
+    found, missing = {}, []
+    for name in set(sensor_names):
+        sensor = names.get((user.pk, name))
+        if sensor is MISSING:
+            missing.append(name)
+        else:
+            found[name] = copy.copy(sensor)
+    if missing:
+        for sensor in Sensor.objects.filter(owner=user, name__in=missing).order_by("id"):
+            if sensor.name not in found:
+                names.set((user.pk, sensor.name), sensor)
+                found[sensor.name] = copy.copy(sensor)
+    return found
+
+
+# Async versions for the async views, same caches and same results
+async def auser_for_token(key):
+    user = tokens.get(key)
+    if user is MISSING:
+        try:
+            user = (await Token.objects.select_related("user").aget(key=key)).user
+        except Token.DoesNotExist:
+            return None
+        tokens.set(key, user)
+    return user
+
+
+async def aowned_sensor(user, sensor_id, verify=False):
+    key = (user.pk, sensor_id)
+    sensor = sensors.get(key)
+    if sensor is not MISSING and verify and not await Sensor.objects.filter(pk=sensor_id).aexists():
+        forget_sensor(sensor_id)
+        return None
+    if sensor is MISSING:
+        sensor = await Sensor.objects.filter(id=sensor_id, owner=user).afirst()
+        if sensor is None:
+            return None
+        sensors.set(key, sensor)
+    return copy.copy(sensor)
+
+
+# Drops every entry of the sensor, for when this process learns it is gone
+def forget_sensor(sensor_id):
+    sensors.delete_where(lambda key, sensor: key[1] == sensor_id)
+    names.delete_where(lambda key, sensor: sensor.pk == sensor_id)
+
+
+def clear():
+    tokens.clear()
+    sensors.clear()
+    names.clear()
+
+
+def stats():
+    return {"tokens": tokens.stats(), "sensors": sensors.stats(), "names": names.stats()}
+
+
+@receiver([post_save, post_delete], sender=Token)
+def _token_changed(sender, instance, **kwargs):
+    tokens.delete(instance.key)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, **kwargs):
+    tokens.delete_where(lambda key, user: user.pk == instance.pk)
+    sensors.delete_where(lambda key, sensor: key[0] == instance.pk)
+    names.delete_where(lambda key, sensor: key[0] == instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Sensor)
+def _sensor_changed(sender, instance, **kwargs):
+    # Matched on sensor id only, so a change of owner drops the old owner's entry too
+    sensors.delete_where(lambda key, sensor: key[1] == instance.pk)
+    # A renamed sensor may be older than the one cached under its new name, so that entry goes too
+    names.delete_where(lambda key, sensor: sensor.pk == instance.pk or key == (instance.owner_id, instance.name))
@@ -0,0 +1,115 @@
+# Compact columnar binary encoding for readings, sent when a client asks for it with
+# "Accept: application/vnd.sensor-readings.columnar". One frame holds N readings as packed
+# little-endian arrays that map straight onto JavaScript typed arrays:
+#
+#   offset 0   8 bytes     magic b"RDGCOL1\0"
+#   offset 8   uint32      N, number of readings
+#   offset 12  uint32      flags, bit 0 set when the ids column is present
+#   then       int64[N]    ids (only with flag bit 0)
+#              int64[N]    timestamps, microseconds since the Unix epoch (UTC)
+#              float64[N]  temperature
+#              float64[N]  humidity, NaN where the humidity is null
+#              uint8[M]    null mask, bit i % 8 of byte i // 8 set when humidity i is null,
+#                          M = ceil(N / 64) * 8 so the frame length stays a multiple of 8
+#
+# Every array starts on an 8-byte boundary. Exports stream several frames back to back.
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+
+CONTENT_TYPE = "application/vnd.sensor-readings.columnar"
+MAGIC = b"RDGCOL1\0"
+HAS_IDS = 1
+
+_HEADER = struct.Struct("<8sII")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+# True when the Accept header names the columnar type (a bare */* keeps JSON)
+def wants_columnar(request):
+    return any(f"{t.main_type}/{t.sub_type}" == CONTENT_TYPE for t in request.accepted_types)
+
+
+def _packed(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+# Encodes one frame. `rows` are (timestamp, temperature, humidity) tuples,
+# or (id, timestamp, temperature, humidity) with with_ids=True.
+def encode_frame(rows, with_ids=False):
+    if with_ids:
+        ids, timestamps, temperatures, humidities = zip(*rows) if rows else ((), (), (), ())
+    else:
+        timestamps, temperatures, humidities = zip(*rows) if rows else ((), (), ())
+
+    mask = bytearray((len(rows) + 63) // 64 * 8)
+    for i, humidity in enumerate(humidities):
+        if humidity is None:
+            mask[i >> 3] |= 1 << (i & 7)
+
+    parts = [_HEADER.pack(MAGIC, len(rows), HAS_IDS if with_ids else 0)]
+    if with_ids:
+        parts.append(_packed("q", ids))
+    parts.append(_packed("q", [(ts - _EPOCH) // _MICROSECOND for ts in timestamps]))
+    parts.append(_packed("d", temperatures))
+    parts.append(_packed("d", [float("nan") if h is None else h for h in humidities]))
+    parts.append(bytes(mask))
+    return b"".join(parts)
+
+
+# Yields one frame per `chunk_size` rows of (timestamp, temperature, humidity), for exports.
+# device_id is unused (it is in the file name), the argument keeps the EXPORT_FORMATS signature.
+def columnar_chunks(rows, device_id, chunk_size):
+    chunk = []
+    sent = False
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield encode_frame(chunk)
+            chunk = []
+            sent = True
+    if chunk or not sent:
+        yield encode_frame(chunk)
+
+
+def _unpacked(typecode, data, offset, count):
+    values = array(typecode)
+    values.frombytes(data[offset:offset + 8 * count])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tolist(), offset + 8 * count
+
+
+# Decodes every frame in `data` into a list of reading dicts (used by tests and Python clients)
+def decode_frames(data):
+    readings = []
+    offset = 0
+    while offset < len(data):
+        magic, count, flags = _HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError("Not a columnar readings frame")
+        offset += _HEADER.size
+        ids = None
+        if flags & HAS_IDS:
+            ids, offset = _unpacked("q", data, offset, count)
+        micros, offset = _unpacked("q", data, offset, count)
+        temperatures, offset = _unpacked("d", data, offset, count)
+        humidities, offset = _unpacked("d", data, offset, count)
+        mask = data[offset:offset + (count + 63) // 64 * 8]
+        offset += len(mask)
+
+        for i in range(count):
+            reading = {
+                "timestamp": _EPOCH + micros[i] * _MICROSECOND,
+                "temperature": temperatures[i],
+                "humidity": None if mask[i >> 3] & (1 << (i & 7)) else humidities[i],
+            }
+            if ids is not None:
+                reading["id"] = ids[i]
+            readings.append(reading)
+    return readings
@@ -0,0 +1,151 @@
+# Age-based compaction of raw readings. READINGS_COMPACTION is a policy like "30d:5m,365d:1h": readings
+# older than 30 days are replaced by one reading per 5 minutes, older than a year by one per hour, each
+# holding the average temperature and humidity of its bucket. The compact_readings command applies it a
+# bounded slice at a time: per sensor and step at most READINGS_COMPACTION_DAYS whole UTC days, each slice
+# replaced in one transaction. Sensor.compaction_watermarks records how far every step got, so a rerun
+# only looks at the days that aged past a step since the last run.
+# Values are averages of the rows found in the slice. For whole-hour or whole-day steps a bucket takes the
+# rollup's average instead when the rollup counts at least as many readings as there are rows, so a span
+# compacted to 5m before still gets exact hourly values; a bucket whose rollup is missing or short (readings
+# changed outside the API) keeps the average of its rows, nothing is dropped. Rollups themselves are never
+# touched, so hourly and daily aggregates stay exact. Readings written below a watermark later on stay raw.
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from . import rollups
+from .ingest import mark_changed, refresh_snapshots
+from .models import Reading, Sensor
+from .timeseries import bucket_start, format_bucket, parse_bucket
+
+DAY = 86400
+RAW = "raw"  # X-Readings-Resolution of readings that are not compacted
+
+
+# Parses "30d:5m,365d:1h" into [(age seconds, resolution seconds)], youngest step first.
+# Raises ValueError unless ages and resolutions both grow and every resolution divides a day.
+def parse_policy(text):
+    policy = []
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        age, sep, resolution = part.partition(":")
+        if not sep:
+            raise ValueError(f"Invalid compaction step {part.strip()!r} (use age:resolution, e.g. 30d:5m)")
+        policy.append((parse_bucket(age), parse_bucket(resolution)))
+    for age, resolution in policy:
+        if DAY % resolution:
+            raise ValueError(f"Compaction resolution {format_bucket(resolution)} must divide a day")
+    for (age, resolution), (older_age, coarser) in zip(policy, policy[1:]):
+        if older_age <= age or coarser <= resolution:
+            raise ValueError("Compaction steps must get older and coarser from left to right")
+    return policy
+
+
+def _day(dt):
+    return datetime.combine(timezone.localtime(dt, dt_timezone.utc).date(), time(), tzinfo=dt_timezone.utc)
+
+
+def _watermark(sensor, resolution):
+    value = sensor.compaction_watermarks.get(str(resolution))
+    return datetime.fromisoformat(value) if value else None
+
+
+# Where the next slice of a step starts: the day of the oldest reading after its own watermark and
+# those of coarser steps (a coarser step may be ahead). None when no such reading exists.
+def _slice_start(sensor, policy, resolution):
+    readings = Reading.objects.filter(sensor=sensor)
+    marks = [mark for mark in (_watermark(sensor, res) for _, res in policy if res >= resolution) if mark]
+    if marks:
+        readings = readings.filter(timestamp__gte=max(marks))
+    oldest = readings.order_by("timestamp").values_list("timestamp", flat=True).first()
+    return max([_day(oldest)] + marks) if oldest else None
+
+
+# Replaces the sensor's readings in [start, end) by one per `resolution` seconds in one transaction.
+# Returns (readings removed, readings written).
+def compact_slice(sensor, resolution, start, end):
+    with transaction.atomic():
+        # Writers update the sensor row in their insert transaction, so none can commit into the slice meanwhile
+        Sensor.objects.select_for_update().filter(pk=sensor.pk).values_list("pk").first()
+        buckets = rollups.aggregate(sensor.pk, resolution, start, end, raw=True)
+        if rollups.pick_resolution(resolution, start, end):
+            for epoch, stats in rollups.aggregate(sensor.pk, resolution, start, end).items():
+                if epoch in buckets and stats["count"] >= buckets[epoch]["count"]:
+                    buckets[epoch] = stats
+        compacted = [
+            Reading(
+                sensor=sensor,
+                timestamp=bucket_start(epoch),
+                temperature=stats["temperature_sum"] / stats["count"],
+                humidity=stats["humidity_sum"] / stats["humidity_count"] if stats["humidity_count"] else None,
+            )
+            for epoch, stats in buckets.items()
+            if stats["count"] and bucket_start(epoch) < end  # aggregate() also returns the reading at exactly `end`
+        ]
+        removed, _ = Reading.objects.filter(sensor=sensor, timestamp__gte=start, timestamp__lt=end).delete()
+        Reading.objects.bulk_create(compacted, batch_size=settings.READINGS_BULK_BATCH_SIZE)
+
+        sensor.compaction_watermarks[str(resolution)] = end.isoformat()
+        Sensor.objects.filter(pk=sensor.pk).update(
+            compaction_watermarks=sensor.compaction_watermarks,
+            compacted_until=Greatest(Coalesce(F("compacted_until"), Value(end)), Value(end)),
+            reading_count=Greatest(F("reading_count") - removed + len(compacted), Value(0)),
+        )
+        mark_changed([sensor.pk])
+        if sensor.last_timestamp is not None and sensor.last_timestamp < end:
+            refresh_snapshots([sensor.pk])  # The newest reading was compacted too
+    return removed, len(compacted)
+
+
+# Moves the watermark of a step forward without touching readings (nothing to compact below it)
+def _skip_to(sensor, resolution, end):
+    sensor.compaction_watermarks[str(resolution)] = end.isoformat()
+    Sensor.objects.filter(pk=sensor.pk).update(compaction_watermarks=sensor.compaction_watermarks)
+
+
+# Runs one bounded pass of the policy over all sensors (or one), coarsest step first, at most `days`
+# days per sensor and step. Yields (sensor, resolution, start, end, removed, written) per compacted slice.
+def run(policy, days=None, sensor_id=None, now=None):
+    now = now or timezone.now()
+    span = timedelta(days=days or settings.READINGS_COMPACTION_DAYS)
+    sensors = Sensor.objects.order_by("id")
+    if sensor_id is not None:
+        sensors = sensors.filter(pk=sensor_id)
+    for sensor in sensors.iterator():
+        for age, resolution in reversed(policy):
+            target = _day(now - timedelta(seconds=age))
+            own = _watermark(sensor, resolution)
+            if own is not None and own >= target:
+                continue  # The usual case on a rerun: no query at all
+            start = _slice_start(sensor, policy, resolution)
+            if start is None or start >= target:
+                _skip_to(sensor, resolution, target)  # Nothing old enough left for this step
+                continue
+            end = min(target, start + span)
+            removed, written = compact_slice(sensor, resolution, start, end)
+            yield sensor, resolution, start, end, removed, written
+
+
+# Resolution of a reading at `ts`: the coarsest step whose watermark lies after it, 0 when raw
+def resolution_at(watermarks, ts):
+    coarsest = 0
+    for resolution, until in watermarks.items():
+        if ts < datetime.fromisoformat(until):
+            coarsest = max(coarsest, int(resolution))
+    return coarsest
+
+
+# X-Readings-Resolution of a page of readings: "raw", or the resolutions on it newest first, e.g. "raw, 5m"
+def describe(watermarks, compacted_until, timestamps):
+    if compacted_until is None or not timestamps or min(timestamps) >= compacted_until:
+        return RAW
+    labels = []
+    for ts in timestamps:
+        resolution = resolution_at(watermarks, ts)
+        label = format_bucket(resolution) if resolution else RAW
+        if label not in labels:
+            labels.append(label)
+    return ", ".join(labels)
@@ -0,0 +1,34 @@
+# Conditional GET (ETag / Last-Modified) for the sensor and readings endpoints.
+# Each endpoint builds its validator from a counter or timestamp that writes bump, which costs
+# at most one small query. When the client's If-None-Match (or If-Modified-Since) still matches,
+# it gets 304 Not Modified before the main query runs and nothing is serialized.
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+# Strong ETag from the values that identify one version of a response
+def make_etag(*parts):
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+# Adds ETag and Last-Modified. "no-cache" makes browsers revalidate every time instead of
+# reusing a response for a guessed freshness time, and the response differs per token.
+def with_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+# The 304 response when the request's validators match, otherwise None.
+# If-Modified-Since is only checked with match_time=True; leave it off when the timestamp
+# doesn't move on every change (e.g. deletes).
+def not_modified(request, etag, last_modified=None, match_time=True):
+    since = int(last_modified.timestamp()) if last_modified is not None and match_time else None
+    response = get_conditional_response(request, etag=etag, last_modified=since)
+    if response is None:
+        return None
+    return with_validators(response, etag, last_modified)
@@ -0,0 +1,48 @@
+# Streaming CSV / NDJSON encoders for exporting readings
+import csv
+import io
+from django.core.serializers.json import DjangoJSONEncoder
+from .columnar import CONTENT_TYPE as COLUMNAR_TYPE, columnar_chunks
+
+# Same columns as sensor_readings_wide.csv
+CSV_HEADER = ("timestamp", "device_id", "temperature", "humidity")
+
+
+# Yields CSV text for (timestamp, temperature, humidity) rows, one string per `chunk_size` rows
+def csv_chunks(rows, device_id, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    for count, (timestamp, temperature, humidity) in enumerate(rows, start=1):
+        writer.writerow((timestamp, device_id, temperature, "" if humidity is None else humidity))
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Yields newline-delimited JSON for (timestamp, temperature, humidity) rows, one string per `chunk_size` rows
+def ndjson_chunks(rows, device_id, chunk_size):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for timestamp, temperature, humidity in rows:
+        lines.append(encoder.encode({
+            "timestamp": timestamp,
+            "device_id": device_id,
+            "temperature": temperature,
+            "humidity": humidity,
+        }))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+# Export format -> (encoder, content type, file extension)
+EXPORT_FORMATS = {
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson", "ndjson"),
+    "columnar": (columnar_chunks, COLUMNAR_TYPE, "bin"),
+}
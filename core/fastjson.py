@@ -0,0 +1,52 @@
+# orjson based JSON output for the API.
+# ORJSONRenderer replaces Ninja's json.dumps renderer for every endpoint. Values orjson can't
+# encode the same way (datetimes, Decimals, UUIDs, ...) go through NinjaJSONEncoder, so they
+# look exactly as before (e.g. "2025-11-09T21:00:00.123Z").
+# rows_response() is the fast path for large lists: plain values_list tuples are encoded
+# directly, skipping model instances and per-row schema validation.
+# Response replaces ninja.responses.Response (json.dumps) for bodies returned with their own status.
+import orjson
+from django.http import HttpResponse
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+CONTENT_TYPE = "application/json; charset=utf-8"
+
+_default = NinjaJSONEncoder().default
+
+
+def dumps(data):
+    return orjson.dumps(data, default=_default, option=OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request, data, *, response_status):
+        return dumps(data)
+
+
+def json_response(data):
+    return HttpResponse(dumps(data), content_type=CONTENT_TYPE)
+
+
+# Same signature as ninja.responses.Response, encoded like every other response
+class Response(HttpResponse):
+    def __init__(self, data, status=200, **kwargs):
+        super().__init__(dumps(data), status=status, content_type=CONTENT_TYPE, **kwargs)
+
+
+# Field names of an output schema in the order the renderer writes them
+def schema_fields(schema):
+    return tuple(schema.model_fields)
+
+
+# Rows of values_list(*fields) as dicts, like response=List[Schema] would output them.
+# Only for rows whose values already have the schema's types (no coercion or validation happens).
+def rows_as_dicts(rows, fields):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def rows_response(rows, fields):
+    return json_response(rows_as_dicts(rows, fields))
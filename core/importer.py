@@ -0,0 +1,230 @@
+# Bulk import of readings from CSV files laid out like sensor_readings_wide.csv
+# (timestamp, device_id, temperature, humidity). Files are streamed in chunks, device names
+# are resolved once per file and each chunk is written with one bulk insert (or COPY on PostgreSQL).
+import csv
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .ingest import record_written, write_new
+from .models import Reading, Sensor
+
+METHODS = ("auto", "bulk", "copy")
+
+
+# Counters for one import, they can be added together
+def new_stats():
+    return {"rows": 0, "created": 0, "duplicates": 0, "skipped": 0, "seconds": 0.0}
+
+
+def add_stats(total, stats):
+    for key in total:
+        total[key] += stats[key]
+    return total
+
+
+def _parse_timestamp(text):
+    try:
+        ts = datetime.fromisoformat(text)  # Fast path, handles the seed file format
+    except ValueError:
+        ts = parse_datetime(text)
+    if ts is not None and timezone.is_naive(ts):
+        ts = timezone.make_aware(ts)
+    return ts
+
+
+# Turns one CSV row into (device, timestamp, temperature, humidity), or None if it can't be used
+def _parse_row(row):
+    try:
+        ts = _parse_timestamp(row["timestamp"])
+        temperature = float(row["temperature"])
+        humidity = float(row["humidity"]) if row.get("humidity") not in (None, "") else None
+    except (KeyError, TypeError, ValueError):
+        return None
+    if ts is None or (humidity is not None and not 0 <= humidity <= 100):
+        return None
+    return row.get("device_id"), ts, temperature, humidity
+
+
+# Loads the owner's sensors as {name: sensor}. If names repeat, the oldest sensor wins.
+def sensors_by_name(owner):
+    sensors = {}
+    for sensor in Sensor.objects.filter(owner=owner).order_by("id"):
+        sensors.setdefault(sensor.name, sensor)
+    return sensors
+
+
+def _resolve_method(method):
+    if method == "auto":
+        return "copy" if connection.vendor == "postgresql" else "bulk"
+    if method == "copy" and connection.vendor != "postgresql":
+        raise ValueError("The copy method needs PostgreSQL")
+    return method
+
+
+# Imports one CSV file for the owner and returns its stats.
+# Unknown devices are skipped unless `sensor_type` is given, then they are created with that type.
+def import_file(path, owner, chunk_size=None, method="auto", sensor_type=None):
+    chunk_size = chunk_size or settings.READINGS_IMPORT_CHUNK_SIZE
+    method = _resolve_method(method)
+    sensors = sensors_by_name(owner)
+    stats = new_stats()
+    started = time.perf_counter()
+
+    with open(path, newline="") as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            stats["rows"] += 1
+            parsed = _parse_row(row)
+            if parsed is None:
+                stats["skipped"] += 1
+                continue
+
+            device = parsed[0]
+            sensor = sensors.get(device)
+            if sensor is None and sensor_type and device:
+                sensor = sensors[device] = Sensor.objects.create(name=device, type=sensor_type, owner=owner)
+            if sensor is None:
+                stats["skipped"] += 1
+                continue
+
+            chunk.append((sensor,) + parsed[1:])
+            if len(chunk) >= chunk_size:
+                add_stats(stats, _write_chunk(chunk, method))
+                chunk = []
+        if chunk:
+            add_stats(stats, _write_chunk(chunk, method))
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+# Writes one chunk of (sensor, timestamp, temperature, humidity) rows in a single transaction
+def _write_chunk(chunk, method):
+    stats = new_stats()
+
+    # Drop repeats inside the chunk before asking the database
+    unique = {}
+    for sensor, ts, temperature, humidity in chunk:
+        key = (sensor.id, ts)
+        if key in unique:
+            stats["duplicates"] += 1
+            continue
+        unique[key] = (sensor, ts, temperature, humidity)
+
+    # Retry once if another writer inserted one of our timestamps between check and insert
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                created = _copy_rows(unique.values()) if method == "copy" else _bulk_rows(unique.values())
+            break
+        except IntegrityError:
+            if attempt == 1:
+                raise
+
+    stats["created"] += created
+    stats["duplicates"] += len(unique) - created
+    return stats
+
+
+# bulk_create path, works on every database
+def _bulk_rows(rows):
+    by_sensor = {}
+    for sensor, ts, temperature, humidity in rows:
+        reading = Reading(sensor=sensor, timestamp=ts, temperature=temperature, humidity=humidity)
+        by_sensor.setdefault(sensor, []).append(reading)
+
+    created = 0
+    for sensor, readings in by_sensor.items():
+        new, _ = write_new(sensor, readings)
+        created += len(new)
+    return created
+
+
+# PostgreSQL path: COPY into a temporary table, then one INSERT ... ON CONFLICT DO NOTHING
+def _copy_rows(rows):
+    sensors = {}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for sensor, ts, temperature, humidity in rows:
+        sensors[sensor.id] = sensor
+        writer.writerow((sensor.id, ts.isoformat(), temperature, "" if humidity is None else humidity))
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Reading._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS import_readings "
+            "(sensor_id bigint, timestamp timestamptz, temperature double precision, humidity double precision) "
+            "ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert("COPY import_readings FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {table} (sensor_id, timestamp, temperature, humidity) "
+            "SELECT sensor_id, timestamp, temperature, humidity FROM import_readings "
+            "ON CONFLICT (sensor_id, timestamp) DO NOTHING "
+            "RETURNING id, sensor_id, timestamp, temperature, humidity"
+        )
+        inserted = cursor.fetchall()
+
+    # Rollups and other follow-up work only for the rows that were really inserted
+    by_sensor = {}
+    for pk, sensor_id, ts, temperature, humidity in inserted:
+        reading = Reading(id=pk, sensor=sensors[sensor_id], timestamp=ts, temperature=temperature, humidity=humidity)
+        by_sensor.setdefault(sensor_id, []).append(reading)
+    for sensor_id, readings in by_sensor.items():
+        record_written(sensors[sensor_id], readings)
+    return len(inserted)
+
+
+# Runs in each worker process of the pool
+def _init_worker():
+    import django
+
+    django.setup()
+    connections.close_all()  # Never share the parent's database connection
+
+
+def _import_in_worker(path, owner_id, chunk_size, method, sensor_type):
+    owner = User.objects.get(pk=owner_id)
+    try:
+        return path, import_file(path, owner, chunk_size, method, sensor_type)
+    finally:
+        connections.close_all()
+
+
+# Imports many files, in parallel worker processes when workers > 1.
+# Yields (path, stats) for each file, in the given order.
+def import_files(paths, owner, chunk_size=None, method="auto", sensor_type=None, workers=1):
+    if connection.vendor == "sqlite":
+        workers = 1  # SQLite allows one writer at a time, parallel workers would only lock each other out
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, import_file(path, owner, chunk_size, method, sensor_type)
+        return
+
+    # Sensors for unknown devices are created up front, so workers don't race to create them
+    if sensor_type:
+        for path in paths:
+            _create_missing_sensors(path, owner, sensor_type)
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(_import_in_worker, path, owner.pk, chunk_size, method, sensor_type) for path in paths
+        ]
+        for future in futures:
+            yield future.result()
+
+
+def _create_missing_sensors(path, owner, sensor_type):
+    known = sensors_by_name(owner)
+    with open(path, newline="") as f:
+        devices = {row.get("device_id") for row in csv.DictReader(f)}
+    for device in sorted(d for d in devices if d and d not in known):
+        Sensor.objects.create(name=device, type=sensor_type, owner=owner)
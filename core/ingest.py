@@ -0,0 +1,260 @@
+# Shared write path for readings, used by the reading endpoints
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, F, FloatField, OuterRef, PositiveBigIntegerField, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from pydantic import ValidationError
+from .models import Reading, Sensor
+from .schemas import DeviceReadingCreate, ReadingCreate
+from . import anomalies, authcache, pubsub, rollups
+
+# Per-item result statuses returned by the batch endpoint
+CREATED = "created"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+
+# Raised by record_written when the sensor was deleted, maybe by another process whose delete
+# this process's auth cache hasn't seen yet. The insert transaction must roll back.
+class SensorDeleted(Exception):
+    pass
+
+
+# Returns an error message when humidity is not a number between 0 and 100
+def check_humidity(humidity):
+    if humidity is None:
+        return None
+    try:
+        h = float(humidity)
+    except (TypeError, ValueError):
+        return "humidity must be a number"
+    if h < 0 or h > 100:
+        return "humidity must be between 0 and 100"
+    return None
+
+
+def _sensors(sensor_ids):
+    return Sensor.objects.all() if sensor_ids is None else Sensor.objects.filter(pk__in=sensor_ids)
+
+
+def _version_bump():
+    return {"readings_version": F("readings_version") + 1, "readings_modified_at": timezone.now()}
+
+
+# Bumps readings_version and readings_modified_at of the sensors (all sensors when sensor_ids is None),
+# so ETags of their readings lists change. Call it in the same transaction as the change of readings.
+# Uses an UPDATE instead of save(): cached sensor objects may hold an old version.
+# The change may touch any time, so history_version is bumped too.
+def mark_changed(sensor_ids=None):
+    _sensors(sensor_ids).update(**_version_bump(), history_version=F("history_version") + 1)
+
+
+# Snapshot changes for newly inserted readings: the count grows, and the last_* fields
+# take the newest of them unless the sensor already has a newer reading (late uploads, which
+# bump history_version)
+def _snapshot_update(readings):
+    newest = max(readings, key=lambda r: r.timestamp)
+    is_newer = Q(last_timestamp__isnull=True) | Q(last_timestamp__lt=newest.timestamp)
+
+    def newest_or_kept(field, value, output_field):
+        return Case(When(is_newer, then=Value(value, output_field=output_field)), default=F(field))
+
+    oldest = min(readings, key=lambda r: r.timestamp)
+    return {
+        "reading_count": F("reading_count") + len(readings),
+        # Readings at or before the newest stored one change the past, not just extend it
+        "history_version": Case(
+            When(last_timestamp__gte=oldest.timestamp, then=F("history_version") + 1),
+            default=F("history_version"),
+            output_field=PositiveBigIntegerField(),
+        ),
+        "last_timestamp": newest_or_kept("last_timestamp", newest.timestamp, DateTimeField()),
+        "last_temperature": newest_or_kept("last_temperature", newest.temperature, FloatField()),
+        "last_humidity": newest_or_kept("last_humidity", newest.humidity, FloatField()),
+    }
+
+
+# Recomputes the reading snapshot of the sensors (all sensors when sensor_ids is None) from their readings,
+# after readings were removed or edited without record_written. Counts every reading, so it is a batch job.
+def refresh_snapshots(sensor_ids=None):
+    readings = Reading.objects.filter(sensor=OuterRef("pk"))
+    latest = readings.order_by("-timestamp")
+    count = readings.order_by().values("sensor").annotate(n=Count("id")).values("n")
+    _sensors(sensor_ids).update(
+        reading_count=Coalesce(Subquery(count), 0),
+        last_timestamp=Subquery(latest.values("timestamp")[:1]),
+        last_temperature=Subquery(latest.values("temperature")[:1]),
+        last_humidity=Subquery(latest.values("humidity")[:1]),
+    )
+
+
+# Runs everything that has to happen after readings were inserted for a sensor:
+# updates the hourly/daily rollups, scores the readings for anomalies, updates the sensor's readings
+# version, snapshot and anomaly state (one UPDATE) and, once the transaction commits, pushes the
+# readings to live stream subscribers. Call it inside the insert transaction.
+# The UPDATE skips deleted sensors, so finding no row raises SensorDeleted and the readings are not kept.
+def record_written(sensor, readings):
+    rollups.apply_readings(sensor.id, [(r.timestamp, r.temperature, r.humidity) for r in readings])
+    if readings:
+        changes = {**_version_bump(), **_snapshot_update(readings)}
+        if settings.ANOMALY_DETECTION_ENABLED:
+            changes["anomaly_state"] = anomalies.score(sensor.id, readings)
+        if not Sensor.objects.filter(pk=sensor.id).update(**changes):
+            authcache.forget_sensor(sensor.id)
+            raise SensorDeleted(sensor.id)
+        transaction.on_commit(partial(pubsub.publish_readings, sensor, readings))
+
+
+# Inserts one reading and runs record_written in one transaction.
+# Raises IntegrityError if the sensor already has a reading at this timestamp, SensorDeleted if it is gone.
+def write_one(sensor, temperature, humidity, timestamp):
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    with transaction.atomic():
+        reading = Reading.objects.create(sensor=sensor, temperature=temperature, humidity=humidity, timestamp=timestamp)
+        record_written(sensor, [reading])
+    return reading
+
+
+# Turns the first pydantic error into a short message like "timestamp: Field required"
+def _validation_message(error):
+    first = error.errors()[0]
+    loc = ".".join(str(part) for part in first["loc"])
+    return f"{loc}: {first['msg']}" if loc else first["msg"]
+
+
+# Inserts the readings of one sensor whose timestamps are not stored yet, then runs record_written.
+# Timestamps must be timezone-aware and unique within `readings`. Returns (created, duplicates).
+# Call it inside a transaction; raises IntegrityError if another writer stored one of the timestamps meanwhile.
+def write_new(sensor, readings):
+    if not readings:
+        return [], []
+    timestamps = [r.timestamp for r in readings]
+
+    # Point lookups on the (sensor, timestamp) index, a chunk of timestamps per query, so the check
+    # costs the same however far apart the readings are (a range scan would load everything between)
+    size = settings.READINGS_BULK_BATCH_SIZE
+    existing = set()
+    for start in range(0, len(timestamps), size):
+        existing.update(
+            Reading.objects.filter(sensor=sensor, timestamp__in=timestamps[start : start + size])
+            .values_list("timestamp", flat=True)
+        )
+    created = [r for r in readings if r.timestamp not in existing]
+    duplicates = [r for r in readings if r.timestamp in existing]
+
+    Reading.objects.bulk_create(created, batch_size=settings.READINGS_BULK_BATCH_SIZE)
+    record_written(sensor, created)
+    return created, duplicates
+
+
+# Validates a list of raw reading dicts and writes the valid ones in bulk.
+# Returns one result dict per input item, in the same order.
+# Raises IntegrityError if another request wrote one of the timestamps meanwhile, SensorDeleted if the
+# sensor was deleted.
+def ingest_batch(sensor, items):
+    results = [None] * len(items)
+    pending = {}  # timestamp -> (index, unsaved reading)
+
+    for index, item in enumerate(items):
+        try:
+            data = ReadingCreate.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": INVALID, "detail": _validation_message(e)}
+            continue
+
+        error = check_humidity(data.humidity)
+        if error:
+            results[index] = {"index": index, "status": INVALID, "detail": error}
+            continue
+
+        ts = data.timestamp
+        if timezone.is_naive(ts):
+            ts = timezone.make_aware(ts)
+        if ts in pending:
+            results[index] = {"index": index, "status": DUPLICATE, "detail": "Duplicate timestamp in batch"}
+            continue
+        pending[ts] = (index, Reading(sensor=sensor, temperature=data.temperature, humidity=data.humidity, timestamp=ts))
+
+    with transaction.atomic():
+        created, duplicates = write_new(sensor, [reading for _, reading in pending.values()])
+
+    for reading in duplicates:
+        index = pending[reading.timestamp][0]
+        results[index] = {
+            "index": index,
+            "status": DUPLICATE,
+            "detail": "Reading for this timestamp already exists for this sensor",
+        }
+    for reading in created:
+        index = pending[reading.timestamp][0]
+        results[index] = {"index": index, "status": CREATED, "id": reading.id}
+    return results
+
+
+def _device_counts(devices, device):
+    return devices.setdefault(device, {"device_id": device, "sensor_id": None, "sensor_created": False,
+                                       "created": 0, "duplicates": 0, "invalid": 0, "skipped": 0})
+
+
+# Validates gateway rows ({device_id, timestamp, temperature, humidity}) for the owner's sensors,
+# resolves all device names at once (cached, see authcache.sensors_named) and writes the new readings
+# of every sensor in one transaction. Unknown devices are skipped unless sensor_type is given, then
+# they get a sensor of that type. Returns (counts per device in upload order, invalid rows).
+# Raises IntegrityError if another request wrote one of the timestamps meanwhile, SensorDeleted if one of
+# the sensors was deleted (it is then dropped from the name cache, so a retry skips or recreates it).
+def ingest_by_device(owner, items, sensor_type=None):
+    devices = {}  # device id -> counts
+    errors = []
+    pending = {}  # device id -> {timestamp: (temperature, humidity)}
+
+    for index, item in enumerate(items):
+        try:
+            data = DeviceReadingCreate.model_validate(item)
+        except ValidationError as e:
+            device = item.get("device_id") if isinstance(item, dict) else None
+            if isinstance(device, str) and device:
+                _device_counts(devices, device)["invalid"] += 1
+            errors.append({"index": index, "status": INVALID, "detail": _validation_message(e)})
+            continue
+
+        error = check_humidity(data.humidity) if data.device_id else "device_id: must not be empty"
+        if error:
+            if data.device_id:
+                _device_counts(devices, data.device_id)["invalid"] += 1
+            errors.append({"index": index, "status": INVALID, "detail": error})
+            continue
+
+        counts = _device_counts(devices, data.device_id)
+        ts = data.timestamp
+        if timezone.is_naive(ts):
+            ts = timezone.make_aware(ts)
+        rows = pending.setdefault(data.device_id, {})
+        if ts in rows:
+            counts["duplicates"] += 1
+            continue
+        rows[ts] = (data.temperature, data.humidity)
+
+    sensors = authcache.sensors_named(owner, devices)
+    with transaction.atomic():
+        unknown = [device for device in pending if device not in sensors]
+        if sensor_type and unknown:
+            new = Sensor.objects.bulk_create([Sensor(name=device, type=sensor_type, owner=owner) for device in unknown])
+            for sensor in new:
+                sensors[sensor.name] = sensor
+                devices[sensor.name]["sensor_created"] = True
+
+        for device, counts in devices.items():
+            sensor = sensors.get(device)
+            rows = pending.get(device, {})
+            if sensor is None:
+                counts["skipped"] += len(rows)
+                continue
+            counts["sensor_id"] = sensor.id
+            readings = [Reading(sensor=sensor, temperature=t, humidity=h, timestamp=ts) for ts, (t, h) in rows.items()]
+            created, duplicates = write_new(sensor, readings)
+            counts["created"] += len(created)
+            counts["duplicates"] += len(duplicates)
+    return list(devices.values()), errors
@@ -0,0 +1,178 @@
+# Write-behind ingest. With INGEST_QUEUE_ENABLED, POST /readings validates the reading, appends it to a
+# local SQLite file in WAL mode and answers 202 without touching the main database. The
+# process_ingest_queue command drains the file: up to INGEST_FLUSH_SIZE readings at a time, at least
+# every INGEST_FLUSH_INTERVAL seconds, all written in one transaction with write_new per sensor.
+# Rows leave the file only after that transaction committed, and a row written before is a duplicate
+# that write_new skips, so a crash at any point loses nothing and writes nothing twice; a restarted
+# worker simply carries on with what is left in the file.
+# The file is shared by every process on the host that uses the same INGEST_QUEUE_PATH. Run one worker per file.
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .ingest import SensorDeleted, write_new
+from .models import Reading, Sensor
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS queue ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_id INTEGER NOT NULL, timestamp TEXT NOT NULL,"
+    " temperature REAL NOT NULL, humidity REAL, enqueued_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)",
+)
+TOTALS = ("written", "duplicates", "dropped")  # Running counts kept in the stats table
+
+
+class QueueFull(Exception):
+    pass
+
+
+_local = threading.local()
+
+
+# One connection per thread and path, in autocommit mode (transactions are opened explicitly)
+def _connection():
+    path = settings.INGEST_QUEUE_PATH
+    conn = getattr(_local, "connections", {}).get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the log on every commit, NORMAL only at checkpoints (survives a crashed process, not a power cut)
+        conn.execute(f"PRAGMA synchronous={'FULL' if settings.INGEST_QUEUE_FSYNC else 'NORMAL'}")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        _local.__dict__.setdefault("connections", {})[path] = conn
+    return conn
+
+
+# Rows are appended with increasing ids and removed from the front, so the id range is the
+# queue length; two index lookups instead of the table scan COUNT(*) would be
+def _depth(conn):
+    first, last = conn.execute("SELECT (SELECT MIN(id) FROM queue), (SELECT MAX(id) FROM queue)").fetchone()
+    return 0 if first is None else last - first + 1
+
+
+# Appends one validated reading and returns its queue id. Raises QueueFull at INGEST_QUEUE_MAX_SIZE.
+def enqueue(sensor_id, temperature, humidity, timestamp):
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    conn = _connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if _depth(conn) >= settings.INGEST_QUEUE_MAX_SIZE:
+            raise QueueFull
+        cursor = conn.execute(
+            "INSERT INTO queue (sensor_id, timestamp, temperature, humidity, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+            (sensor_id, timestamp.isoformat(), temperature, humidity, time.time()),
+        )
+    return cursor.lastrowid
+
+
+def depth():
+    return _depth(_connection())
+
+
+# Unsaved readings per sensor; the first of several queued readings with the same timestamp wins
+def _group(rows):
+    by_sensor = defaultdict(dict)
+    for _, sensor_id, ts, temperature, humidity in rows:
+        by_sensor[sensor_id].setdefault(datetime.fromisoformat(ts), (temperature, humidity))
+    return by_sensor
+
+
+# Writes the queued readings of one sensor in a savepoint. Returns the created readings,
+# or None when the sensor was deleted after the flush looked it up.
+def _write_sensor(sensor, values):
+    readings = [Reading(sensor=sensor, temperature=t, humidity=h, timestamp=ts) for ts, (t, h) in values.items()]
+    try:
+        with transaction.atomic():
+            return write_new(sensor, readings)[0]
+    except SensorDeleted:
+        return None
+
+
+# Writes up to `limit` of the oldest queued readings in one transaction, then removes them from the queue.
+# Returns counts of written, duplicate and dropped readings (dropped: the sensor was deleted meanwhile).
+def flush(limit=None):
+    conn = _connection()
+    rows = conn.execute(
+        "SELECT id, sensor_id, timestamp, temperature, humidity FROM queue ORDER BY id LIMIT ?",
+        (limit or settings.INGEST_FLUSH_SIZE,),
+    ).fetchall()
+    counts = dict.fromkeys(TOTALS, 0)
+    if not rows:
+        return counts
+
+    queued = len(rows)
+    by_sensor = _group(rows)
+    sensors = Sensor.objects.in_bulk(list(by_sensor))
+    with transaction.atomic():
+        for sensor_id, values in by_sensor.items():
+            sensor = sensors.get(sensor_id)
+            if sensor is None:
+                counts["dropped"] += len(values)
+                continue
+            try:
+                created = _write_sensor(sensor, values)
+            except IntegrityError:
+                # A direct write stored one of the timestamps after the duplicate check; now it is found
+                created = _write_sensor(sensor, values)
+            if created is None:
+                counts["dropped"] += len(values)
+                continue
+            counts["written"] += len(created)
+    counts["duplicates"] = queued - counts["written"] - counts["dropped"]
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM queue WHERE id <= ?", (rows[-1][0],))
+        for name, value in counts.items():
+            _add_stat(conn, name, value)
+        _add_stat(conn, "flushes", 1)
+        conn.execute("INSERT OR REPLACE INTO stats (name, value) VALUES ('last_flush_at', ?)", (time.time(),))
+    return counts
+
+
+def _add_stat(conn, name, value):
+    conn.execute(
+        "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+        (name, value),
+    )
+
+
+# Drains the queue until stop() returns True: flushes as soon as INGEST_FLUSH_SIZE readings are
+# waiting, or when INGEST_FLUSH_INTERVAL seconds passed since the last flush. Calls on_flush(counts).
+def run(stop, on_flush=None, poll=0.05):
+    size, interval = settings.INGEST_FLUSH_SIZE, settings.INGEST_FLUSH_INTERVAL
+    while not stop():
+        deadline = time.monotonic() + interval
+        while depth() < size and time.monotonic() < deadline and not stop():
+            time.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+        counts = flush(size)
+        if on_flush and any(counts.values()):
+            on_flush(counts)
+
+
+# Queue depth, age of the oldest queued reading (the lag until it is written) and the worker's totals
+def status():
+    path = settings.INGEST_QUEUE_PATH
+    result = {"enabled": settings.INGEST_QUEUE_ENABLED, "depth": 0, "max_size": settings.INGEST_QUEUE_MAX_SIZE,
+              "lag_seconds": 0.0, "last_flush_at": None, "flushes": 0, **dict.fromkeys(TOTALS, 0)}
+    if not os.path.exists(path):
+        return result
+    conn = _connection()
+    result["depth"] = _depth(conn)
+    oldest = conn.execute("SELECT enqueued_at FROM queue ORDER BY id LIMIT 1").fetchone()
+    if oldest:
+        result["lag_seconds"] = round(max(0.0, time.time() - oldest[0]), 3)
+    for name, value in conn.execute("SELECT name, value FROM stats"):
+        if name == "last_flush_at":
+            result[name] = datetime.fromtimestamp(value, tz=dt_timezone.utc).isoformat()
+        else:
+            result[name] = int(value)
+    return result
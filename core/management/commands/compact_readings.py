@@ -0,0 +1,32 @@
+# Custom Django management command that applies the READINGS_COMPACTION policy to old readings
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core import compaction
+from core.timeseries import format_bucket
+
+# Run with: python manage.py compact_readings [--policy 30d:5m,365d:1h] [--days 1] [--sensor ID]
+# Meant to run daily or more often; each run compacts a bounded slice and a rerun with nothing new costs one query.
+class Command(BaseCommand):
+    help = "Replaces old raw readings by averages per time bucket, following the READINGS_COMPACTION policy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", default=settings.READINGS_COMPACTION, help='Steps like "30d:5m,365d:1h" (age:resolution)')
+        parser.add_argument("--days", type=int, default=settings.READINGS_COMPACTION_DAYS, help="Max days per sensor and step in this run")
+        parser.add_argument("--sensor", type=int, help="Only compact this sensor id")
+
+    def handle(self, *args, **opts):
+        try:
+            policy = compaction.parse_policy(opts["policy"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not policy:
+            self.stdout.write(self.style.SUCCESS("No compaction policy set, readings stay raw"))
+            return
+
+        slices = removed = written = 0
+        for sensor, resolution, start, end, gone, new in compaction.run(policy, opts["days"], opts["sensor"]):
+            self.stdout.write(f"sensor {sensor.pk} ({sensor.name}): {start:%Y-%m-%d} to {end:%Y-%m-%d} at {format_bucket(resolution)}, {gone} readings -> {new}")
+            slices += 1
+            removed += gone
+            written += new
+        self.stdout.write(self.style.SUCCESS(f"Slices compacted: {slices}, readings removed: {removed}, written: {written}"))
@@ -0,0 +1,54 @@
+# Custom Django management command to bulk import readings from CSV files
+import glob
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.importer import METHODS, add_stats, import_files, new_stats
+
+# Run with: python manage.py import_readings data/*.csv --owner jennifer_test
+class Command(BaseCommand):
+    help = "Imports readings from CSV files (timestamp, device_id, temperature, humidity) for one user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="CSV files or glob patterns")
+        parser.add_argument("--owner", required=True, help="Username that owns the sensors")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per insert (default READINGS_IMPORT_CHUNK_SIZE)")
+        parser.add_argument("--method", choices=METHODS, default="auto", help="copy needs PostgreSQL, auto picks it when possible")
+        parser.add_argument("--workers", type=int, default=1, help="Import this many files in parallel processes")
+        parser.add_argument("--create-sensors", metavar="TYPE", help="Create sensors for unknown devices with this type")
+
+    def handle(self, *args, **opts):
+        try:
+            owner = User.objects.get(username=opts["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"User not found: {opts['owner']}")
+
+        # Expand globs, keep the given order and drop repeats
+        paths = []
+        for pattern in opts["paths"]:
+            matches = sorted(glob.glob(pattern)) or [pattern]
+            paths += [p for p in matches if p not in paths]
+
+        total = new_stats()
+        try:
+            for path, stats in import_files(
+                paths,
+                owner,
+                chunk_size=opts["chunk_size"],
+                method=opts["method"],
+                sensor_type=opts["create_sensors"],
+                workers=opts["workers"],
+            ):
+                self.stdout.write(f"{path}: {self.summary(stats)}")
+                add_stats(total, stats)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Import complete: {self.summary(total)}"))
+
+    # One line with counts and throughput
+    def summary(self, stats):
+        rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+        return (
+            f"{stats['rows']} rows, {stats['created']} created, {stats['duplicates']} duplicates, "
+            f"{stats['skipped']} skipped in {stats['seconds']:.1f}s ({rate:,.0f} rows/s)"
+        )
@@ -0,0 +1,33 @@
+# Custom Django management command for the monthly reading partitions and the retention period
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core import partitions
+
+# Run with: python manage.py manage_partitions [--ahead 3] [--retention-months 12] [--archive-dir PATH]
+# Meant to run daily (cron or a scheduler), it is safe to run as often as you like.
+class Command(BaseCommand):
+    help = "Creates upcoming monthly reading partitions and removes readings older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=settings.READINGS_PARTITIONS_AHEAD, help="Months to create ahead of the current one")
+        parser.add_argument(
+            "--retention-months", type=int, default=settings.READINGS_RETENTION_MONTHS, help="Keep this many months, 0 keeps everything"
+        )
+        parser.add_argument("--archive-dir", default=settings.READINGS_ARCHIVE_DIR, help="Save expired readings here as CSV first")
+
+    def handle(self, *args, **opts):
+        if partitions.is_partitioned():
+            created = partitions.create_partitions(opts["ahead"])
+            self.stdout.write(f"Partitions created: {', '.join(created) or 'none'}")
+        else:
+            self.stdout.write("Readings table is not partitioned, only retention applies")
+
+        if opts["retention_months"] <= 0:
+            self.stdout.write(self.style.SUCCESS("Retention disabled, no readings removed"))
+            return
+
+        removed = partitions.expire(opts["retention_months"], archive_dir=opts["archive_dir"] or None)
+        for name, rows in removed:
+            self.stdout.write(f"{name}: {rows} readings removed")
+        cutoff = partitions.retention_cutoff(opts["retention_months"])
+        self.stdout.write(self.style.SUCCESS(f"Readings before {cutoff:%Y-%m-%d} removed: {sum(rows for _, rows in removed)}"))
@@ -0,0 +1,35 @@
+# Custom Django management command that writes queued readings (INGEST_QUEUE_ENABLED) to the database
+import signal
+from django.core.management.base import BaseCommand
+from core import ingestqueue
+
+# Run with: python manage.py process_ingest_queue [--once]
+class Command(BaseCommand):
+    help = "Drains the write-behind ingest queue into the database in batches, until stopped (SIGTERM/SIGINT)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Write everything queued now, then exit")
+
+    def handle(self, *args, **opts):
+        if opts["once"]:
+            total = 0
+            while True:
+                counts = ingestqueue.flush()
+                if not any(counts.values()):
+                    break
+                total += counts["written"]
+            self.stdout.write(self.style.SUCCESS(f"Ingest queue drained: {total} readings written"))
+            return
+
+        # A stop signal lets the current batch finish; whatever is still queued waits in the file for the next start
+        stopping = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stopping.append(True))
+        self.stdout.write(f"Draining {ingestqueue.depth()} queued readings, then waiting for more")
+        ingestqueue.run(
+            stop=lambda: bool(stopping),
+            on_flush=lambda counts: self.stdout.write(
+                f"written {counts['written']}, duplicates {counts['duplicates']}, dropped {counts['dropped']}"
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stopped, {ingestqueue.depth()} readings left in the queue"))
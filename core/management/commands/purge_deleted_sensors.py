@@ -0,0 +1,34 @@
+# Custom Django management command that removes the readings of deleted sensors, then the sensors themselves
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core import purge
+
+# Run with: python manage.py purge_deleted_sensors [--chunk-size 5000] [--pause 0.1] [--status]
+# Meant to run every few minutes (cron or a scheduler); an interrupted run continues where it stopped.
+class Command(BaseCommand):
+    help = "Purges the readings of deleted sensors in chunks and then deletes the sensors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=settings.PURGE_CHUNK_SIZE, help="Readings removed per transaction")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to wait between chunks, to leave room for other writers")
+        parser.add_argument("--status", action="store_true", help="Only list the deleted sensors and the readings they still have")
+
+    def handle(self, *args, **opts):
+        sensors = list(purge.pending())
+        if opts["status"]:
+            for sensor in sensors:
+                self.stdout.write(f"sensor {sensor.pk} ({sensor.name}): deleted {sensor.deleted_at:%Y-%m-%d %H:%M}, {sensor.reading_count} readings left")
+            self.stdout.write(self.style.SUCCESS(f"{len(sensors)} deleted sensors waiting to be purged"))
+            return
+
+        def progress(sensor, removed, remaining):
+            self.stdout.write(f"sensor {sensor.pk} ({sensor.name}): {removed} readings removed, {remaining} left")
+            if opts["pause"]:
+                time.sleep(opts["pause"])
+
+        total = 0
+        for sensor in sensors:
+            total += purge.purge_sensor(sensor, opts["chunk_size"], on_chunk=progress)
+            self.stdout.write(f"sensor {sensor.pk} ({sensor.name}) purged")
+        self.stdout.write(self.style.SUCCESS(f"Deleted sensors purged: {len(sensors)}, readings removed: {total}"))
@@ -0,0 +1,19 @@
+# Custom Django management command to recompute the hourly/daily reading rollups and sensor snapshots from raw readings
+from django.core.management.base import BaseCommand
+from core import rollups
+from core.ingest import mark_changed, refresh_snapshots
+
+# Run with: python manage.py rebuild_rollups [--sensor ID]
+class Command(BaseCommand):
+    help = "Recomputes reading rollups and sensor snapshots from raw readings (use after editing readings outside the API)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sensor", type=int, help="Only rebuild rollups for this sensor id")
+
+    def handle(self, *args, **opts):
+        written = rollups.rebuild(sensor_id=opts["sensor"])
+        # Readings were edited outside the API, so cached readings lists and snapshots are out of date too
+        sensor_ids = None if opts["sensor"] is None else [opts["sensor"]]
+        mark_changed(sensor_ids)
+        refresh_snapshots(sensor_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt: {written} rows written"))
@@ -3,11 +3,8 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from core.models import Sensor
-from core.models import Reading
-import csv
 from pathlib import Path
-from django.utils.dateparse import parse_datetime
-from django.db import IntegrityError
+from core.importer import import_file
 
 # List of sensors to add for the test user
 SENSORS = [
@@ -46,36 +43,9 @@ class Command(BaseCommand):
                 self.stderr.write(f"CSV not found: {csv_path}")
                 return
 
-        created_count = 0
+        # Stream the CSV through the bulk importer, rows for unknown devices are skipped
+        stats = import_file(csv_path, user)
+        created_count = stats["created"]
 
-        # Open csv and read rows using the header name
-        with csv_path.open(newline="") as f:
-            reader = csv.DictReader(f)  # expects: timestamp, device_id, temperature, humidity
-            for row in reader:
-                device = row["device_id"]  # Match device name to Sensor.name
-
-                try:
-                    sensor = Sensor.objects.get(name=device, owner=user)
-                except Sensor.DoesNotExist:
-                    continue  # skip unknown devices
-
-                ts = parse_datetime(row["timestamp"])
-                if not ts:
-                    continue  # skip bad timestamps
-
-                # Create a Reading linked to the sensor
-                try:
-                    Reading.objects.create(
-                        sensor=sensor,
-                        temperature=float(row["temperature"]),
-                        humidity=float(row["humidity"]),
-                        timestamp=ts,
-                    )
-                    created_count += 1
-                except IntegrityError:
-                    # Skip duplicate readings for same (sensor, timestamp)
-                    continue
-
-     
         # Print a success message in the terminal when seeding is done
         self.stdout.write(self.style.SUCCESS(f"Seed complete: {created_count} readings added from CSV"))
\ No newline at end of file
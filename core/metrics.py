@@ -0,0 +1,207 @@
+# Request metrics in Prometheus text format, served at /api/metrics.
+# MetricsMiddleware records, per route and method: a latency histogram, requests by status code,
+# a histogram of SQL queries per request, time spent in SQL and a response size histogram.
+# Queries are counted by a wrapper in every connection's execute_wrappers (see Django's
+# connection.execute_wrapper) that adds to the stats of the current request, found through a
+# context variable so it also works when an async view runs its queries in a worker thread.
+# With METRICS_ENABLED off the middleware removes itself at startup and no wrapper is installed.
+# Metrics are per process: with several workers, each one counts its own requests.
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)  # Bytes
+UNMATCHED = "unmatched"  # Route label of requests no URL pattern matched (404s)
+
+
+# SQL done by one request
+class RequestStats:
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+_current = ContextVar("metrics_request", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+# Puts the query wrapper first, so connection.execute_wrapper() blocks, which pop the last entry, leave it alone
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+# Connections are per thread; request_started is sent in the thread that runs the view's queries,
+# also under ASGI, where it goes through the same thread-sensitive executor as sync views
+def _install_all(**kwargs):
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}  # label values -> total
+
+    def add(self, values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def lines(self):
+        for values, total in sorted(self.series.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {_number(total)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}  # label values -> [count per bucket (last one +Inf), sum]
+
+    def observe(self, values, value):
+        entry = self.series.get(values)
+        if entry is None:
+            entry = self.series[values] = [[0] * (len(self.buckets) + 1), 0]
+        counts = entry[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        entry[1] += value
+
+    def lines(self):
+        for values, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ("method", "route")
+        self.requests = Counter("http_requests_total", "Requests by route, method and status code", route + ("status",))
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Time until the response was returned", route, DURATION_BUCKETS
+        )
+        self.queries = Histogram("http_request_db_queries", "SQL queries per request", route, QUERY_BUCKETS)
+        self.query_seconds = Counter("http_request_db_seconds_total", "Time spent in SQL queries", route)
+        self.size = Histogram(
+            "http_response_size_bytes", "Response body size (streaming responses are left out)", route, SIZE_BUCKETS
+        )
+        self.metrics = (self.requests, self.duration, self.queries, self.query_seconds, self.size)
+
+    def observe(self, request, response, stats, seconds):
+        match = request.resolver_match
+        key = (request.method, match.route if match is not None else UNMATCHED)
+        size = None if response.streaming else len(response.content)
+        with self._lock:
+            self.requests.add(key + (str(response.status_code),))
+            self.duration.observe(key, seconds)
+            self.queries.observe(key, stats.queries)
+            self.query_seconds.add(key, stats.query_seconds)
+            if size is not None:
+                self.size.observe(key, size)
+
+    def clear(self):
+        with self._lock:
+            for metric in self.metrics:
+                metric.series.clear()
+
+    # All metrics in the Prometheus text exposition format
+    def render(self):
+        out = []
+        with self._lock:
+            for metric in self.metrics:
+                out.append(f"# HELP {metric.name} {metric.help}")
+                out.append(f"# TYPE {metric.name} {metric.kind}")
+                out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+# First entry of MIDDLEWARE, so the timing covers the other middleware too
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(_install, dispatch_uid="core.metrics")
+        request_started.connect(_install_all, dispatch_uid="core.metrics")
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.observe(request, response, stats, time.perf_counter() - started)
+        return response
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:29
+
+# Creates the rollup table and fills it from the readings already stored, so hour- and day-aligned
+# aggregates of old readings find their rollups. The aggregation is written out here instead of
+# calling core.rollups, so this migration keeps doing the same thing however that module changes.
+# Buckets start at whole multiples of their length since the epoch, like core.rollups.
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+RESOLUTIONS = (3600, 86400)  # ReadingRollup.HOUR, ReadingRollup.DAY
+
+
+def _lower(a, b):
+    return b if a is None else min(a, b)
+
+
+def _higher(a, b):
+    return b if a is None else max(a, b)
+
+
+# Hourly and daily rollups of one sensor's readings, read once in timestamp order
+def _sensor_rollups(Reading, ReadingRollup, sensor_id):
+    buckets = {}  # (resolution, bucket epoch) -> rollup
+    readings = Reading.objects.filter(sensor_id=sensor_id).order_by("timestamp")
+    for ts, temperature, humidity in readings.values_list("timestamp", "temperature", "humidity").iterator(chunk_size=2000):
+        epoch = int(ts.timestamp())
+        for resolution in RESOLUTIONS:
+            start = epoch // resolution * resolution
+            rollup = buckets.get((resolution, start))
+            if rollup is None:
+                rollup = buckets[(resolution, start)] = ReadingRollup(
+                    sensor_id=sensor_id, resolution=resolution, bucket_start=datetime.fromtimestamp(start, timezone.utc)
+                )
+            rollup.count += 1
+            rollup.temperature_sum += temperature
+            rollup.temperature_sumsq += temperature * temperature
+            rollup.temperature_min = _lower(rollup.temperature_min, temperature)
+            rollup.temperature_max = _higher(rollup.temperature_max, temperature)
+            if humidity is not None:
+                rollup.humidity_count += 1
+                rollup.humidity_sum += humidity
+                rollup.humidity_sumsq += humidity * humidity
+                rollup.humidity_min = _lower(rollup.humidity_min, humidity)
+                rollup.humidity_max = _higher(rollup.humidity_max, humidity)
+    return buckets.values()
+
+
+def backfill_rollups(apps, schema_editor):
+    Reading = apps.get_model("core", "Reading")
+    ReadingRollup = apps.get_model("core", "ReadingRollup")
+    sensor_ids = list(Reading.objects.order_by().values_list("sensor_id", flat=True).distinct())
+    for sensor_id in sensor_ids:
+        ReadingRollup.objects.bulk_create(_sensor_rollups(Reading, ReadingRollup, sensor_id), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_reading_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(3600, 'hour'), (86400, 'day')])),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_sumsq', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('humidity_count', models.PositiveIntegerField(default=0)),
+                ('humidity_sum', models.FloatField(default=0)),
+                ('humidity_sumsq', models.FloatField(default=0)),
+                ('humidity_min', models.FloatField(blank=True, null=True)),
+                ('humidity_max', models.FloatField(blank=True, null=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.sensor')),
+            ],
+            options={
+                'unique_together': {('sensor', 'resolution', 'bucket_start')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
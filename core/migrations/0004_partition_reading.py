@@ -0,0 +1,114 @@
+# Turns core_reading into a table partitioned by month on PostgreSQL.
+# Other databases (SQLite in tests) keep the plain table, the app works the same on both.
+
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+AHEAD_MONTHS = 3
+
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _month_starts(first, last):
+    month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while month <= last:
+        yield month
+        month = _next_month(month)
+
+
+def partition_readings(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min("timestamp"), max("timestamp") FROM core_reading')
+        first, last = cursor.fetchone()
+        now = datetime.now(timezone.utc)
+        first = min(first or now, now)
+        last = max(last or now, now)
+        ahead = last
+        for _ in range(AHEAD_MONTHS):
+            ahead = _next_month(ahead)
+
+        # The primary key of a partitioned table must contain the partition key, so it becomes (id, timestamp).
+        # Django still treats id alone as the primary key, which stays unique through the sequence.
+        cursor.execute("CREATE SEQUENCE core_reading_partitioned_id_seq")
+        cursor.execute(
+            """
+            CREATE TABLE core_reading_partitioned (
+                id bigint NOT NULL DEFAULT nextval('core_reading_partitioned_id_seq'),
+                temperature double precision NOT NULL,
+                humidity double precision NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                sensor_id bigint NOT NULL,
+                CONSTRAINT core_reading_id_timestamp_pk PRIMARY KEY (id, "timestamp"),
+                CONSTRAINT core_reading_sensor_timestamp_uniq UNIQUE (sensor_id, "timestamp"),
+                CONSTRAINT core_reading_sensor_id_fk FOREIGN KEY (sensor_id)
+                    REFERENCES core_sensor (id) DEFERRABLE INITIALLY DEFERRED
+            ) PARTITION BY RANGE ("timestamp")
+            """
+        )
+        cursor.execute('CREATE INDEX core_reading_timestamp_idx ON core_reading_partitioned ("timestamp")')
+        cursor.execute("CREATE TABLE core_reading_default PARTITION OF core_reading_partitioned DEFAULT")
+        for month in _month_starts(first, ahead):
+            cursor.execute(
+                f"CREATE TABLE core_reading_p{month:%Y_%m} PARTITION OF core_reading_partitioned "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [month, _next_month(month)],
+            )
+
+        cursor.execute(
+            'INSERT INTO core_reading_partitioned (id, temperature, humidity, "timestamp", sensor_id) '
+            'SELECT id, temperature, humidity, "timestamp", sensor_id FROM core_reading'
+        )
+        cursor.execute(
+            "SELECT setval('core_reading_partitioned_id_seq', COALESCE((SELECT max(id) FROM core_reading), 0) + 1, false)"
+        )
+        cursor.execute("DROP TABLE core_reading")
+        cursor.execute("ALTER TABLE core_reading_partitioned RENAME TO core_reading")
+        cursor.execute("ALTER SEQUENCE core_reading_partitioned_id_seq RENAME TO core_reading_id_seq")
+        cursor.execute("ALTER SEQUENCE core_reading_id_seq OWNED BY core_reading.id")
+
+
+def unpartition_readings(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE core_reading_plain (
+                id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+                temperature double precision NOT NULL,
+                humidity double precision NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                sensor_id bigint NOT NULL REFERENCES core_sensor (id) DEFERRABLE INITIALLY DEFERRED,
+                UNIQUE (sensor_id, "timestamp")
+            )
+            """
+        )
+        cursor.execute(
+            'INSERT INTO core_reading_plain (id, temperature, humidity, "timestamp", sensor_id) '
+            'SELECT id, temperature, humidity, "timestamp", sensor_id FROM core_reading'
+        )
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('core_reading_plain', 'id'), "
+            "COALESCE((SELECT max(id) FROM core_reading), 0) + 1, false)"
+        )
+        cursor.execute("DROP TABLE core_reading")  # Drops every partition with it
+        cursor.execute("ALTER TABLE core_reading_plain RENAME TO core_reading")
+        cursor.execute('CREATE INDEX core_reading_timestamp_idx ON core_reading ("timestamp")')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_readingrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_readings, unpartition_readings),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Existing sensors were last changed when they were created, as far as we know
+def updated_from_created(apps, schema_editor):
+    Sensor = apps.get_model("core", "Sensor")
+    Sensor.objects.update(updated_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_partition_reading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='readings_modified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='readings_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(updated_from_created, migrations.RunPython.noop),
+    ]
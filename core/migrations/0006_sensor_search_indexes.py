@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:58
+
+# Owner indexes for sensor listing, plus search indexes that depend on the database (core.search.SearchIndex):
+# PostgreSQL gets pg_trgm GIN indexes for the icontains search on name and type,
+# SQLite gets case-insensitive (NOCASE) indexes for its prefix search.
+
+import core.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# TrigramExtension skips other databases going forward but queries pg_extension going back
+class PostgresTrigramExtension(TrigramExtension):
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sensor_validators'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['owner', 'id'], name='sensor_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['owner', 'name'], name='sensor_owner_name_idx'),
+        ),
+        PostgresTrigramExtension(),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=core.search.SearchIndex(column='name', name='sensor_name_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=core.search.SearchIndex(column='type', name='sensor_type_search_idx'),
+        ),
+    ]
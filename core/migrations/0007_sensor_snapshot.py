@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Fills the snapshot of existing sensors from their readings (same as ingest.refresh_snapshots)
+def fill_snapshots(apps, schema_editor):
+    Sensor = apps.get_model("core", "Sensor")
+    Reading = apps.get_model("core", "Reading")
+    readings = Reading.objects.filter(sensor=OuterRef("pk"))
+    latest = readings.order_by("-timestamp")
+    count = readings.order_by().values("sensor").annotate(n=Count("id")).values("n")
+    Sensor.objects.update(
+        reading_count=Coalesce(Subquery(count), 0),
+        last_timestamp=Subquery(latest.values("timestamp")[:1]),
+        last_temperature=Subquery(latest.values("temperature")[:1]),
+        last_humidity=Subquery(latest.values("humidity")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_sensor_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='last_humidity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='last_temperature',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='last_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='reading_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sensor_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
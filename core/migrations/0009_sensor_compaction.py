@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sensor_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='compacted_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='compaction_watermarks',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
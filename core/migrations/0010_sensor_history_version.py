@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sensor_compaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='history_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
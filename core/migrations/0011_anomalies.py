@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sensor_history_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='anomaly_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('field', models.CharField(choices=[('temperature', 'temperature'), ('humidity', 'humidity')], max_length=20)),
+                ('value', models.FloatField()),
+                ('expected', models.FloatField()),
+                ('score', models.FloatField()),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='core.sensor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sensor', 'timestamp'], name='anomaly_sensor_ts_idx'), models.Index(fields=['timestamp'], name='anomaly_ts_idx')],
+            },
+        ),
+    ]
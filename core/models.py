@@ -1,5 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .search import SearchIndex
+
+# Default manager of Sensor: leaves out deleted sensors, which stay in the table until their readings are purged
+class SensorManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 # Model that defines a sensor owned by a user, including its name, type and creation date
 class Sensor(models.Model):
@@ -7,6 +13,36 @@ class Sensor(models.Model):
     type = models.CharField(max_length=50)
     owner = models.ForeignKey(User, on_delete=models.CASCADE) # Links the sensor to the user who owns it
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Last change of the sensor itself (name, type)
+    readings_version = models.PositiveBigIntegerField(default=0) # Bumped whenever readings of the sensor change, see ingest.mark_changed
+    readings_modified_at = models.DateTimeField(null=True, blank=True) # When readings of the sensor last changed
+    history_version = models.PositiveBigIntegerField(default=0) # Bumped only when readings up to last_timestamp change (late uploads, rewrites), not by new ones
+    # Snapshot of the newest reading and the number of readings, kept up to date by ingest.record_written
+    reading_count = models.PositiveBigIntegerField(default=0)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_temperature = models.FloatField(null=True, blank=True)
+    last_humidity = models.FloatField(null=True, blank=True)
+    # Compaction progress (see core/compaction.py): resolution in seconds -> end of the span compacted to it,
+    # and the latest of those ends, before which no raw readings are left
+    compaction_watermarks = models.JSONField(default=dict, blank=True)
+    compacted_until = models.DateTimeField(null=True, blank=True)
+    # Rolling anomaly scoring state (see core/anomalies.py): field -> [EWMA mean, EWMA variance, readings seen],
+    # plus "until", the newest timestamp folded in
+    anomaly_state = models.JSONField(default=dict, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True) # Set by DELETE /sensors/{id}, the readings are removed later by purge_deleted_sensors
+
+    objects = SensorManager()
+    all_objects = models.Manager() # Deleted sensors included
+
+    class Meta:
+        # Owner-scoped listing: keyset pages walk (owner, id), name lookups use (owner, name).
+        # The search indexes differ per database, see core/search.py.
+        indexes = [
+            models.Index(fields=["owner", "id"], name="sensor_owner_id_idx"),
+            models.Index(fields=["owner", "name"], name="sensor_owner_name_idx"),
+            SearchIndex(column="name", name="sensor_name_search_idx"),
+            SearchIndex(column="type", name="sensor_type_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -23,4 +59,55 @@ class Reading(models.Model):
         unique_together = ("sensor", "timestamp")
 
         def __str__(self):
-            return f"{self.sensor.name} - {self.timestamp}"   
+            return f"{self.sensor.name} - {self.timestamp}"
+
+# Pre-computed statistics of all readings of a sensor in one hour or one day.
+# Kept up to date by the ingest code so long-range aggregates don't scan raw readings.
+class ReadingRollup(models.Model):
+    HOUR = 3600
+    DAY = 86400
+    RESOLUTION_CHOICES = [(HOUR, "hour"), (DAY, "day")]
+
+    sensor = models.ForeignKey("core.Sensor", on_delete=models.CASCADE, related_name="rollups")
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES) # Bucket length in seconds
+    bucket_start = models.DateTimeField() # UTC start of the bucket
+    count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_sumsq = models.FloatField(default=0) # Sum of squares, for variance
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+    humidity_count = models.PositiveIntegerField(default=0) # Humidity is optional, so it has its own count
+    humidity_sum = models.FloatField(default=0)
+    humidity_sumsq = models.FloatField(default=0)
+    humidity_min = models.FloatField(null=True, blank=True)
+    humidity_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("sensor", "resolution", "bucket_start")
+
+    def __str__(self):
+        return f"{self.sensor_id} - {self.get_resolution_display()} {self.bucket_start}"
+
+
+# A reading that was far off its sensor's recent average when it was written (see core/anomalies.py).
+# Holds the values instead of a link to the reading, so readings stay free to be compacted or expire.
+class Anomaly(models.Model):
+    FIELD_CHOICES = [("temperature", "temperature"), ("humidity", "humidity")]
+
+    sensor = models.ForeignKey("core.Sensor", on_delete=models.CASCADE, related_name="anomalies")
+    timestamp = models.DateTimeField() # Timestamp of the reading
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    value = models.FloatField()
+    expected = models.FloatField() # The sensor's moving average before this reading
+    score = models.FloatField() # Standard deviations from the average, negative below it
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # "Anomalies of a sensor / of all sensors since t" are index range scans
+        indexes = [
+            models.Index(fields=["sensor", "timestamp"], name="anomaly_sensor_ts_idx"),
+            models.Index(fields=["timestamp"], name="anomaly_ts_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.sensor_id} - {self.field} {self.value} at {self.timestamp}"
@@ -0,0 +1,37 @@
+# Opaque cursors for keyset pagination: readings are ordered by (timestamp, id), sensors by id
+import base64
+from django.utils.dateparse import parse_datetime
+
+
+# Packs the sort key of the last row on a page into a url-safe string
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Returns (timestamp, id) from a cursor, raises ValueError if it is not one of ours
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_text, pk_text = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        timestamp = parse_datetime(ts_text)
+        pk = int(pk_text)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if timestamp is None:
+        raise ValueError("Invalid cursor")
+    return timestamp, pk
+
+
+# Cursor after the row with this id, for lists ordered by id alone
+def encode_id_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip("=")
+
+
+# Returns the id from an id cursor, raises ValueError if it is not one of ours
+def decode_id_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
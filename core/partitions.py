@@ -0,0 +1,187 @@
+# Monthly partitions of core_reading and the retention job that removes old readings.
+# On PostgreSQL (after migration 0004) readings live in one partition per month named
+# core_reading_pYYYY_MM plus a default partition. Expired months are dropped as whole tables.
+# Other databases keep a plain table and expired readings are deleted in chunks instead.
+import csv
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from .ingest import mark_changed, refresh_snapshots
+from .models import Reading
+
+TABLE = Reading._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+ARCHIVE_COLUMNS = ("id", "sensor_id", "timestamp", "temperature", "humidity")
+
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(dt):
+    dt = timezone.localtime(dt, dt_timezone.utc) if timezone.is_aware(dt) else dt
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y_%m}"
+
+
+# First month that is kept when readings older than `months` months are expired
+def retention_cutoff(months, now=None):
+    return add_months(month_start(now or timezone.now()), -months)
+
+
+# True when core_reading is a partitioned PostgreSQL table
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = current_schema()::regnamespace",
+            [TABLE],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+# Monthly partitions attached to core_reading, as a sorted list of month starts
+def monthly_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc))
+    return sorted(months)
+
+
+# Creates the partitions for the current month and the next `ahead` months that don't exist yet.
+# Returns the names of the partitions that were created.
+def create_partitions(ahead, now=None):
+    first = month_start(now or timezone.now())
+    existing = set(monthly_partitions())
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(first, offset)
+        if month not in existing:
+            _create_partition(month)
+            created.append(partition_name(month))
+    return created
+
+
+def _create_partition(month):
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s LIMIT 1', bounds
+        )
+        misplaced = cursor.fetchone() is not None
+        if misplaced:
+            # PostgreSQL refuses a new partition while the default one holds rows of its range,
+            # so those rows are moved over while the default partition is detached
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", bounds)
+        if misplaced:
+            cursor.execute(
+                f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s',
+                bounds,
+            )
+            cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s', bounds)
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+
+
+# Removes readings older than `months` months (rollups are kept).
+# When `archive_dir` is set the removed readings are first written there as CSV files.
+# Returns a list of (name, rows) for what was removed: partitions, or one entry for chunked deletes.
+def expire(months, archive_dir=None, chunk_size=10000, now=None):
+    cutoff = retention_cutoff(months, now)
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    # The sensors that lose readings, from one DISTINCT over the expired range; only they get
+    # a new ETag and a recounted snapshot
+    sensor_ids = list(Reading.objects.filter(timestamp__lt=cutoff).order_by().values_list("sensor_id", flat=True).distinct())
+    if is_partitioned():
+        removed = _drop_partitions(cutoff, archive_dir)
+    else:
+        removed = _delete_rows(cutoff, archive_dir, chunk_size)
+    if sensor_ids:
+        mark_changed(sensor_ids)
+        refresh_snapshots(sensor_ids)
+    return removed
+
+
+def _drop_partitions(cutoff, archive_dir):
+    removed = []
+    for month in monthly_partitions():
+        if add_months(month, 1) > cutoff:
+            continue
+        name = partition_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            rows = cursor.fetchone()[0]
+            if archive_dir:
+                with open(os.path.join(archive_dir, f"{name}.csv"), "w", newline="") as f:
+                    columns = ", ".join(f'"{column}"' for column in ARCHIVE_COLUMNS)
+                    cursor.copy_expert(f"COPY {name} ({columns}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            cursor.execute(f"DROP TABLE {name}")
+        removed.append((name, rows))
+
+    # Rows that ended up in the default partition before their month existed
+    with transaction.atomic(), connection.cursor() as cursor:
+        if archive_dir:
+            path = os.path.join(archive_dir, f"{DEFAULT_PARTITION}-before-{cutoff:%Y_%m}.csv")
+            with open(path, "w", newline="") as f:
+                columns = ", ".join(f'"{column}"' for column in ARCHIVE_COLUMNS)
+                query = cursor.mogrify(
+                    f'COPY (SELECT {columns} FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s) '
+                    "TO STDOUT WITH (FORMAT csv, HEADER)",
+                    [cutoff],
+                )
+                cursor.copy_expert(query.decode(), f)
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [cutoff])
+        if cursor.rowcount:
+            removed.append((DEFAULT_PARTITION, cursor.rowcount))
+    return removed
+
+
+# Fallback for databases without partitions: delete in chunks, each in its own short transaction
+def _delete_rows(cutoff, archive_dir, chunk_size):
+    expired = Reading.objects.filter(timestamp__lt=cutoff).order_by("id")
+    writer = None
+    archive = None
+    if archive_dir:
+        archive = open(os.path.join(archive_dir, f"{TABLE}-before-{cutoff:%Y_%m}.csv"), "w", newline="")
+        writer = csv.writer(archive)
+        writer.writerow(ARCHIVE_COLUMNS)
+
+    rows = 0
+    try:
+        while True:
+            chunk = list(expired.values_list(*ARCHIVE_COLUMNS)[:chunk_size])
+            if not chunk:
+                break
+            if writer:
+                writer.writerows((pk, sensor_id, ts.isoformat(), t, "" if h is None else h) for pk, sensor_id, ts, t, h in chunk)
+            with transaction.atomic():
+                Reading.objects.filter(id__in=[row[0] for row in chunk]).delete()
+            rows += len(chunk)
+    finally:
+        if archive:
+            archive.close()
+    return [(TABLE, rows)] if rows else []
@@ -0,0 +1,146 @@
+# In-process publish/subscribe hub for new readings, feeding the Server-Sent Events streams.
+# Readings are published after their transaction commits (see ingest.record_written) to the
+# topics ("sensor", id) and ("user", owner id). Every subscriber has a bounded queue: when a slow
+# client lets it fill up, the backlog is dropped and the stream catches up from the database
+# instead, so one slow client never holds memory or delays the writers.
+# The hub only sees writes made in this process, see SSE_RESYNC_SECONDS for multi-process setups.
+import asyncio
+import threading
+from collections import defaultdict, deque
+from .fastjson import dumps
+
+
+def sensor_topic(sensor_id):
+    return ("sensor", sensor_id)
+
+
+def user_topic(user_id):
+    return ("user", user_id)
+
+
+# Queue of one subscriber. Publishers call put() from any thread; the consumer waits with
+# wait() in a sync stream or with await wait_async() in an async one.
+class Subscription:
+    def __init__(self, hub, topics, maxsize):
+        self.hub = hub
+        self.topics = topics
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._queue = deque()
+        self._overflowed = False
+        self._cond = threading.Condition()
+        self._waker = None  # (loop, asyncio.Event) of an async consumer that is waiting
+
+    def put(self, event):
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                # Coalesce the backlog into one "catch up from the database" signal
+                self.dropped += len(self._queue) + 1
+                self._queue.clear()
+                self._overflowed = True
+            elif not self._overflowed:
+                self._queue.append(event)
+            self._cond.notify()
+            waker = self._waker
+        if waker is not None:
+            loop, wake = waker
+            loop.call_soon_threadsafe(wake.set)
+
+    # Returns (events, overflowed) and empties the queue
+    def take(self):
+        with self._cond:
+            events = list(self._queue)
+            overflowed = self._overflowed
+            self._queue.clear()
+            self._overflowed = False
+        return events, overflowed
+
+    def _pending(self):
+        return bool(self._queue) or self._overflowed
+
+    def wait(self, timeout):
+        with self._cond:
+            if not self._pending():
+                self._cond.wait(timeout)
+
+    async def wait_async(self, timeout):
+        wake = asyncio.Event()
+        with self._cond:
+            if self._pending():
+                return
+            self._waker = (asyncio.get_running_loop(), wake)
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._waker = None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # topic -> subscriptions
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, maxsize):
+        subscription = Subscription(self, tuple(topics), maxsize)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    # Subscriptions of any of the topics, each once
+    def subscribers(self, topics):
+        with self._lock:
+            found = set()
+            for topic in topics:
+                found |= self._subscribers.get(topic, set())
+        return found
+
+    # Delivers every event to every subscriber of any of the topics
+    def publish(self, topics, events):
+        for subscription in self.subscribers(topics):
+            for event in events:
+                subscription.put(event)
+
+    def stats(self):
+        with self._lock:
+            subscriptions = set().union(*self._subscribers.values()) if self._subscribers else set()
+            return {"topics": len(self._subscribers), "subscribers": len(subscriptions)}
+
+
+hub = Hub()
+
+
+# Reading as sent in a stream event
+def reading_event(reading_id, sensor_id, temperature, humidity, timestamp):
+    data = dumps({
+        "id": reading_id,
+        "sensor_id": sensor_id,
+        "temperature": temperature,
+        "humidity": humidity,
+        "timestamp": timestamp,
+    })
+    return reading_id, data
+
+
+# Publishes readings of one sensor that were just committed. Costs nothing when nobody listens.
+def publish_readings(sensor, readings):
+    topics = (sensor_topic(sensor.id), user_topic(sensor.owner_id))
+    if not hub.subscribers(topics):
+        return
+    events = [reading_event(r.id, sensor.id, r.temperature, r.humidity, r.timestamp) for r in readings]
+    hub.publish(topics, events)
@@ -0,0 +1,53 @@
+# Sensor deletion in two steps. DELETE /sensors/{id} only sets deleted_at (soft_delete), which hides the
+# sensor from every query at once (Sensor.objects leaves it out). The purge_deleted_sensors command then
+# removes its readings in chunks of PURGE_CHUNK_SIZE, each one short DELETE in its own transaction, so no
+# request waits for it and no lock is held for long. reading_count counts down as the progress, and a
+# stopped purge carries on with what is left at the next run.
+# The last step deletes the sensor row. Nothing references readings or rollups and they have no delete
+# signals, so Django cascades to them with one DELETE ... WHERE sensor_id per table, without loading rows.
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Reading, Sensor
+
+
+# Hides the sensor right away; post_save drops it from the auth caches of this process
+def soft_delete(sensor):
+    sensor.deleted_at = timezone.now()
+    sensor.save(update_fields=["deleted_at"])
+
+
+# Deleted sensors whose purge hasn't finished, oldest deletion first
+def pending():
+    return Sensor.all_objects.filter(deleted_at__isnull=False).order_by("deleted_at", "id")
+
+
+# Removes up to chunk_size readings of the sensor in one transaction and returns how many
+def purge_chunk(sensor_id, chunk_size=None):
+    chunk = Reading.objects.filter(sensor_id=sensor_id).values("id")[: chunk_size or settings.PURGE_CHUNK_SIZE]
+    with transaction.atomic():
+        removed, _ = Reading.objects.filter(pk__in=chunk).delete()
+        if removed:
+            Sensor.all_objects.filter(pk=sensor_id).update(
+                reading_count=Greatest(F("reading_count") - removed, Value(0))
+            )
+    return removed
+
+
+# Purges all readings of a deleted sensor chunk by chunk, then deletes the sensor with its rollups.
+# on_chunk(sensor, removed, remaining) is called after every chunk. Returns the number of readings removed.
+def purge_sensor(sensor, chunk_size=None, on_chunk=None):
+    total = 0
+    while True:
+        removed = purge_chunk(sensor.pk, chunk_size)
+        if not removed:
+            break
+        total += removed
+        if on_chunk:
+            remaining = Sensor.all_objects.filter(pk=sensor.pk).values_list("reading_count", flat=True).first()
+            on_chunk(sensor, removed, remaining or 0)
+    with transaction.atomic():
+        Sensor.all_objects.filter(pk=sensor.pk, deleted_at__isnull=False).delete()
+    return total
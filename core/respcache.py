@@ -0,0 +1,53 @@
+# Cache of readings query results on Django's cache framework (see CACHES).
+# Keys include the sensor's readings_version, which every write of readings bumps (see
+# ingest.mark_changed), so one write makes all older entries of that sensor unreachable at once.
+# Nothing is deleted; old entries just age out after READINGS_CACHE_TTL seconds.
+# The version is read from the database on each request, so even a per-process memory cache never
+# serves a result older than the last write, it only hits less often than a shared cache.
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+# Headers of a cached response that are sent again on a hit
+KEPT_HEADERS = ("Vary", "X-Next-Cursor", "X-Readings-Resolution")
+
+
+def enabled():
+    return settings.READINGS_CACHE_TTL > 0
+
+
+def key(*parts):
+    return "readings:" + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def get(key):
+    return cache.get(key) if enabled() else None
+
+
+def put(key, value):
+    if enabled():
+        cache.set(key, value, settings.READINGS_CACHE_TTL)
+
+
+async def aget(key):
+    return await cache.aget(key) if enabled() else None
+
+
+async def aput(key, value):
+    if enabled():
+        await cache.aset(key, value, settings.READINGS_CACHE_TTL)
+
+
+# A rendered response as a picklable cache value, and back
+def pack(response):
+    headers = [(name, response[name]) for name in KEPT_HEADERS if response.has_header(name)]
+    return response.content, response["Content-Type"], headers
+
+
+def unpack(entry):
+    content, content_type, headers = entry
+    response = HttpResponse(content, content_type=content_type)
+    for name, value in headers:
+        response[name] = value
+    return response
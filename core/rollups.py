@@ -0,0 +1,286 @@
+# Incremental hourly/daily rollups of readings and the aggregate queries that use them
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+from .models import Reading, ReadingRollup
+from .timeseries import EpochBucket, bucket_start
+
+# Coarsest first, so the first one that fits a request is the cheapest to read
+RESOLUTIONS = (ReadingRollup.DAY, ReadingRollup.HOUR)
+
+# Stat fields of a rollup row, also used as the accumulator shape for aggregates
+STAT_FIELDS = (
+    "count",
+    "temperature_sum",
+    "temperature_sumsq",
+    "temperature_min",
+    "temperature_max",
+    "humidity_count",
+    "humidity_sum",
+    "humidity_sumsq",
+    "humidity_min",
+    "humidity_max",
+)
+
+
+def _epoch(ts):
+    if timezone.is_naive(ts):
+        ts = timezone.make_aware(ts)
+    return int(ts.timestamp())
+
+
+def _empty():
+    return {
+        "count": 0,
+        "temperature_sum": 0.0,
+        "temperature_sumsq": 0.0,
+        "temperature_min": None,
+        "temperature_max": None,
+        "humidity_count": 0,
+        "humidity_sum": 0.0,
+        "humidity_sumsq": 0.0,
+        "humidity_min": None,
+        "humidity_max": None,
+    }
+
+
+def _lower(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+def _higher(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+# Adds the stats in `other` to `acc` in place
+def merge(acc, other):
+    for field in ("count", "temperature_sum", "temperature_sumsq", "humidity_count", "humidity_sum", "humidity_sumsq"):
+        acc[field] += other[field] or 0
+    for field in ("temperature_min", "humidity_min"):
+        acc[field] = _lower(acc[field], other[field])
+    for field in ("temperature_max", "humidity_max"):
+        acc[field] = _higher(acc[field], other[field])
+    return acc
+
+
+# Adds one reading to `acc` in place
+def _add_reading(acc, temperature, humidity):
+    acc["count"] += 1
+    acc["temperature_sum"] += temperature
+    acc["temperature_sumsq"] += temperature * temperature
+    acc["temperature_min"] = _lower(acc["temperature_min"], temperature)
+    acc["temperature_max"] = _higher(acc["temperature_max"], temperature)
+    if humidity is not None:
+        acc["humidity_count"] += 1
+        acc["humidity_sum"] += humidity
+        acc["humidity_sumsq"] += humidity * humidity
+        acc["humidity_min"] = _lower(acc["humidity_min"], humidity)
+        acc["humidity_max"] = _higher(acc["humidity_max"], humidity)
+
+
+# Folds newly written readings into the rollups of one sensor.
+# `rows` are (timestamp, temperature, humidity) tuples of readings that were just inserted.
+# Call it in the same transaction as the insert so rollups and readings never disagree.
+def apply_readings(sensor_id, rows):
+    deltas = {}  # (resolution, bucket epoch) -> stats
+    for ts, temperature, humidity in rows:
+        epoch = _epoch(ts)
+        for resolution in RESOLUTIONS:
+            key = (resolution, epoch // resolution * resolution)
+            if key not in deltas:
+                deltas[key] = _empty()
+            _add_reading(deltas[key], temperature, humidity)
+    if not deltas:
+        return
+
+    # A concurrent writer may create the same new bucket first, then we re-read and merge again
+    for attempt in range(3):
+        try:
+            with transaction.atomic():
+                _write_deltas(sensor_id, deltas)
+            return
+        except IntegrityError:
+            if attempt == 2:
+                raise
+
+
+def _write_deltas(sensor_id, deltas):
+    # Lock the existing buckets we are about to change, one range per resolution
+    ranges = Q()
+    for resolution in RESOLUTIONS:
+        starts = [epoch for res, epoch in deltas if res == resolution]
+        ranges |= Q(
+            resolution=resolution,
+            bucket_start__gte=bucket_start(min(starts)),
+            bucket_start__lte=bucket_start(max(starts)),
+        )
+    existing = {
+        (r.resolution, _epoch(r.bucket_start)): r
+        for r in ReadingRollup.objects.select_for_update().filter(ranges, sensor_id=sensor_id)
+    }
+
+    to_update, to_create = [], []
+    for key, delta in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = ReadingRollup(sensor_id=sensor_id, resolution=key[0], bucket_start=bucket_start(key[1]), **delta)
+            to_create.append(rollup)
+            continue
+        stats = merge({field: getattr(rollup, field) for field in STAT_FIELDS}, delta)
+        for field, value in stats.items():
+            setattr(rollup, field, value)
+        to_update.append(rollup)
+
+    if to_update:
+        ReadingRollup.objects.bulk_update(to_update, STAT_FIELDS, batch_size=500)
+    if to_create:
+        ReadingRollup.objects.bulk_create(to_create, batch_size=500)
+
+
+# Recomputes all rollups from raw readings, for one sensor or for all sensors.
+# Spans already compacted (before Sensor.compacted_until, always a whole day) keep their rollups,
+# the averaged readings there can't reproduce them. Returns the number of rollup rows written.
+def rebuild(sensor_id=None):
+    raw = Q(sensor__compacted_until__isnull=True)
+    readings = Reading.objects.filter(raw | Q(timestamp__gte=F("sensor__compacted_until")))
+    rollups = ReadingRollup.objects.filter(raw | Q(bucket_start__gte=F("sensor__compacted_until")))
+    if sensor_id is not None:
+        readings = readings.filter(sensor_id=sensor_id)
+        rollups = rollups.filter(sensor_id=sensor_id)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for resolution in RESOLUTIONS:
+            rows = (
+                readings.annotate(bucket=EpochBucket("timestamp", resolution))
+                .values("sensor_id", "bucket")
+                .annotate(**_sum_aggregates())
+                .order_by()
+            )
+            batch = []
+            for row in rows.iterator(chunk_size=2000):
+                stats = merge(_empty(), row)
+                batch.append(
+                    ReadingRollup(
+                        sensor_id=row["sensor_id"],
+                        resolution=resolution,
+                        bucket_start=bucket_start(row["bucket"]),
+                        **stats,
+                    )
+                )
+                if len(batch) >= 2000:
+                    ReadingRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            ReadingRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+# Aggregates over raw readings that produce the same fields as a rollup row
+def _sum_aggregates():
+    return {
+        "count": Count("id"),
+        "temperature_sum": Sum("temperature"),
+        "temperature_sumsq": Sum(F("temperature") * F("temperature")),
+        "temperature_min": Min("temperature"),
+        "temperature_max": Max("temperature"),
+        "humidity_count": Count("humidity"),
+        "humidity_sum": Sum("humidity"),
+        "humidity_sumsq": Sum(F("humidity") * F("humidity")),
+        "humidity_min": Min("humidity"),
+        "humidity_max": Max("humidity"),
+    }
+
+
+# Aggregates over rollup rows, for grouping them into even larger buckets
+def _rollup_aggregates():
+    aggregates = {field: Sum(field) for field in STAT_FIELDS if not field.endswith(("_min", "_max"))}
+    aggregates.update({field: Min(field) for field in ("temperature_min", "humidity_min")})
+    aggregates.update({field: Max(field) for field in ("temperature_max", "humidity_max")})
+    return aggregates
+
+
+# Picks the coarsest rollup that can answer a query exactly: its resolution must divide
+# the bucket size and the time range must start and end on its bucket boundaries.
+def pick_resolution(size, dt_from=None, dt_to=None):
+    for resolution in RESOLUTIONS:
+        if size % resolution:
+            continue
+        if dt_from is not None and _epoch(dt_from) % resolution:
+            continue
+        if dt_to is not None and _epoch(dt_to) % resolution:
+            continue
+        if any(dt is not None and dt.microsecond for dt in (dt_from, dt_to)):
+            continue
+        return resolution
+    return None
+
+
+# Stats per bucket of `size` seconds for one sensor, as {bucket epoch: stats}.
+# Uses rollups when pick_resolution allows it (and raw is False), raw readings otherwise.
+# The range is inclusive on both ends, like the timestamp filters of list_readings.
+def aggregate(sensor_id, size, dt_from=None, dt_to=None, max_buckets=None, raw=False):
+    return aggregate_sensors([sensor_id], size, dt_from, dt_to, max_buckets, raw).get(sensor_id, {})
+
+
+# aggregate() for several sensors in one grouped query, as {sensor id: {bucket epoch: stats}}.
+# Sensors without readings in the range are left out. max_buckets caps the rows of the whole query.
+def aggregate_sensors(sensor_ids, size, dt_from=None, dt_to=None, max_buckets=None, raw=False):
+    resolution = None if raw else pick_resolution(size, dt_from, dt_to)
+
+    if resolution is None:
+        readings = Reading.objects.filter(sensor_id__in=sensor_ids)
+        if dt_from is not None:
+            readings = readings.filter(timestamp__gte=dt_from)
+        if dt_to is not None:
+            readings = readings.filter(timestamp__lte=dt_to)
+        return _grouped(readings, "timestamp", size, _sum_aggregates(), max_buckets)
+
+    rollups = ReadingRollup.objects.filter(sensor_id__in=sensor_ids, resolution=resolution)
+    if dt_from is not None:
+        rollups = rollups.filter(bucket_start__gte=dt_from)
+    if dt_to is not None:
+        # The bucket starting at dt_to also holds later readings, so it is replaced
+        # by the raw readings at exactly dt_to (at most one per sensor)
+        rollups = rollups.filter(bucket_start__lt=dt_to)
+    sensors = _grouped(rollups, "bucket_start", size, _rollup_aggregates(), max_buckets)
+
+    if dt_to is not None:
+        edge = Reading.objects.filter(sensor_id__in=sensor_ids, timestamp=dt_to)
+        for sensor_id, buckets in _grouped(edge, "timestamp", size, _sum_aggregates(), None).items():
+            for epoch, stats in buckets.items():
+                merge(sensors.setdefault(sensor_id, {}).setdefault(epoch, _empty()), stats)
+    return {sensor_id: dict(sorted(buckets.items())) for sensor_id, buckets in sensors.items()}
+
+
+def _grouped(queryset, field, size, aggregates, max_buckets):
+    rows = (
+        queryset.annotate(bucket=EpochBucket(field, size))
+        .values("sensor_id", "bucket")
+        .annotate(**aggregates)
+        .order_by("sensor_id", "bucket")
+    )
+    if max_buckets is not None:
+        rows = rows[: max_buckets + 1]
+    sensors = {}
+    for row in rows:
+        sensors.setdefault(row.pop("sensor_id"), {})[row.pop("bucket")] = merge(_empty(), row)
+    return sensors
+
+
+# Turns accumulated stats into the avg/min/max fields of ReadingBucketOut
+def finalize(epoch, stats):
+    count = stats["count"]
+    humidity_count = stats["humidity_count"]
+    return {
+        "bucket_start": bucket_start(epoch),
+        "count": count,
+        "temperature_avg": stats["temperature_sum"] / count,
+        "temperature_min": stats["temperature_min"],
+        "temperature_max": stats["temperature_max"],
+        "humidity_avg": stats["humidity_sum"] / humidity_count if humidity_count else None,
+        "humidity_min": stats["humidity_min"],
+        "humidity_max": stats["humidity_max"],
+    }
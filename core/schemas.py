@@ -1,7 +1,7 @@
 # Schemas define how data is structured when sent to or sent from the API
 from ninja import Schema
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Base schema for common sensor fields
 class SensorBase(Schema):
@@ -26,6 +26,32 @@ class SensorOut(SensorBase):
     id: int
     created_at: datetime
 
+# One page of sensors, same shape as @paginate(PageNumberPagination) produces.
+# Cursor mode leaves out count, the next page is in the X-Next-Cursor header.
+class PagedSensorOut(Schema):
+    items: List[SensorOut]
+    count: Optional[int] = None # Not sent in cursor mode
+
+# Sensor with its newest reading and number of readings, for dashboards (GET /sensors/summary)
+class SensorSummaryOut(SensorBase):
+    """
+    Example:
+        {
+                 "id": 1,
+                 "name": "device-001",
+                 "type": "EnviroSense",
+                 "reading_count": 1440,
+                 "last_timestamp": "2025-11-09T21:00:00Z",
+                 "last_temperature": 21.4,
+                 "last_humidity": 45.2
+        }
+    """
+    id: int
+    reading_count: int
+    last_timestamp: Optional[datetime] = None # All last_* are null until the sensor has a reading
+    last_temperature: Optional[float] = None
+    last_humidity: Optional[float] = None
+
 # Base schema for reading data like temperature and humidity
 class ReadingBase(Schema):
     temperature: float
@@ -47,4 +73,172 @@ class ReadingOut(ReadingBase):
                 "timestamp": "2025-11-09T21:00:00Z"
     }
     """
-    id: int
\ No newline at end of file
+    id: int
+
+# Result for one item of a batch upload
+class ReadingBatchResult(Schema):
+    """
+    Example:
+    {
+                "index": 0,
+                "status": "created",
+                "id": 42,
+                "detail": null
+    }
+    """
+    index: int
+    status: str # created, duplicate or invalid
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+# Returned from the batch upload endpoint (POST)
+class ReadingBatchOut(Schema):
+    created: int
+    duplicates: int
+    invalid: int
+    results: List[ReadingBatchResult]
+
+# One row of a gateway upload (POST /readings/batch), the sensor is named by device_id like in sensor_readings_wide.csv
+class DeviceReadingCreate(ReadingCreate):
+    device_id: str
+
+# Counts for one device of a gateway upload
+class DeviceBatchResult(Schema):
+    """
+    Example:
+    {
+                "device_id": "device-001",
+                "sensor_id": 1,
+                "sensor_created": false,
+                "created": 58,
+                "duplicates": 2,
+                "invalid": 0,
+                "skipped": 0
+    }
+    """
+    device_id: str
+    sensor_id: Optional[int] = None # Null for an unknown device when no sensor was created
+    sensor_created: bool = False
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    skipped: int = 0 # Rows of an unknown device
+
+# Returned from the gateway upload endpoint (POST /readings/batch)
+class DeviceBatchOut(Schema):
+    created: int
+    duplicates: int
+    invalid: int
+    skipped: int
+    devices: List[DeviceBatchResult]
+    errors: List[ReadingBatchResult] # The invalid rows, by index in the upload
+
+# One time bucket in an aggregated readings response
+class ReadingBucketOut(Schema):
+    """
+    Example:
+    {
+                "bucket_start": "2025-11-09T21:00:00Z",
+                "count": 5,
+                "temperature_avg": 22.1,
+                "temperature_min": 21.8,
+                "temperature_max": 22.5,
+                "humidity_avg": 44.5,
+                "humidity_min": 44.0,
+                "humidity_max": 45.1
+    }
+    """
+    bucket_start: datetime
+    count: int
+    temperature_avg: float
+    temperature_min: float
+    temperature_max: float
+    humidity_avg: Optional[float] = None # None when no reading in the bucket has humidity
+    humidity_min: Optional[float] = None
+    humidity_max: Optional[float] = None
+
+# Returned from the aggregate endpoint (GET)
+class ReadingAggregateOut(Schema):
+    bucket_seconds: int
+    buckets: List[ReadingBucketOut]
+
+# Statistics of one field over the readings of a stats window
+class FieldStatsOut(Schema):
+    count: int # Readings with a value for this field
+    mean: Optional[float] = None
+    stddev: Optional[float] = None # Sample standard deviation, None with fewer than two values
+    min: Optional[float] = None
+    min_at: Optional[datetime] = None # First reading with the minimum
+    max: Optional[float] = None
+    max_at: Optional[datetime] = None # First reading with the maximum
+    p5: Optional[float] = None # Percentiles, linearly interpolated
+    p25: Optional[float] = None
+    p50: Optional[float] = None
+    p75: Optional[float] = None
+    p95: Optional[float] = None
+
+# Returned from the stats endpoint (GET)
+class ReadingStatsOut(Schema):
+    """
+    Example:
+    {
+                "count": 1440,
+                "first_timestamp": "2025-11-09T00:00:00Z",
+                "last_timestamp": "2025-11-09T23:59:00Z",
+                "temperature": {"count": 1440, "mean": 22.1, "stddev": 0.8, "min": 20.4,
+                                "min_at": "2025-11-09T05:12:00Z", "max": 24.3, "max_at": "2025-11-09T15:40:00Z",
+                                "p5": 20.9, "p25": 21.5, "p50": 22.0, "p75": 22.7, "p95": 23.6},
+                "humidity": {"count": 1438, "mean": 44.5, "...": "..."}
+    }
+    """
+    count: int
+    first_timestamp: Optional[datetime] = None # Oldest and newest reading in the window
+    last_timestamp: Optional[datetime] = None
+    temperature: FieldStatsOut
+    humidity: FieldStatsOut
+
+# One sensor's values on the grid of an aligned readings response
+class AlignedSeriesOut(Schema):
+    sensor_id: int
+    device_id: str # The sensor's name, like device_id in sensor_readings_wide.csv
+    temperature: List[Optional[float]] # Average per grid slot, None where the sensor has no readings
+    humidity: List[Optional[float]]
+
+# Returned from the aligned readings endpoint (GET) as JSON
+class AlignedReadingsOut(Schema):
+    """
+    Example:
+    {
+                "bucket_seconds": 300,
+                "timestamps": ["2025-11-09T21:00:00Z", "2025-11-09T21:05:00Z", "2025-11-09T21:10:00Z"],
+                "sensors": [
+                    {"sensor_id": 1, "device_id": "device-001", "temperature": [22.1, 22.3, null], "humidity": [44.5, 44.9, null]},
+                    {"sensor_id": 2, "device_id": "device-002", "temperature": [19.8, 19.9, 20.0], "humidity": [51.0, null, 50.2]}
+                ]
+    }
+    """
+    bucket_seconds: int
+    timestamps: List[datetime] # Start of every grid slot
+    sensors: List[AlignedSeriesOut] # In the order of sensor_ids
+
+# A reading flagged at ingest as far off its sensor's moving average
+class AnomalyOut(Schema):
+    """
+    Example:
+    {
+                "id": 7,
+                "sensor_id": 1,
+                "timestamp": "2025-11-09T21:00:00Z",
+                "field": "temperature",
+                "value": 41.3,
+                "expected": 22.1,
+                "score": 9.6
+    }
+    """
+    id: int
+    sensor_id: int
+    timestamp: datetime # Timestamp of the reading
+    field: str # temperature or humidity
+    value: float
+    expected: float # Moving average of the field before the reading
+    score: float # Standard deviations from the average, negative below it
@@ -0,0 +1,43 @@
+# Sensor search by name or type, and the database-specific indexes behind it.
+# PostgreSQL matches anywhere in the text with pg_trgm GIN indexes on UPPER(column), the same
+# expression as Django's icontains lookup. Other databases match the start of the name or type,
+# which SQLite serves from (owner, column COLLATE NOCASE) indexes.
+# The indexes are SearchIndex entries of Sensor.Meta.indexes, so migrations create them and
+# SQLite's table rebuilds keep them like any other index.
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import connections, models
+from django.db.models import F, Q
+from django.db.models.functions import Collate, Upper
+
+COLUMNS = ("name", "type")
+
+
+def search_sensors(sensors, q):
+    if not q:
+        return sensors
+    if connections[sensors.db].vendor == "postgresql":
+        return sensors.filter(Q(name__icontains=q) | Q(type__icontains=q))
+    return sensors.filter(Q(name__istartswith=q) | Q(type__istartswith=q))
+
+
+# Search index on one column of Sensor, whose SQL is picked when the migration runs:
+# a trigram GIN index on PostgreSQL (needs the pg_trgm extension, see migration 0006),
+# a case-insensitive (owner, column) index on SQLite and a plain one elsewhere.
+class SearchIndex(models.Index):
+    def __init__(self, *, column, name):
+        self.column = column
+        super().__init__(fields=[column], name=name)
+
+    def _index_for(self, vendor):
+        if vendor == "postgresql":
+            return GinIndex(OpClass(Upper(self.column), name="gin_trgm_ops"), name=self.name)
+        if vendor == "sqlite":
+            return models.Index(F("owner"), Collate(F(self.column), "NOCASE"), name=self.name)
+        return models.Index(fields=["owner", self.column], name=self.name)
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        index = self._index_for(schema_editor.connection.vendor)
+        return index.create_sql(model, schema_editor, using=using, **kwargs)
+
+    def deconstruct(self):
+        return "core.search.SearchIndex", (), {"column": self.column, "name": self.name}
@@ -0,0 +1,98 @@
+# Summary statistics of a sensor's readings over a time window: count, mean, standard deviation,
+# percentiles, min/max and when the extremes were first reached, for temperature and humidity.
+# Everything is computed in the database where it can be. PostgreSQL does it all in SQL, the
+# percentiles with percentile_cont. Other databases compute count, mean, min and max in SQL and get
+# each field's values once, sorted by the database, as one float array for the percentiles and the
+# standard deviation; values_list(flat=True) keeps that to plain floats, no per-row objects.
+import math
+from array import array
+from django.db import connections
+from django.db.models import Aggregate, Avg, Count, FloatField, Max, Min, Q, StdDev
+
+FIELDS = ("temperature", "humidity")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+# percentile_cont(fraction) WITHIN GROUP (ORDER BY expression), PostgreSQL only.
+# PostgreSQL sorts once for all percentiles of the same column.
+class PercentileCont(Aggregate):
+    function = "percentile_cont"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+# Percentile of sorted values with linear interpolation, the same as percentile_cont
+def percentile(values, fraction):
+    position = fraction * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+# Sample standard deviation, None with fewer than two values
+def stddev(values, mean):
+    if len(values) < 2:
+        return None
+    return math.sqrt(math.fsum((value - mean) ** 2 for value in values) / (len(values) - 1))
+
+
+def _aggregates(field, in_sql):
+    aggregates = {
+        f"{field}_count": Count(field),
+        f"{field}_mean": Avg(field),
+        f"{field}_min": Min(field),
+        f"{field}_max": Max(field),
+    }
+    if in_sql:
+        aggregates[f"{field}_stddev"] = StdDev(field, sample=True)
+        aggregates.update({f"{field}_p{p}": PercentileCont(field, p / 100) for p in PERCENTILES})
+    return aggregates
+
+
+# Fills in stddev and the percentiles of one field from its sorted values
+def _from_values(readings, field, row):
+    values = array("d", readings.filter(**{f"{field}__isnull": False}).order_by(field).values_list(field, flat=True))
+    row[f"{field}_stddev"] = stddev(values, row[f"{field}_mean"])
+    for p in PERCENTILES:
+        row[f"{field}_p{p}"] = percentile(values, p / 100) if values else None
+
+
+# Statistics of the readings in the queryset (already filtered to one sensor and window), shaped like
+# ReadingStatsOut. Two queries on PostgreSQL, plus one per field elsewhere.
+def window_stats(readings):
+    in_sql = connections[readings.db].vendor == "postgresql"
+    aggregates = {"count": Count("id"), "first_timestamp": Min("timestamp"), "last_timestamp": Max("timestamp")}
+    for field in FIELDS:
+        aggregates.update(_aggregates(field, in_sql))
+    row = readings.aggregate(**aggregates)
+    if not in_sql:
+        for field in FIELDS:
+            if row[f"{field}_count"]:
+                _from_values(readings, field, row)
+
+    # When each extreme was first reached, in one more pass
+    extremes = {
+        f"{field}_{end}_at": Min("timestamp", filter=Q(**{field: row[f"{field}_{end}"]}))
+        for field in FIELDS
+        for end in ("min", "max")
+        if row[f"{field}_{end}"] is not None
+    }
+    if extremes:
+        row.update(readings.aggregate(**extremes))
+
+    result = {key: row[key] for key in ("count", "first_timestamp", "last_timestamp")}
+    for field in FIELDS:
+        result[field] = {
+            "count": row[f"{field}_count"],
+            "mean": row[f"{field}_mean"],
+            "stddev": row.get(f"{field}_stddev"),
+            "min": row[f"{field}_min"],
+            "min_at": row.get(f"{field}_min_at"),
+            "max": row[f"{field}_max"],
+            "max_at": row.get(f"{field}_max_at"),
+            **{f"p{p}": row.get(f"{field}_p{p}") for p in PERCENTILES},
+        }
+    return result
@@ -0,0 +1,119 @@
+# Server-Sent Events streams of new readings, fed by pubsub.hub.
+# Each event is "id: <reading id>", "event: reading" and the reading as JSON. Browsers reconnect
+# on their own and send the last id back as Last-Event-ID, then the missed readings are
+# replayed from the database. A stream that falls too far behind gets a "reset" event,
+# telling the client to reload the list over the REST API.
+import time
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .pubsub import hub, reading_event
+
+EVENT_COLUMNS = ("id", "sensor_id", "temperature", "humidity", "timestamp")
+RESET_EVENT = b"event: reset\ndata: {}\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+
+def _format(event_id, data):
+    return b"id: %d\nevent: reading\ndata: %s\n\n" % (event_id, data)
+
+
+# State of one open stream. events() and events_async() run the same steps,
+# for WSGI (a thread per stream) and ASGI (a task per stream).
+class ReadingStream:
+    def __init__(self, topics, readings, last_id):
+        self.topics = topics
+        self.readings = readings  # All readings the stream may send, e.g. one sensor's
+        self.last_id = last_id  # Highest id sent, None until known
+        self.replayed = set()  # Ids sent by the last replay, they may still come in from the hub
+
+    # Newest missed readings first, one more than the limit to detect a gap that is too large
+    def _missed(self):
+        return self.readings.filter(id__gt=self.last_id).order_by("-id").values_list(*EVENT_COLUMNS)[
+            : settings.SSE_REPLAY_LIMIT + 1
+        ]
+
+    def _latest_id(self):
+        return self.readings.order_by("-id").values_list("id", flat=True)
+
+    def _replay(self, rows):
+        if not rows:
+            return b""
+        if len(rows) > settings.SSE_REPLAY_LIMIT:
+            self.last_id = rows[0][0]
+            self.replayed = set()
+            return RESET_EVENT
+        rows.reverse()
+        self.replayed = {row[0] for row in rows}
+        return b"".join(self._send(*reading_event(*row)) for row in rows)
+
+    def _send(self, event_id, data):
+        self.last_id = max(self.last_id, event_id)
+        return _format(event_id, data)
+
+    # Queued events as one chunk, and whether the queue overflowed so a replay is needed
+    def _drain(self, subscription):
+        events, overflowed = subscription.take()
+        chunk = b"".join(self._send(event_id, data) for event_id, data in events if event_id not in self.replayed)
+        return chunk, overflowed
+
+    def _resync_due(self, now, last_resync):
+        return settings.SSE_RESYNC_SECONDS > 0 and now - last_resync >= settings.SSE_RESYNC_SECONDS
+
+    def events(self):
+        subscription = hub.subscribe(self.topics, settings.SSE_QUEUE_SIZE)
+        try:
+            if self.last_id is None:
+                self.last_id = self._latest_id().first() or 0
+                yield b"retry: 3000\n\n"
+            else:
+                yield b"retry: 3000\n\n" + self._replay(list(self._missed()))
+
+            deadline = last_resync = time.monotonic()
+            deadline += settings.SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                subscription.wait(settings.SSE_HEARTBEAT_SECONDS)
+                chunk, overflowed = self._drain(subscription)
+                if overflowed or self._resync_due(time.monotonic(), last_resync):
+                    chunk += self._replay(list(self._missed()))
+                    last_resync = time.monotonic()
+                yield chunk or KEEPALIVE
+        finally:
+            subscription.close()
+
+    async def events_async(self):
+        subscription = hub.subscribe(self.topics, settings.SSE_QUEUE_SIZE)
+        try:
+            if self.last_id is None:
+                self.last_id = await self._latest_id().afirst() or 0
+                yield b"retry: 3000\n\n"
+            else:
+                yield b"retry: 3000\n\n" + self._replay([row async for row in self._missed()])
+
+            deadline = last_resync = time.monotonic()
+            deadline += settings.SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                await subscription.wait_async(settings.SSE_HEARTBEAT_SECONDS)
+                chunk, overflowed = self._drain(subscription)
+                if overflowed or self._resync_due(time.monotonic(), last_resync):
+                    chunk += self._replay([row async for row in self._missed()])
+                    last_resync = time.monotonic()
+                yield chunk or KEEPALIVE
+        finally:
+            subscription.close()
+
+
+# Opens an event stream over `readings` for the hub topics.
+# Resumes after Last-Event-ID (header, or the last_event_id parameter) when given.
+def open_stream(request, topics, readings, last_event_id=None):
+    header = request.headers.get("Last-Event-ID", "")
+    if header.isdigit():
+        last_event_id = int(header)
+
+    stream = ReadingStream(topics, readings, last_event_id)
+    # An ASGI server needs an async iterator, a WSGI server a sync one
+    content = stream.events_async() if isinstance(request, ASGIRequest) else stream.events()
+    response = StreamingHttpResponse(content, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Tells nginx not to buffer the stream
+    return response
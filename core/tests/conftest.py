@@ -0,0 +1,12 @@
+import pytest
+from django.core.cache import cache
+from core import authcache
+
+@pytest.fixture(autouse=True)
+def clear_auth_cache():
+    # Each test starts with empty token/sensor caches, ids can repeat between tests
+    authcache.clear()
+    cache.clear()  # Readings response cache, keys can repeat between tests too
+    yield
+    authcache.clear()
+    cache.clear()
@@ -0,0 +1,83 @@
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+@pytest.fixture
+def sensor_with_token(db):
+    # Create a user with a token and one sensor
+    u = User.objects.create_user(username="charts", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    return s, tok.key
+
+
+@pytest.mark.django_db
+def test_aggregate_groups_readings_into_buckets(client, sensor_with_token):
+    """GET /api/sensors/{id}/readings/aggregate returns avg/min/max/count per bucket"""
+    s, key = sensor_with_token
+
+    # Ten readings one minute apart starting at 12:00, gives two 5 minute buckets
+    start = datetime(2024, 8, 1, 12, 0, tzinfo=timezone.utc)
+    for i in range(10):
+        Reading.objects.create(
+            sensor=s,
+            temperature=20 + i,
+            humidity=None if i == 9 else 40.0,
+            timestamp=start + timedelta(minutes=i, microseconds=500),
+        )
+
+    res = client.get(f"/api/sensors/{s.id}/readings/aggregate", {"bucket": "5m"}, **bearer(key))
+    assert res.status_code == 200
+    data = res.json()
+    assert data["bucket_seconds"] == 300
+
+    first, second = data["buckets"]
+    assert first["bucket_start"].startswith("2024-08-01T12:00:00")
+    assert second["bucket_start"].startswith("2024-08-01T12:05:00")
+    assert (first["count"], first["temperature_min"], first["temperature_max"]) == (5, 20, 24)
+    assert first["temperature_avg"] == pytest.approx(22)
+    # Humidity is null for the last reading and left out of its averages
+    assert second["count"] == 5
+    assert second["humidity_avg"] == pytest.approx(40.0)
+
+    # Time filters apply before grouping
+    res = client.get(
+        f"/api/sensors/{s.id}/readings/aggregate",
+        {"bucket": "1h", "timestamp_from": (start + timedelta(minutes=5)).isoformat()},
+        **bearer(key),
+    )
+    assert [b["count"] for b in res.json()["buckets"]] == [5]
+
+    # Unknown bucket sizes are rejected
+    res = client.get(f"/api/sensors/{s.id}/readings/aggregate", {"bucket": "5 weeks"}, **bearer(key))
+    assert res.status_code == 400
+
+
+@pytest.mark.django_db
+def test_downsample_keeps_shape_within_max_points(client, sensor_with_token):
+    """GET /api/sensors/{id}/readings/downsample returns at most max_points and keeps the spike"""
+    s, key = sensor_with_token
+
+    # Flat line with one spike in the middle
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    for i in range(200):
+        Reading.objects.create(
+            sensor=s, temperature=50.0 if i == 120 else 20.0, humidity=40.0, timestamp=start + timedelta(minutes=i)
+        )
+
+    res = client.get(f"/api/sensors/{s.id}/readings/downsample", {"max_points": 20}, **bearer(key))
+    assert res.status_code == 200
+    points = res.json()
+    assert len(points) == 20
+
+    # First and last readings are kept, the spike survives, order is oldest first
+    assert points[0]["timestamp"].startswith("2024-08-01T00:00:00")
+    assert points[-1]["timestamp"].startswith("2024-08-01T03:19:00")
+    assert max(p["temperature"] for p in points) == 50.0
+    assert [p["timestamp"] for p in points] == sorted(p["timestamp"] for p in points)
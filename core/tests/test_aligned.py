@@ -0,0 +1,94 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from core.columnar import CONTENT_TYPE, decode_frames
+from core.models import Sensor
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def at(minute):
+    return (START + timedelta(minutes=minute)).isoformat()
+
+def upload(client, key, sensor, rows):
+    return client.post(f"/api/sensors/{sensor.id}/readings/batch", data=json.dumps(rows),
+                       content_type="application/json", **bearer(key))
+
+def get_aligned(client, key, sensors, start=0, end=14, headers=None, **params):
+    query = {"sensor_ids": ",".join(str(s.id) for s in sensors), "timestamp_from": at(start), "timestamp_to": at(end), **params}
+    return client.get("/api/readings/aligned", query, **bearer(key), **(headers or {}))
+
+@pytest.fixture
+def two_sensors(client):
+    u = User.objects.create_user(username="aligned_user", password="p")
+    key = Token.objects.create(user=u).key
+    a = Sensor.objects.create(name="device-001", type="Env", owner=u)
+    b = Sensor.objects.create(name="device-002", type="Env", owner=u)
+    # a every minute of the first 10, b every other minute from minute 5, without humidity
+    upload(client, key, a, [{"timestamp": at(i), "temperature": 20.0 + i, "humidity": 40.0} for i in range(10)])
+    upload(client, key, b, [{"timestamp": at(i), "temperature": 30.0 + i} for i in range(5, 15, 2)])
+    return a, b, key
+
+@pytest.mark.django_db
+def test_aligned_series_share_one_grid(client, two_sensors):
+    a, b, key = two_sensors
+    with CaptureQueriesContext(connection) as ctx:
+        res = get_aligned(client, key, [b, a], bucket="5m")
+    assert res.status_code == 200
+    assert sum("core_reading" in q["sql"] for q in ctx.captured_queries) == 1  # One scan for all sensors
+
+    body = res.json()
+    assert body["bucket_seconds"] == 300
+    assert body["timestamps"] == ["2024-08-01T00:00:00Z", "2024-08-01T00:05:00Z", "2024-08-01T00:10:00Z"]
+    assert body["sensors"] == [
+        {"sensor_id": b.id, "device_id": "device-002", "temperature": [None, 37.0, 42.0], "humidity": [None, None, None]},
+        {"sensor_id": a.id, "device_id": "device-001", "temperature": [22.0, 27.0, None], "humidity": [40.0, 40.0, None]},
+    ]
+
+    lines = get_aligned(client, key, [a, b], format="csv").content.decode().splitlines()
+    assert lines[0] == "timestamp,device_id,temperature,humidity"
+    assert lines[1:3] == ["2024-08-01 00:00:00+00:00,device-001,22.0,40.0", "2024-08-01 00:00:00+00:00,device-002,,"]
+    assert len(lines) == 1 + 3 * 2
+
+    res = get_aligned(client, key, [a, b], headers={"HTTP_ACCEPT": CONTENT_TYPE})
+    assert res["Content-Type"] == CONTENT_TYPE
+    readings = decode_frames(res.content)
+    assert [r["temperature"] for r in readings[:3]] == [22.0, 27.0, pytest.approx(float("nan"), nan_ok=True)]
+    assert [r["humidity"] for r in readings[3:]] == [None, None, None]
+    assert readings[4]["timestamp"] == START + timedelta(minutes=5)
+
+@pytest.mark.django_db
+def test_aligned_hour_grid_reads_rollups(client, two_sensors):
+    a, b, key = two_sensors
+    with CaptureQueriesContext(connection) as ctx:
+        body = get_aligned(client, key, [a, b], start=0, end=120, bucket="1h").json()
+    assert any("core_readingrollup" in q["sql"] for q in ctx.captured_queries)
+    assert body["timestamps"] == ["2024-08-01T00:00:00Z", "2024-08-01T01:00:00Z", "2024-08-01T02:00:00Z"]
+    assert [s["temperature"] for s in body["sensors"]] == [[24.5, None, None], [39.0, None, None]]
+
+@pytest.mark.django_db
+def test_aligned_checks_sensors_and_parameters(client, two_sensors):
+    a, b, key = two_sensors
+    other = Sensor.objects.create(name="x", type="Env", owner=User.objects.create_user(username="other", password="p"))
+    assert get_aligned(client, key, [a, other]).status_code == 404
+    assert client.get("/api/readings/aligned", {"sensor_ids": "1,x", "timestamp_from": at(0), "timestamp_to": at(1)},
+                      **bearer(key)).status_code == 400
+    assert get_aligned(client, key, [a], start=10, end=0).status_code == 400
+    assert get_aligned(client, key, [a], end=60 * 24 * 365, bucket="1s").status_code == 400  # Too many buckets
+    assert get_aligned(client, key, [a], format="xml").status_code == 400
+
+@pytest.mark.django_db
+def test_aligned_accepts_naive_bounds(client, two_sensors):
+    a, b, key = two_sensors
+    naive = START.replace(tzinfo=None).isoformat()
+    res = client.get("/api/readings/aligned", {"sensor_ids": f"{a.id},{b.id}", "timestamp_from": naive,
+                                               "timestamp_to": at(14), "bucket": "5m"}, **bearer(key))
+    assert res.status_code == 200
+    assert res.json() == get_aligned(client, key, [a, b], bucket="5m").json()
@@ -0,0 +1,102 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from core.models import Anomaly, Sensor
+from datetime import timedelta
+
+NOW = timezone.now().replace(microsecond=0)
+START = NOW - timedelta(hours=2)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def row(minute, temperature, humidity=45.0):
+    return {"timestamp": (START + timedelta(minutes=minute)).isoformat(), "temperature": temperature, "humidity": humidity}
+
+def steady(count):
+    # Around 21 °C with a little noise
+    return [row(i, 21.0 + (0.2 if i % 2 else -0.2)) for i in range(count)]
+
+def upload(client, key, sensor, rows):
+    return client.post(f"/api/sensors/{sensor.id}/readings/batch", data=json.dumps(rows),
+                       content_type="application/json", **bearer(key))
+
+@pytest.fixture
+def owner():
+    u = User.objects.create_user(username="anomaly_user", password="p")
+    return u, Token.objects.create(user=u).key
+
+@pytest.mark.django_db
+def test_outliers_are_flagged_as_they_arrive(client, owner, settings):
+    settings.ANOMALY_WARMUP = 30
+    u, key = owner
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+
+    upload(client, key, s, steady(20) + [row(20, 40.0)])  # Still warming up
+    assert not Anomaly.objects.exists()
+    upload(client, key, s, steady(60)[21:])
+    res = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(row(60, 35.0, humidity=5.0)),
+                      content_type="application/json", **bearer(key))
+    assert res.status_code == 201
+
+    flagged = {a.field: a for a in Anomaly.objects.filter(sensor=s)}
+    assert set(flagged) == {"temperature", "humidity"}
+    assert flagged["temperature"].value == 35.0
+    assert flagged["temperature"].expected == pytest.approx(21.0, abs=0.6)
+    assert flagged["temperature"].score > 4
+    assert flagged["humidity"].score < -4
+
+    body = client.get("/api/anomalies", **bearer(key)).json()
+    assert [(a["sensor_id"], a["field"], a["value"]) for a in body] == [(s.id, "humidity", 5.0), (s.id, "temperature", 35.0)]
+    assert client.get("/api/anomalies", {"since": NOW.isoformat()}, **bearer(key)).json() == []
+    assert len(client.get("/api/anomalies", {"sensor_id": s.id, "limit": 1}, **bearer(key)).json()) == 1
+
+    other = User.objects.create_user(username="other", password="p")
+    other_key = Token.objects.create(user=other).key
+    assert client.get("/api/anomalies", **bearer(other_key)).json() == []
+    assert client.get("/api/anomalies", {"sensor_id": s.id}, **bearer(other_key)).status_code == 404
+
+@pytest.mark.django_db
+def test_state_is_the_same_however_readings_arrive(client, owner, settings):
+    settings.ANOMALY_WARMUP = 5
+    u, key = owner
+    batch = Sensor.objects.create(name="Batch", type="Env", owner=u)
+    single = Sensor.objects.create(name="Single", type="Env", owner=u)
+    rows = steady(10)
+
+    upload(client, key, batch, list(reversed(rows)))  # Scored in time order within a batch
+    for r in rows:
+        client.post(f"/api/sensors/{single.id}/readings", data=json.dumps(r), content_type="application/json", **bearer(key))
+    batch.refresh_from_db()
+    single.refresh_from_db()
+    assert batch.anomaly_state == pytest.approx(single.anomaly_state)
+    assert batch.anomaly_state["temperature"][2] == 10
+
+    # A late reading is scored against the current average but doesn't move it
+    state = batch.anomaly_state
+    upload(client, key, batch, [row(-30, 80.0)])
+    batch.refresh_from_db()
+    assert batch.anomaly_state == state
+    assert Anomaly.objects.get(sensor=batch).value == 80.0
+
+@pytest.mark.django_db
+def test_naive_and_aware_timestamps_mix(client, owner, settings):
+    settings.ANOMALY_WARMUP = 5
+    u, key = owner
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    naive = {**row(0, 21.0), "timestamp": START.replace(tzinfo=None).isoformat()}
+    for body in (naive, row(1, 21.2)):
+        res = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(body),
+                          content_type="application/json", **bearer(key))
+        assert res.status_code == 201
+
+    # A naive "until" stored before timestamps were normalized doesn't break later writes
+    s.refresh_from_db()
+    s.anomaly_state["until"] = (START + timedelta(minutes=1)).replace(tzinfo=None).isoformat()
+    Sensor.objects.filter(pk=s.id).update(anomaly_state=s.anomaly_state)
+    assert upload(client, key, s, [row(2, 21.1)]).status_code == 200
+    s.refresh_from_db()
+    assert s.anomaly_state["temperature"][2] == 3
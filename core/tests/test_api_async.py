@@ -0,0 +1,151 @@
+import pytest
+import importlib.util
+import json
+import sys
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.test import AsyncClient, override_settings
+from django.urls import path, resolve
+from ninja import NinjaAPI
+from rest_framework.authtoken.models import Token
+import backend.urls
+from core import api as sync_api, auth
+from core.api_async import router as async_router, readings_router as async_readings_router
+from core.fastjson import ORJSONRenderer
+from core.models import Sensor, Reading, ReadingRollup
+from datetime import datetime, timedelta, timezone
+
+# The async routers on their own API, served through Django's ASGI handler (see pytestmark)
+api = NinjaAPI(renderer=ORJSONRenderer(), urls_namespace="async-api")
+api.add_router("/", async_router)
+api.add_router("/", async_readings_router)
+urlpatterns = [path("api/", api.urls)]
+
+pytestmark = pytest.mark.urls(__name__)
+
+def call(method, url, key=None, data=None):
+    # Helper: runs one request through the ASGI handler from a sync test
+    client = AsyncClient()
+    kwargs = {"headers": {"Authorization": f"Bearer {key}"}} if key else {}
+    if data is not None:
+        kwargs.update(data=json.dumps(data), content_type="application/json")
+    return async_to_sync(getattr(client, method))(url, **kwargs)
+
+@pytest.fixture
+def async_urlconf(monkeypatch):
+    # backend/urls.py loaded again with API_ASYNC on, as its own module so the normal URLconf stays in place.
+    # Ninja refuses routers that are mounted already, so they are detached for the load and put back after.
+    routers = (sync_api.router, sync_api.readings_router, auth.router, async_router, async_readings_router)
+    attached = [(router, router.api) for router in routers]
+    monkeypatch.setenv("NINJA_SKIP_REGISTRY", "1")
+    spec = importlib.util.spec_from_file_location("async_urls", backend.urls.__file__)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "async_urls", module)
+    for router in routers:
+        router.api = None
+    try:
+        with override_settings(API_ASYNC=True):
+            spec.loader.exec_module(module)
+        with override_settings(ROOT_URLCONF="async_urls"):
+            yield
+    finally:
+        for router, api_instance in attached:
+            router.set_api_instance(api_instance)
+
+@pytest.fixture
+def user_token(db):
+    u = User.objects.create_user(username="async_user", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    return u, tok.key
+
+@pytest.mark.django_db(transaction=True)
+def test_async_sensor_crud(user_token):
+    u, key = user_token
+    assert call("get", "/api/sensors").status_code == 401
+    assert call("get", "/api/sensors", "wrong").status_code == 401
+
+    res = call("post", "/api/sensors", key, {"name": " Kitchen ", "type": "Env"})
+    assert res.status_code == 200
+    sensor_id = res.json()["id"]
+    assert res.json()["name"] == "Kitchen"
+    assert call("post", "/api/sensors", key, {"name": " ", "type": "Env"}).status_code == 400
+
+    res = call("get", "/api/sensors", key)
+    assert res.json()["count"] == 1
+    assert res.json()["items"][0]["id"] == sensor_id
+
+    res = call("put", f"/api/sensors/{sensor_id}", key, {"name": "Hall", "type": "Env2"})
+    assert res.json()["name"] == "Hall"
+    assert call("get", f"/api/sensors/{sensor_id}", key).json()["type"] == "Env2"
+
+    # Another user's sensor is not found
+    other = User.objects.create_user(username="other", password="p")
+    other_sensor = Sensor.objects.create(name="X", type="Env", owner=other)
+    assert call("get", f"/api/sensors/{other_sensor.id}", key).status_code == 404
+
+    assert call("delete", f"/api/sensors/{sensor_id}", key).status_code == 202
+    assert call("get", f"/api/sensors/{sensor_id}", key).status_code == 404
+
+    # Deleted by another process while this one has it cached
+    other = Sensor.objects.create(name="Hall", type="Env", owner=u)
+    assert call("get", f"/api/sensors/{other.id}", key).status_code == 200
+    Sensor.all_objects.filter(pk=other.id).update(deleted_at=datetime.now(timezone.utc))
+    assert call("get", f"/api/sensors/{other.id}", key).status_code == 404
+
+@pytest.mark.django_db(transaction=True)
+def test_async_readings_create_and_list(user_token):
+    u, key = user_token
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    for i in range(3):
+        res = call("post", f"/api/sensors/{s.id}/readings", key, {
+            "temperature": 20 + i, "humidity": 50, "timestamp": (start + timedelta(minutes=i)).isoformat()
+        })
+        assert res.status_code == 201
+
+    # Duplicate timestamp and bad humidity are rejected like in the sync API
+    dup = {"temperature": 1, "timestamp": start.isoformat()}
+    assert call("post", f"/api/sensors/{s.id}/readings", key, dup).status_code == 400
+    bad = {"temperature": 1, "humidity": 120, "timestamp": start.isoformat()}
+    assert call("post", f"/api/sensors/{s.id}/readings", key, bad).status_code == 400
+    assert Reading.objects.filter(sensor=s).count() == 3
+    assert ReadingRollup.objects.get(sensor=s, resolution=ReadingRollup.HOUR).count == 3
+
+    res = call("get", f"/api/sensors/{s.id}/readings?limit=2", key)
+    assert [r["temperature"] for r in res.json()] == [22, 21]
+    res = call("get", f"/api/sensors/{s.id}/readings?cursor={res['X-Next-Cursor']}", key)
+    assert [r["temperature"] for r in res.json()] == [20]
+    assert "X-Next-Cursor" not in res
+
+@pytest.mark.django_db(transaction=True)
+def test_async_conditional_get(user_token):
+    u, key = user_token
+    s = Sensor.objects.create(name="S1", type="Env", owner=u)
+    Reading.objects.create(sensor=s, temperature=20.0, timestamp=datetime(2024, 8, 1, tzinfo=timezone.utc))
+
+    client = AsyncClient()
+    for url in (f"/api/sensors/{s.id}/readings", "/api/sensors", f"/api/sensors/{s.id}"):
+        res = async_to_sync(client.get)(url, headers={"Authorization": f"Bearer {key}"})
+        assert res.status_code == 200
+        headers = {"Authorization": f"Bearer {key}", "If-None-Match": res["ETag"]}
+        assert async_to_sync(client.get)(url, headers=headers).status_code == 304
+
+    res = call("post", f"/api/sensors/{s.id}/readings", key, {"temperature": 21.0, "timestamp": "2024-08-01T00:01:00Z"})
+    assert res.status_code == 201
+    assert async_to_sync(client.get)(f"/api/sensors/{s.id}/readings", headers=headers).status_code == 200
+
+@pytest.mark.django_db(transaction=True)
+def test_api_async_setting_mounts_async_views_first(user_token, async_urlconf):
+    u, key = user_token
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    # The async routers answer their paths ahead of the sync ones, the rest still comes from the sync routers
+    assert iscoroutinefunction(resolve("/api/sensors").func)
+    assert iscoroutinefunction(resolve(f"/api/sensors/{s.id}/readings").func)
+    assert not iscoroutinefunction(resolve(f"/api/sensors/{s.id}/readings/stats").func)
+
+    res = call("post", f"/api/sensors/{s.id}/readings", key, {"temperature": 21.0, "timestamp": "2024-08-01T00:00:00Z"})
+    assert res.status_code == 201
+    assert [r["temperature"] for r in call("get", f"/api/sensors/{s.id}/readings", key).json()] == [21.0]
+    assert [item["name"] for item in call("get", "/api/sensors", key).json()["items"]] == ["S"]
+    assert call("get", f"/api/sensors/{s.id}/readings/stats", key).json()["count"] == 1
+    assert call("get", "/api/sensors", "wrong").status_code == 401
@@ -0,0 +1,70 @@
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core import authcache
+from core.models import Sensor
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+
+@pytest.mark.django_db
+def test_token_and_sensor_lookups_are_cached(client, django_assert_num_queries):
+    """A repeated request finds the token and the sensor in the cache"""
+
+    u = User.objects.create_user(username="cached", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+
+    # First request: token+user query and sensor query
+    with django_assert_num_queries(2):
+        assert client.get(f"/api/sensors/{s.id}", **bearer(tok.key)).status_code == 200
+
+    # Second request: served from the cache, only checking that the sensor wasn't deleted meanwhile
+    with django_assert_num_queries(1):
+        assert client.get(f"/api/sensors/{s.id}", **bearer(tok.key)).status_code == 200
+
+    stats = authcache.stats()
+    assert (stats["tokens"]["hits"], stats["tokens"]["misses"]) == (1, 1)
+    assert (stats["sensors"]["hits"], stats["sensors"]["misses"]) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_cache_is_invalidated_on_change(client):
+    """Updating or deleting a sensor, or deleting a token, is seen by the next request"""
+
+    u = User.objects.create_user(username="changes", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="Old", type="Env", owner=u)
+    assert client.get(f"/api/sensors/{s.id}", **bearer(tok.key)).json()["name"] == "Old"
+
+    # Rename outside the API, the cached copy must not be served
+    s.name = "New"
+    s.save()
+    assert client.get(f"/api/sensors/{s.id}", **bearer(tok.key)).json()["name"] == "New"
+
+    sensor_id = s.id
+    s.delete()
+    assert client.get(f"/api/sensors/{sensor_id}", **bearer(tok.key)).status_code == 404
+
+    tok.delete()
+    assert client.get("/api/sensors", **bearer(tok.key)).status_code == 401
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """TTLCache keeps at most maxsize entries and drops the least recently used"""
+
+    cache = authcache.TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is authcache.MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    # A zero TTL turns the cache off
+    off = authcache.TTLCache(maxsize=2, ttl=0)
+    off.set("a", 1)
+    assert off.get("a") is authcache.MISSING
@@ -0,0 +1,110 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from core.models import Sensor, Reading
+from django.utils import timezone
+from datetime import timedelta
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+@pytest.mark.django_db
+def test_batch_creates_readings_and_reports_each_item(client):
+    """POST /api/sensors/{id}/readings/batch returns created / duplicate / invalid per item"""
+
+    # Create user, token and sensor
+    u = User.objects.create_user(username="gateway", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+
+    # One reading already exists in the database
+    now = timezone.now().replace(microsecond=0)
+    Reading.objects.create(sensor=s, temperature=20, humidity=40, timestamp=now)
+
+    payload = [
+        {"temperature": 21.0, "humidity": 41.0, "timestamp": (now + timedelta(minutes=1)).isoformat()},
+        {"temperature": 22.0, "humidity": 42.0, "timestamp": now.isoformat()},  # already stored
+        {"temperature": 23.0, "humidity": 150.0, "timestamp": (now + timedelta(minutes=2)).isoformat()},  # bad humidity
+        {"temperature": 24.0, "timestamp": (now + timedelta(minutes=1)).isoformat()},  # repeated in batch
+        {"humidity": 10.0, "timestamp": (now + timedelta(minutes=3)).isoformat()},  # missing temperature
+    ]
+    res = client.post(
+        f"/api/sensors/{s.id}/readings/batch",
+        data=json.dumps(payload),
+        content_type="application/json",
+        **bearer(tok.key),
+    )
+
+    assert res.status_code == 200
+    data = res.json()
+    assert [r["status"] for r in data["results"]] == ["created", "duplicate", "invalid", "duplicate", "invalid"]
+    assert (data["created"], data["duplicates"], data["invalid"]) == (1, 2, 2)
+
+    # Only the first item was written
+    assert Reading.objects.filter(sensor=s).count() == 2
+    assert Reading.objects.get(id=data["results"][0]["id"]).temperature == 21.0
+
+
+@pytest.mark.django_db
+def test_batch_requires_owned_sensor_and_size_limit(client, settings):
+    """Batch upload is 404 for other users' sensors and 400 when the batch is too big"""
+
+    owner = User.objects.create_user(username="owner", password="p")
+    other = User.objects.create_user(username="other", password="p")
+    tok, _ = Token.objects.get_or_create(user=other)
+    s = Sensor.objects.create(name="S", type="Env", owner=owner)
+
+    item = {"temperature": 20.0, "timestamp": timezone.now().isoformat()}
+    res = client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps([item]),
+                      content_type="application/json", **bearer(tok.key))
+    assert res.status_code == 404
+
+    # Lower the limit so the test doesn't need a huge payload
+    settings.READINGS_BATCH_MAX_SIZE = 2
+    own = Sensor.objects.create(name="Mine", type="Env", owner=other)
+    res = client.post(f"/api/sensors/{own.id}/readings/batch", data=json.dumps([item] * 3),
+                      content_type="application/json", **bearer(tok.key))
+    assert res.status_code == 400
+    assert not Reading.objects.exists()
+
+@pytest.mark.django_db
+def test_duplicate_check_only_reads_the_batch_timestamps(client, settings):
+    """An old and a new reading in one batch don't load the stored history between them"""
+    settings.READINGS_BULK_BATCH_SIZE = 2  # Several lookup chunks
+    u = User.objects.create_user(username="span", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    start = timezone.now().replace(microsecond=0) - timedelta(days=30)
+    Reading.objects.bulk_create([Reading(sensor=s, temperature=20, timestamp=start + timedelta(hours=i)) for i in range(500)])
+
+    payload = [{"temperature": 21.0, "timestamp": (start + timedelta(hours=i)).isoformat()} for i in (0, 250, 499, 600, 700)]
+    with CaptureQueriesContext(connection) as ctx:
+        res = client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps(payload),
+                          content_type="application/json", **bearer(tok.key))
+    assert [r["status"] for r in res.json()["results"]] == ["duplicate"] * 3 + ["created"] * 2
+    lookups = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "core_reading"."timestamp"')]
+    assert len(lookups) == 3 and all(" IN (" in sql for sql in lookups)
+
+@pytest.mark.django_db
+def test_items_that_are_not_objects_are_reported_invalid(client):
+    """A number or null in the list is one invalid item, not a rejected batch"""
+    u = User.objects.create_user(username="loose", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    item = {"temperature": 20.0, "timestamp": timezone.now().isoformat()}
+
+    res = client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps([item, 5, None]),
+                      content_type="application/json", **bearer(tok.key))
+    assert res.status_code == 200
+    assert [r["status"] for r in res.json()["results"]] == ["created", "invalid", "invalid"]
+
+    res = client.post("/api/readings/batch", data=json.dumps([{**item, "device_id": "S"}, 5]),
+                      content_type="application/json", **bearer(tok.key))
+    assert res.status_code == 200
+    body = res.json()
+    assert body["devices"][0]["duplicates"] == 1
+    assert [(e["index"], e["status"]) for e in body["errors"]] == [(1, "invalid")]
@@ -0,0 +1,90 @@
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core.columnar import CONTENT_TYPE, decode_frames, encode_frame
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+def bearer(t, accept=None):
+    # Helper: adds the authorization header with the user's token (and an Accept header)
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+    if accept:
+        headers["HTTP_ACCEPT"] = accept
+    return headers
+
+@pytest.fixture
+def sensor_with_readings(db):
+    # Create a user with a token and a sensor with five readings, two without humidity
+    u = User.objects.create_user(username="columnar", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="device-001", type="EnviroSense", owner=u)
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        Reading.objects.create(
+            sensor=s,
+            temperature=20.5 + i,
+            humidity=None if i % 2 else 40.25 + i,
+            timestamp=start + timedelta(minutes=i),
+        )
+    return s, tok.key
+
+def test_frame_round_trip_and_layout():
+    ts = datetime(2024, 8, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    rows = [(7, ts, 21.5, None), (8, ts + timedelta(seconds=1), -3.25, 55.0)]
+    frame = encode_frame(rows, with_ids=True)
+
+    # 16 byte header, 4 columns of 2 x 8 bytes, 8 byte null mask
+    assert len(frame) == 16 + 4 * 16 + 8
+    assert decode_frames(frame) == [
+        {"id": 7, "timestamp": ts, "temperature": 21.5, "humidity": None},
+        {"id": 8, "timestamp": ts + timedelta(seconds=1), "temperature": -3.25, "humidity": 55.0},
+    ]
+
+@pytest.mark.django_db
+def test_list_readings_columnar_matches_json(client, sensor_with_readings):
+    """Accept: columnar returns the same page as JSON, with the same cursor header"""
+    s, key = sensor_with_readings
+    url = f"/api/sensors/{s.id}/readings?limit=3"
+
+    as_json = client.get(url, **bearer(key))
+    as_columnar = client.get(url, **bearer(key, accept=CONTENT_TYPE))
+    assert as_columnar.status_code == 200
+    assert as_columnar["Content-Type"] == CONTENT_TYPE
+    assert as_columnar["X-Next-Cursor"] == as_json["X-Next-Cursor"]
+    assert "Accept" in as_columnar["Vary"]
+
+    decoded = decode_frames(as_columnar.content)
+    expected = as_json.json()
+    assert [r["id"] for r in decoded] == [r["id"] for r in expected]
+    assert [r["humidity"] for r in decoded] == [r["humidity"] for r in expected]
+    assert [r["timestamp"] for r in decoded] == [
+        datetime.fromisoformat(r["timestamp"].replace("Z", "+00:00")) for r in expected
+    ]
+
+@pytest.mark.django_db
+def test_list_readings_any_accept_keeps_json(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    res = client.get(f"/api/sensors/{s.id}/readings", **bearer(key, accept="*/*"))
+    assert res["Content-Type"] == "application/json; charset=utf-8"
+    assert len(res.json()) == 5
+
+@pytest.mark.django_db
+def test_export_columnar_streams_frames(client, sensor_with_readings, settings):
+    """Columnar exports send one frame per chunk, oldest first"""
+    s, key = sensor_with_readings
+    settings.READINGS_EXPORT_CHUNK_SIZE = 2
+
+    res = client.get(f"/api/sensors/{s.id}/readings/export", **bearer(key, accept=CONTENT_TYPE))
+    assert res.status_code == 200
+    assert res["Content-Type"] == CONTENT_TYPE
+    chunks = list(res.streaming_content)
+    assert len(chunks) == 3
+
+    decoded = decode_frames(b"".join(chunks))
+    assert [r["temperature"] for r in decoded] == [20.5, 21.5, 22.5, 23.5, 24.5]
+    assert [r["humidity"] for r in decoded] == [40.25, None, 42.25, None, 44.25]
+    assert "id" not in decoded[0]
+
+    # An explicit format parameter wins over the Accept header
+    res = client.get(f"/api/sensors/{s.id}/readings/export?format=csv", **bearer(key, accept=CONTENT_TYPE))
+    assert res["Content-Type"] == "text/csv"
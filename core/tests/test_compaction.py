@@ -0,0 +1,105 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from core import compaction, rollups
+from core.ingest import write_new
+from core.models import Sensor, Reading, ReadingRollup
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+NOW = START + timedelta(days=10)
+POLICY = compaction.parse_policy("5d:5m,8d:1h")
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def rollup_rows(sensor):
+    fields = ["resolution", "bucket_start", "count", "temperature_sum", "temperature_min", "temperature_max", "humidity_count", "humidity_sum"]
+    return list(ReadingRollup.objects.filter(sensor=sensor).order_by("resolution", "bucket_start").values_list(*fields))
+
+def hourly_averages(readings):
+    hours = {}
+    for ts, temperature in readings:
+        hours.setdefault(int(ts.timestamp()) // 3600 * 3600, []).append(temperature)
+    return {epoch: sum(values) / len(values) for epoch, values in hours.items()}
+
+@pytest.fixture
+def sensor_with_history():
+    u = User.objects.create_user(username="compaction_user", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="Old", type="Env", owner=u)
+    # One reading a minute for two days, long past both steps, and a few recent ones
+    minutes = [START + timedelta(minutes=i) for i in range(2 * 24 * 60)]
+    minutes += [NOW - timedelta(hours=h) for h in (3, 2, 1)]
+    readings = [Reading(sensor=s, timestamp=ts, temperature=20.0 + (i % 60) / 10, humidity=40.0 if i % 2 else None)
+                for i, ts in enumerate(minutes)]
+    with transaction.atomic():
+        write_new(s, readings)
+    s.refresh_from_db()
+    return s, key
+
+@pytest.mark.django_db
+def test_compaction_replaces_old_readings_by_averages(client, sensor_with_history):
+    s, key = sensor_with_history
+    rollups_before = rollup_rows(s)
+    day0, day1 = START, START + timedelta(days=1)
+    exact = hourly_averages(Reading.objects.filter(sensor=s, timestamp__lt=day1 + timedelta(days=1)).values_list("timestamp", "temperature"))
+
+    slices = [(res, start, end, removed, written) for _, res, start, end, removed, written in compaction.run(POLICY, days=1, now=NOW)]
+    # Coarsest step first: day 0 to hours, then day 1 to five minutes
+    assert slices == [(3600, day0, day1, 1440, 24), (300, day1, day1 + timedelta(days=1), 1440, 288)]
+    s.refresh_from_db()
+    assert s.reading_count == 24 + 288 + 3
+    assert s.compacted_until == day1 + timedelta(days=1)
+    assert Reading.objects.filter(sensor=s, timestamp__lt=day1).count() == 24
+    assert rollup_rows(s) == rollups_before  # Rollups stay exact
+
+    res = client.get(f"/api/sensors/{s.id}/readings?limit=1000", **bearer(key))
+    assert res["X-Readings-Resolution"] == "raw, 5m, 1h"
+    res = client.get(f"/api/sensors/{s.id}/readings", {"timestamp_from": (NOW - timedelta(days=1)).isoformat()}, **bearer(key))
+    assert res["X-Readings-Resolution"] == "raw"
+
+    # The next run moves day 1 to hours, with values from the rollups; the 5m step has nothing left
+    slices = [(res, start, removed, written) for _, res, start, _, removed, written in compaction.run(POLICY, days=1, now=NOW)]
+    assert slices == [(3600, day1, 288, 24)]
+    compacted = {int(r.timestamp.timestamp()): r.temperature for r in Reading.objects.filter(sensor=s, timestamp__lt=NOW - timedelta(days=1))}
+    assert compacted == pytest.approx(exact)
+    s.refresh_from_db()
+    assert s.reading_count == 48 + 3
+    assert s.compaction_watermarks == {"3600": (START + timedelta(days=2)).isoformat(), "300": (START + timedelta(days=5)).isoformat()}
+
+    # Up to date: the watermarks answer without a query
+    with CaptureQueriesContext(connection) as ctx:
+        assert list(compaction.run(POLICY, now=NOW)) == []
+    assert len(ctx.captured_queries) == 1
+
+    rollups.rebuild(s.id)
+    assert rollup_rows(s) == rollups_before
+
+@pytest.mark.django_db
+def test_compaction_policy_is_validated():
+    assert compaction.parse_policy("30d:5m, 365d:1h") == [(30 * 86400, 300), (365 * 86400, 3600)]
+    assert compaction.parse_policy("") == []
+    for bad in ("30d", "30d:7m", "365d:1h,30d:5m", "30d:1h,365d:5m", "30d:soon"):
+        with pytest.raises(ValueError):
+            compaction.parse_policy(bad)
+    with pytest.raises(CommandError):
+        call_command("compact_readings", policy="30d:7m")
+
+@pytest.mark.django_db
+def test_compaction_without_rollups_keeps_averages():
+    # Readings written behind the API's back (or before rollups existed) have no rollup rows
+    u = User.objects.create_user(username="no_rollups", password="p")
+    s = Sensor.objects.create(name="Bare", type="Env", owner=u)
+    Reading.objects.bulk_create([Reading(sensor=s, timestamp=START + timedelta(minutes=i), temperature=20.0 + i % 60 / 10)
+                                 for i in range(300)])
+    assert not ReadingRollup.objects.filter(sensor=s).exists()
+
+    slices = [(removed, written) for *_, removed, written in compaction.run(compaction.parse_policy("5d:1h"), now=NOW)]
+    assert slices == [(300, 5)]
+    assert list(Reading.objects.filter(sensor=s).order_by("timestamp").values_list("temperature", flat=True)) == pytest.approx([22.95] * 5)
@@ -0,0 +1,115 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from core.columnar import CONTENT_TYPE as COLUMNAR_TYPE
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def post_reading(client, s, key, minute):
+    # Helper: creates one reading through the API
+    payload = {"temperature": 20.0, "timestamp": (START + timedelta(minutes=minute)).isoformat()}
+    res = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(payload),
+                      content_type="application/json", **bearer(key))
+    assert res.status_code == 201
+
+@pytest.fixture
+def user_sensor(db):
+    u = User.objects.create_user(username="etag_user", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S1", type="Env", owner=u)
+    return u, s, tok.key
+
+@pytest.mark.django_db
+def test_readings_not_modified_until_written(client, user_sensor, django_assert_num_queries):
+    u, s, key = user_sensor
+    post_reading(client, s, key, 0)
+    url = f"/api/sensors/{s.id}/readings"
+
+    res = client.get(url, **bearer(key))
+    assert res.status_code == 200
+    etag = res["ETag"]
+    assert res["Last-Modified"]
+    assert "no-cache" in res["Cache-Control"]
+
+    # Only the version lookup runs (token and sensor come from the auth cache)
+    with django_assert_num_queries(1):
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 304
+    assert res["ETag"] == etag
+    assert res.content == b""
+
+    # Other query strings and formats are other representations
+    assert client.get(url + "?limit=1", HTTP_IF_NONE_MATCH=etag, **bearer(key)).status_code == 200
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT=COLUMNAR_TYPE, **bearer(key))
+    assert res.status_code == 200 and res["ETag"] != etag
+
+    # Single and batch writes change the ETag
+    post_reading(client, s, key, 1)
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 200 and len(res.json()) == 2
+    etag = res["ETag"]
+    batch = [{"temperature": 21.0, "timestamp": (START + timedelta(minutes=2)).isoformat()}]
+    client.post(f"{url}/batch", data=json.dumps(batch), content_type="application/json", **bearer(key))
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 200 and len(res.json()) == 3
+
+    # If-Modified-Since works on its own too
+    since = http_date((Sensor.objects.get(pk=s.id).readings_modified_at + timedelta(seconds=1)).timestamp())
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=since, **bearer(key)).status_code == 304
+
+@pytest.mark.django_db
+def test_sensor_edit_keeps_readings_version(client, user_sensor):
+    u, s, key = user_sensor
+    client.get(f"/api/sensors/{s.id}", **bearer(key)) # Caches the sensor before the write bumps its version
+    post_reading(client, s, key, 0)
+
+    res = client.put(f"/api/sensors/{s.id}", data=json.dumps({"name": "S2", "type": "Env"}),
+                     content_type="application/json", **bearer(key))
+    assert res.status_code == 200
+    assert Sensor.objects.get(pk=s.id).readings_version == 1
+
+@pytest.mark.django_db
+def test_sensor_detail_and_list_not_modified(client, user_sensor):
+    u, s, key = user_sensor
+    url = f"/api/sensors/{s.id}"
+    res = client.get(url, **bearer(key))
+    etag = res["ETag"]
+    assert res.json()["name"] == "S1"
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key)).status_code == 304
+
+    client.put(url, data=json.dumps({"name": "S2", "type": "Env"}), content_type="application/json", **bearer(key))
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 200 and res.json()["name"] == "S2"
+
+    other = Sensor.objects.create(name="S3", type="Env", owner=u)
+    res = client.get("/api/sensors", **bearer(key))
+    etag = res["ETag"]
+    assert client.get("/api/sensors", HTTP_IF_NONE_MATCH=etag, **bearer(key)).status_code == 304
+    assert client.get("/api/sensors?q=S3", HTTP_IF_NONE_MATCH=etag, **bearer(key)).status_code == 200
+
+    # A delete doesn't make any sensor newer, the ETag still changes
+    client.delete(f"/api/sensors/{other.id}", **bearer(key))
+    res = client.get("/api/sensors", HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 200 and res.json()["count"] == 1
+    since = res["Last-Modified"]
+    assert client.get("/api/sensors", HTTP_IF_MODIFIED_SINCE=since, **bearer(key)).status_code == 200
+
+@pytest.mark.django_db
+def test_retention_changes_readings_etag(client, user_sensor):
+    from core import partitions
+    u, s, key = user_sensor
+    Reading.objects.create(sensor=s, temperature=20.0, timestamp=START)
+    url = f"/api/sensors/{s.id}/readings"
+    etag = client.get(url, **bearer(key))["ETag"]
+
+    partitions.expire(1, now=START + timedelta(days=70))
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag, **bearer(key))
+    assert res.status_code == 200 and res.json() == []
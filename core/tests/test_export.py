@@ -0,0 +1,63 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+@pytest.fixture
+def sensor_with_readings(db):
+    # Create a user with a token and a sensor with three readings
+    u = User.objects.create_user(username="exporter", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="device-001", type="EnviroSense", owner=u)
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    for i in range(3):
+        Reading.objects.create(
+            sensor=s, temperature=23.75 + i, humidity=None if i == 1 else 45.29, timestamp=start + timedelta(minutes=i)
+        )
+    return s, tok.key
+
+
+@pytest.mark.django_db
+def test_export_csv_matches_seed_file_layout(client, sensor_with_readings, settings):
+    """GET /api/sensors/{id}/readings/export streams CSV like sensor_readings_wide.csv"""
+    s, key = sensor_with_readings
+    settings.READINGS_EXPORT_CHUNK_SIZE = 2  # Force more than one chunk
+
+    res = client.get(f"/api/sensors/{s.id}/readings/export", **bearer(key))
+    assert res.status_code == 200
+    assert res.streaming
+    assert res["Content-Type"] == "text/csv"
+
+    body = b"".join(res.streaming_content).decode()
+    assert body.splitlines() == [
+        "timestamp,device_id,temperature,humidity",
+        "2024-08-01 00:00:00+00:00,device-001,23.75,45.29",
+        "2024-08-01 00:01:00+00:00,device-001,24.75,",
+        "2024-08-01 00:02:00+00:00,device-001,25.75,45.29",
+    ]
+
+
+@pytest.mark.django_db
+def test_export_ndjson_with_filters(client, sensor_with_readings):
+    """NDJSON export honours timestamp_from / timestamp_to"""
+    s, key = sensor_with_readings
+
+    res = client.get(
+        f"/api/sensors/{s.id}/readings/export",
+        {"format": "ndjson", "timestamp_from": "2024-08-01T00:01:00+00:00"},
+        **bearer(key),
+    )
+    assert res.status_code == 200
+    rows = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+    assert [r["temperature"] for r in rows] == [24.75, 25.75]
+    assert rows[0] == {"timestamp": "2024-08-01T00:01:00Z", "device_id": "device-001", "temperature": 24.75, "humidity": None}
+
+    # Unknown formats are rejected
+    res = client.get(f"/api/sensors/{s.id}/readings/export", {"format": "xml"}, **bearer(key))
+    assert res.status_code == 400
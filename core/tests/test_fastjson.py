@@ -0,0 +1,81 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from ninja.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
+from backend.urls import api
+from core.models import Sensor, Reading
+from core.schemas import PagedSensorOut, ReadingOut
+from datetime import datetime, timedelta, timezone
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def schema_output(data):
+    # Helper: what the schema-validated path renders for already validated data
+    return api.renderer.render(None, data, response_status=200)
+
+@pytest.fixture
+def user_with_data(db):
+    # A user with 12 sensors (one with a non-ASCII name) and readings with odd timestamps and nulls
+    u = User.objects.create_user(username="fastjson", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    sensors = [Sensor.objects.create(name=f"Küche {i}", type="Env", owner=u) for i in range(12)]
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    for i in range(25):
+        Reading.objects.create(
+            sensor=sensors[0],
+            temperature=-3.5 + i / 3,
+            humidity=None if i % 4 == 0 else 40 + i * 0.1,
+            timestamp=start + timedelta(minutes=i, microseconds=123456 * (i % 3)),
+        )
+    return u, sensors[0], tok.key
+
+@pytest.mark.django_db
+def test_list_readings_fast_path_matches_schema_output(client, user_with_data):
+    """The values_list + orjson path gives the same bytes as ReadingOut validation would"""
+    u, s, key = user_with_data
+    res = client.get(f"/api/sensors/{s.id}/readings?limit=10", **bearer(key))
+    assert res.status_code == 200
+    assert res["Content-Type"] == "application/json; charset=utf-8"
+
+    page = Reading.objects.filter(sensor=s).order_by("-timestamp", "-id")[:10]
+    expected = [ReadingOut.model_validate(r).model_dump() for r in page]
+    assert res.content == schema_output(expected)
+
+    # Same JSON as the previous json.dumps renderer, only the whitespace differs
+    old = JSONRenderer().render(None, expected, response_status=200)
+    assert json.loads(res.content) == json.loads(old)
+    assert json.loads(res.content)[1]["timestamp"] == "2024-08-01T00:23:00.246Z"
+
+@pytest.mark.django_db
+def test_list_sensors_fast_path_matches_schema_output(client, user_with_data):
+    """GET /api/sensors keeps the paginated {items, count} output"""
+    u, s, key = user_with_data
+    for page in (1, 2, 3):
+        res = client.get(f"/api/sensors?page={page}", **bearer(key))
+        assert res.status_code == 200
+
+        sensors = Sensor.objects.filter(owner=u)
+        offset = (page - 1) * 10
+        expected = PagedSensorOut.model_validate({"items": list(sensors[offset:offset + 10]), "count": 12})
+        assert res.content == schema_output(expected.model_dump())
+
+    assert client.get("/api/sensors?page=0", **bearer(key)).status_code == 422
+    assert [x["name"] for x in client.get("/api/sensors?q=küche 1", **bearer(key)).json()["items"]] == [
+        "Küche 1", "Küche 10", "Küche 11"
+    ]
+
+@pytest.mark.django_db
+def test_responses_with_their_own_status_are_compact(client, user_with_data):
+    """Bodies returned with an explicit status (201, errors) are encoded like every other response"""
+    u, s, key = user_with_data
+    reading = {"temperature": 21.5, "timestamp": "2024-09-01T00:00:00Z"}
+    created = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(reading), content_type="application/json", **bearer(key))
+    assert created.status_code == 201
+    assert created.content == schema_output(created.json())
+    duplicate = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(reading), content_type="application/json", **bearer(key))
+    assert duplicate.status_code == 400
+    assert duplicate.content == b'{"detail":"Reading for this timestamp already exists for this sensor"}'
+    assert duplicate["Content-Type"] == "application/json; charset=utf-8"
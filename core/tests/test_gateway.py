@@ -0,0 +1,81 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core import authcache
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def row(device, minute, temperature=20.0, **extra):
+    return {"device_id": device, "timestamp": (START + timedelta(minutes=minute)).isoformat(),
+            "temperature": temperature, "humidity": 40.0, **extra}
+
+def upload(client, key, rows, query=""):
+    return client.post(f"/api/readings/batch{query}", data=json.dumps(rows),
+                       content_type="application/json", **bearer(key))
+
+@pytest.fixture
+def gateway_user():
+    u = User.objects.create_user(username="gateway_user", password="p")
+    return u, Token.objects.create(user=u).key
+
+@pytest.mark.django_db
+def test_gateway_upload_groups_rows_by_device(client, gateway_user):
+    u, key = gateway_user
+    a = Sensor.objects.create(name="device-001", type="Env", owner=u)
+    b = Sensor.objects.create(name="device-002", type="Env", owner=u)
+    Sensor.objects.create(name="device-003", type="Env", owner=User.objects.create_user(username="other", password="p"))
+    Reading.objects.create(sensor=b, temperature=19.0, humidity=40.0, timestamp=START)
+
+    rows = [
+        row("device-001", 0), row("device-002", 0), row("device-001", 1), row("device-002", 1),
+        row("device-001", 1, temperature=30.0),  # Repeated in the upload
+        row("device-002", 2, humidity=150.0),  # Bad humidity
+        row("device-003", 0),  # Another user's device name, unknown here
+        {"timestamp": START.isoformat(), "temperature": 20.0},  # No device
+    ]
+    res = upload(client, key, rows)
+    assert res.status_code == 200
+    body = res.json()
+    assert (body["created"], body["duplicates"], body["invalid"], body["skipped"]) == (3, 2, 2, 1)
+    assert [e["index"] for e in body["errors"]] == [5, 7]
+    devices = {d["device_id"]: d for d in body["devices"]}
+    assert list(devices) == ["device-001", "device-002", "device-003"]
+    assert devices["device-001"] == {"device_id": "device-001", "sensor_id": a.id, "sensor_created": False,
+                                     "created": 2, "duplicates": 1, "invalid": 0, "skipped": 0}
+    assert (devices["device-002"]["created"], devices["device-002"]["duplicates"], devices["device-002"]["invalid"]) == (1, 1, 1)
+    assert devices["device-003"]["sensor_id"] is None and devices["device-003"]["skipped"] == 1
+
+    assert Reading.objects.filter(sensor=a).count() == 2
+    a.refresh_from_db()
+    assert (a.reading_count, a.last_temperature) == (2, 20.0)
+    assert not Sensor.objects.filter(owner=u, name="device-003").exists()
+
+    # The second upload finds the names in the cache
+    upload(client, key, [row("device-001", 5), row("device-002", 5)])
+    assert authcache.stats()["names"]["hits"] == 2
+
+@pytest.mark.django_db
+def test_gateway_upload_creates_sensors_on_request(client, gateway_user):
+    u, key = gateway_user
+    res = upload(client, key, [row("new-device", 0), row("new-device", 1)], "?create_sensors=Gateway")
+    device = res.json()["devices"][0]
+    assert device["sensor_created"] is True and device["created"] == 2
+    sensor = Sensor.objects.get(owner=u, name="new-device")
+    assert (sensor.id, sensor.type) == (device["sensor_id"], "Gateway")
+
+    device = upload(client, key, [row("new-device", 2)], "?create_sensors=Gateway").json()["devices"][0]
+    assert (device["sensor_id"], device["sensor_created"]) == (sensor.id, False)
+    assert Sensor.objects.filter(owner=u, name="new-device").count() == 1
+
+    # Renaming drops the cached name
+    sensor.name = "renamed"
+    sensor.save()
+    device = upload(client, key, [row("new-device", 3)]).json()["devices"][0]
+    assert (device["sensor_id"], device["skipped"]) == (None, 1)
@@ -0,0 +1,61 @@
+import pytest
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from core.importer import import_file
+from core.models import Sensor, Reading, ReadingRollup
+
+CSV = """timestamp,device_id,temperature,humidity
+2024-08-01 00:00:00+00:00,device-001,23.75,45.29
+2024-08-01 00:01:00+00:00,device-001,23.46,
+2024-08-01 00:01:00+00:00,device-001,23.46,46.46
+2024-08-01 00:00:00+00:00,device-002,19.10,50.00
+2024-08-01 00:02:00+00:00,device-999,20.00,40.00
+not-a-date,device-001,20.00,40.00
+2024-08-01 00:03:00+00:00,device-001,warm,40.00
+"""
+
+@pytest.fixture
+def owner_with_sensors(db):
+    # Create a user with two sensors named like the CSV devices
+    u = User.objects.create_user(username="importer", password="p")
+    Sensor.objects.create(name="device-001", type="EnviroSense", owner=u)
+    Sensor.objects.create(name="device-002", type="ClimaTrack", owner=u)
+    return u
+
+
+@pytest.mark.django_db
+def test_import_file_counts_created_duplicates_and_skipped(tmp_path, owner_with_sensors):
+    """import_file writes in chunks and reports created, duplicate and skipped rows"""
+    path = tmp_path / "readings.csv"
+    path.write_text(CSV)
+
+    # Chunks of two rows, so the repeated timestamp lands in a later chunk
+    stats = import_file(path, owner_with_sensors, chunk_size=2)
+    assert (stats["rows"], stats["created"], stats["duplicates"], stats["skipped"]) == (7, 3, 1, 3)
+    assert Reading.objects.count() == 3
+    assert Reading.objects.get(sensor__name="device-001", humidity__isnull=True).temperature == 23.46
+
+    # Importing again only finds duplicates, and rollups count each reading once
+    again = import_file(path, owner_with_sensors)
+    assert (again["created"], again["duplicates"]) == (0, 4)
+    daily = ReadingRollup.objects.filter(resolution=ReadingRollup.DAY)
+    assert sum(r.count for r in daily) == 3
+
+
+@pytest.mark.django_db
+def test_import_command_accepts_globs_and_creates_sensors(tmp_path, owner_with_sensors):
+    """import_readings expands globs and can create sensors for unknown devices"""
+    (tmp_path / "a.csv").write_text(CSV)
+    (tmp_path / "b.csv").write_text(CSV)
+
+    out = StringIO()
+    call_command(
+        "import_readings", str(tmp_path / "*.csv"), owner="importer", create_sensors="Imported", stdout=out
+    )
+
+    # device-999 was created, the second file only had duplicates
+    assert Sensor.objects.get(name="device-999").type == "Imported"
+    assert Reading.objects.count() == 4
+    assert "Import complete: 14 rows, 4 created" in out.getvalue()
+    assert "rows/s" in out.getvalue()
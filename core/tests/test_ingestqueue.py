@@ -0,0 +1,94 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core import ingestqueue
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def post(client, key, sensor, minute, temperature=20.0):
+    body = {"temperature": temperature, "humidity": 40.0, "timestamp": (START + timedelta(minutes=minute)).isoformat()}
+    return client.post(f"/api/sensors/{sensor.id}/readings", data=json.dumps(body),
+                       content_type="application/json", **bearer(key))
+
+@pytest.fixture
+def queue(settings, tmp_path):
+    settings.INGEST_QUEUE_ENABLED = True
+    settings.INGEST_QUEUE_PATH = str(tmp_path / "queue.sqlite3")
+    settings.INGEST_QUEUE_FSYNC = False
+
+@pytest.fixture
+def owner():
+    u = User.objects.create_user(username="queue_user", password="p", is_staff=True)
+    return u, Token.objects.create(user=u).key
+
+@pytest.mark.django_db
+def test_queued_readings_are_written_by_flush(client, queue, owner):
+    u, key = owner
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    gone = Sensor.objects.create(name="Gone", type="Env", owner=u)
+
+    res = post(client, key, s, 1)
+    assert res.status_code == 202
+    assert res.json()["status"] == "queued"
+    post(client, key, s, 2, temperature=21.0)
+    post(client, key, s, 2, temperature=99.0)  # Same timestamp again, the first one wins
+    post(client, key, gone, 1)
+    gone.delete()
+    assert not Reading.objects.exists()
+
+    status = client.get("/api/ingest/queue", **bearer(key)).json()
+    assert status["depth"] == 4
+    assert status["lag_seconds"] >= 0
+
+    assert ingestqueue.flush() == {"written": 2, "duplicates": 1, "dropped": 1}
+    assert list(Reading.objects.filter(sensor=s).order_by("timestamp").values_list("temperature", flat=True)) == [20.0, 21.0]
+    s.refresh_from_db()
+    assert (s.reading_count, s.last_temperature) == (2, 21.0)
+
+    status = client.get("/api/ingest/queue", **bearer(key)).json()
+    assert (status["depth"], status["written"], status["flushes"]) == (0, 2, 1)
+    assert status["last_flush_at"] is not None
+
+@pytest.mark.django_db
+def test_full_queue_answers_503(client, queue, owner, settings):
+    settings.INGEST_QUEUE_MAX_SIZE = 2
+    u, key = owner
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    assert post(client, key, s, 1).status_code == 202
+    assert post(client, key, s, 2).status_code == 202
+    res = post(client, key, s, 3)
+    assert res.status_code == 503
+    assert res["Retry-After"] == "1"
+
+    ingestqueue.flush()
+    assert post(client, key, s, 3).status_code == 202
+
+@pytest.mark.django_db
+def test_replay_after_crash_writes_nothing_twice(client, queue, owner, monkeypatch):
+    u, key = owner
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    post(client, key, s, 1)
+    post(client, key, s, 2)
+
+    # The worker dies after the database commit, before the rows leave the queue
+    def crash(*args):
+        raise RuntimeError("worker killed")
+    with monkeypatch.context() as m:
+        m.setattr(ingestqueue, "_add_stat", crash)
+        with pytest.raises(RuntimeError):
+            ingestqueue.flush()
+    assert Reading.objects.filter(sensor=s).count() == 2
+    assert ingestqueue.depth() == 2
+
+    assert ingestqueue.flush() == {"written": 0, "duplicates": 2, "dropped": 0}
+    assert Reading.objects.filter(sensor=s).count() == 2
+    s.refresh_from_db()
+    assert s.reading_count == 2
+    assert ingestqueue.depth() == 0
@@ -0,0 +1,83 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import AsyncClient
+from rest_framework.authtoken.models import Token
+from core import metrics
+from core.models import Sensor
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+@pytest.fixture
+def enabled(settings):
+    settings.METRICS_ENABLED = True
+    settings.METRICS_TOKEN = "scrape-secret"
+    metrics.registry.clear()
+    yield
+    metrics.registry.clear()
+
+def sample(text, line_start):
+    # Value of the first exposition line starting with line_start
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"No sample {line_start!r} in:\n{text}")
+
+@pytest.mark.django_db
+def test_metrics_count_requests_queries_and_sizes(client, enabled):
+    u = User.objects.create_user(username="metrics_user", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+
+    for _ in range(2):
+        assert client.get(f"/api/sensors/{s.id}", **bearer(key)).status_code == 200
+    assert client.get("/api/sensors/999999", **bearer(key)).status_code == 404
+    assert client.get("/nowhere").status_code == 404
+
+    res = client.get("/api/metrics", **bearer("scrape-secret"))
+    assert res.status_code == 200
+    assert res["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = res.content.decode()
+
+    route = 'method="GET",route="api/sensors/<sensor_id>"'
+    assert sample(text, f'http_requests_total{{{route},status="200"}}') == 2
+    assert sample(text, f'http_requests_total{{{route},status="404"}}') == 1
+    assert sample(text, 'http_requests_total{method="GET",route="unmatched",status="404"}') == 1
+    assert sample(text, f"http_request_duration_seconds_count{{{route}}}") == 3
+    assert sample(text, f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 3
+    # The first request looks up the token and the sensor, later ones are served by the auth cache
+    assert sample(text, f"http_request_db_queries_sum{{{route}}}") >= 2
+    assert sample(text, f"http_request_db_seconds_total{{{route}}}") > 0
+    assert sample(text, f"http_response_size_bytes_sum{{{route}}}") > 0
+    # The recorder stays in place when other code adds and removes its own execute wrappers
+    with connection.execute_wrapper(lambda execute, *args: execute(*args)):
+        pass
+    assert connection.execute_wrappers[0] is metrics._record_query
+
+@pytest.mark.django_db
+def test_metrics_endpoint_access(client, settings, enabled):
+    u = User.objects.create_user(username="plain", password="p")
+    key = Token.objects.create(user=u).key
+    staff = User.objects.create_user(username="staff", password="p", is_staff=True)
+    staff_key = Token.objects.create(user=staff).key
+
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", **bearer(key)).status_code == 401
+    assert client.get("/api/metrics", **bearer(staff_key)).status_code == 200
+
+    settings.METRICS_ENABLED = False
+    assert client.get("/api/metrics", **bearer("scrape-secret")).status_code == 404
+
+@pytest.mark.django_db(transaction=True)
+def test_metrics_under_asgi(enabled):
+    # Queries of views run under the ASGI handler happen in a worker thread and still count
+    u = User.objects.create_user(username="asgi_metrics", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    res = async_to_sync(AsyncClient().get)(f"/api/sensors/{s.id}", headers={"Authorization": f"Bearer {key}"})
+    assert res.status_code == 200
+    text = metrics.registry.render()
+    assert sample(text, 'http_request_db_queries_sum{method="GET",route="api/sensors/<sensor_id>"}') == 2
@@ -0,0 +1,69 @@
+import pytest
+import csv
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from core import partitions
+from core.models import Sensor, Reading, ReadingRollup
+from core.ingest import record_written
+from datetime import datetime, timezone
+
+NOW = datetime(2024, 6, 15, 12, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def old_and_new(db):
+    # One sensor with readings in January, March and June 2024
+    u = User.objects.create_user(username="retention", password="p")
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    readings = [
+        Reading(sensor=s, temperature=20 + i, humidity=50.0, timestamp=datetime(2024, month, 1 + i, tzinfo=timezone.utc))
+        for month in (1, 3, 6)
+        for i in range(3)
+    ]
+    Reading.objects.bulk_create(readings)
+    record_written(s, readings)
+    return s
+
+def test_month_helpers():
+    assert partitions.month_start(datetime(2024, 2, 29, 23, 59, tzinfo=timezone.utc)) == datetime(2024, 2, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(datetime(2024, 11, 1, tzinfo=timezone.utc), 3) == datetime(2025, 2, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(datetime(2024, 1, 1, tzinfo=timezone.utc), -1) == datetime(2023, 12, 1, tzinfo=timezone.utc)
+    assert partitions.retention_cutoff(3, NOW) == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert partitions.partition_name(datetime(2024, 3, 1, tzinfo=timezone.utc)) == "core_reading_p2024_03"
+
+@pytest.mark.django_db
+def test_expire_deletes_old_readings_in_chunks(old_and_new, tmp_path):
+    # Without partitions old readings are archived and deleted in chunks, rollups stay
+    rollups_before = ReadingRollup.objects.count()
+    recent = Sensor.objects.create(name="Recent", type="Env", owner=old_and_new.owner)
+    Reading.objects.create(sensor=recent, temperature=20.0, timestamp=NOW)
+    removed = partitions.expire(3, archive_dir=str(tmp_path), chunk_size=2, now=NOW)
+
+    assert removed == [("core_reading", 3)]
+    left = sorted(Reading.objects.filter(sensor=old_and_new).values_list("timestamp__month", flat=True))
+    assert left == [3, 3, 3, 6, 6, 6]
+    # Only the sensor that lost readings is recounted and gets a new readings version
+    old_and_new.refresh_from_db()
+    recent.refresh_from_db()
+    assert old_and_new.reading_count == 6
+    assert (recent.readings_version, recent.reading_count) == (0, 0)
+    assert ReadingRollup.objects.count() == rollups_before
+
+    with open(tmp_path / "core_reading-before-2024_03.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["timestamp"][:10] for row in rows] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert rows[0]["sensor_id"] == str(old_and_new.id)
+
+@pytest.mark.django_db
+def test_manage_partitions_command(old_and_new):
+    out = StringIO()
+    call_command("manage_partitions", retention_months=0, stdout=out)
+    assert "Retention disabled" in out.getvalue()
+    assert Reading.objects.count() == 9
+
+    # Nothing is older than 1000 months
+    out = StringIO()
+    call_command("manage_partitions", retention_months=1000, stdout=out)
+    assert "not partitioned" in out.getvalue()
+    assert "removed: 0" in out.getvalue()
+    assert Reading.objects.count() == 9
@@ -0,0 +1,93 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.utils import timezone as dj_timezone
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from core import authcache, purge
+from core.models import Sensor, Reading, ReadingRollup
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+@pytest.fixture
+def sensor_with_readings(client):
+    u = User.objects.create_user(username="purge_user", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="Doomed", type="Env", owner=u)
+    rows = [{"temperature": 20.0 + i, "timestamp": (START + timedelta(minutes=i)).isoformat()} for i in range(5)]
+    client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps(rows), content_type="application/json", **bearer(key))
+    return s, key
+
+@pytest.mark.django_db
+def test_deleted_sensor_is_hidden_at_once(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    assert client.get(f"/api/sensors/{s.id}", **bearer(key)).status_code == 200  # Now in the auth cache
+
+    assert client.delete(f"/api/sensors/{s.id}", **bearer(key)).status_code == 202
+    assert client.get(f"/api/sensors/{s.id}", **bearer(key)).status_code == 404
+    assert client.get(f"/api/sensors/{s.id}/readings", **bearer(key)).status_code == 404
+    assert client.get("/api/sensors", **bearer(key)).json()["items"] == []
+    assert client.get("/api/sensors/summary", **bearer(key)).json() == []
+    assert client.delete(f"/api/sensors/{s.id}", **bearer(key)).status_code == 404
+    # Still in the table with its readings until the purge runs
+    assert Sensor.all_objects.filter(pk=s.id).exists()
+    assert Reading.objects.filter(sensor_id=s.id).count() == 5
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("response_cache_ttl", [60, 0])
+def test_sensor_deleted_by_another_process_is_not_served_from_the_cache(client, sensor_with_readings, settings,
+                                                                         response_cache_ttl):
+    s, key = sensor_with_readings
+    settings.READINGS_CACHE_TTL = response_cache_ttl
+    # What another worker's DELETE leaves behind: the row is marked, this process's caches aren't told
+    Sensor.all_objects.filter(pk=s.id).update(deleted_at=dj_timezone.now())
+
+    def cached():
+        # As if this process had looked the sensor up before the delete
+        authcache.sensors.set((s.owner_id, s.id), s)
+        authcache.names.set((s.owner_id, s.name), s)
+
+    def post(path, body):
+        cached()
+        return client.post(path, data=json.dumps(body), content_type="application/json", **bearer(key))
+
+    reading = {"temperature": 30.0, "timestamp": (START + timedelta(hours=1)).isoformat()}
+    assert post(f"/api/sensors/{s.id}/readings", reading).status_code == 404
+    assert post(f"/api/sensors/{s.id}/readings/batch", [reading]).status_code == 404
+    assert post("/api/readings/batch", [{**reading, "device_id": s.name}]).status_code == 409
+    retry = client.post("/api/readings/batch", data=json.dumps([{**reading, "device_id": s.name}]),
+                        content_type="application/json", **bearer(key))
+    assert retry.json()["devices"][0]["skipped"] == 1  # The name cache no longer has the device
+    assert Reading.objects.filter(sensor_id=s.id).count() == 5  # Nothing was kept
+
+    for path in ("", "/readings/aggregate", "/readings/downsample", "/readings/export", "/readings/stats"):
+        cached()
+        assert client.get(f"/api/sensors/{s.id}{path}", **bearer(key)).status_code == 404, path
+
+@pytest.mark.django_db
+def test_purge_removes_readings_in_chunks_and_resumes(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    kept = Sensor.objects.create(name="Kept", type="Env", owner=s.owner)
+    Reading.objects.create(sensor=kept, temperature=1.0, timestamp=START)
+    client.delete(f"/api/sensors/{s.id}", **bearer(key))
+
+    # A run that stopped after one chunk
+    assert purge.purge_chunk(s.id, chunk_size=2) == 2
+    assert Sensor.all_objects.get(pk=s.id).reading_count == 3
+
+    progress = []
+    removed = purge.purge_sensor(purge.pending().get(), chunk_size=2, on_chunk=lambda sensor, n, left: progress.append((n, left)))
+    assert removed == 3
+    assert progress == [(2, 1), (1, 0)]
+    assert not Sensor.all_objects.filter(pk=s.id).exists()
+    assert not Reading.objects.filter(sensor_id=s.id).exists()
+    assert not ReadingRollup.objects.filter(sensor_id=s.id).exists()
+    assert Reading.objects.filter(sensor=kept).count() == 1
+
+    call_command("purge_deleted_sensors")  # Nothing left to do
+    assert Sensor.objects.filter(pk=kept.id).exists()
@@ -106,4 +106,60 @@ def test_create_reading_requires_auth_and_allows_with_token(client):
     assert r_ok.status_code in (200, 201)
     data = r_ok.json()
     assert float(data["temperature"]) == 21.5
-    assert float(data["humidity"]) == 50.0
\ No newline at end of file
+    assert float(data["humidity"]) == 50.0
+
+@pytest.mark.django_db
+def test_readings_keyset_pagination(client):
+    """GET /api/sensors/{id}/readings pages with limit and the X-Next-Cursor header"""
+
+    u = User.objects.create_user(username="pager", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+
+    # Five readings one minute apart
+    now = timezone.now()
+    created = [
+        Reading.objects.create(sensor=s, temperature=20 + i, humidity=40, timestamp=now - timedelta(minutes=i))
+        for i in range(5)
+    ]
+
+    # Walk through all pages, two readings at a time
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get(f"/api/sensors/{s.id}/readings", params, **bearer(tok.key))
+        assert res.status_code == 200
+        seen += [r["id"] for r in res.json()]
+        pages += 1
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    # Newest first, no reading skipped or repeated
+    assert seen == [r.id for r in created]
+    assert pages == 3
+
+    # A broken cursor is rejected
+    res = client.get(f"/api/sensors/{s.id}/readings", {"cursor": "nope"}, **bearer(tok.key))
+    assert res.status_code == 400
+
+
+@pytest.mark.django_db
+def test_readings_page_size_is_capped(client, settings):
+    """The server never returns more than READINGS_MAX_PAGE_SIZE readings"""
+
+    settings.READINGS_MAX_PAGE_SIZE = 2
+    u = User.objects.create_user(username="capped", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    now = timezone.now()
+    for i in range(3):
+        Reading.objects.create(sensor=s, temperature=20, timestamp=now - timedelta(minutes=i))
+
+    # Asking for more than the cap still gives a capped page and a cursor
+    res = client.get(f"/api/sensors/{s.id}/readings", {"limit": 100}, **bearer(tok.key))
+    assert res.status_code == 200
+    assert len(res.json()) == 2
+    assert res.headers.get("X-Next-Cursor")
@@ -0,0 +1,89 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def post_batch(client, s, key, minutes):
+    # Helper: writes one reading per minute offset through the batch endpoint
+    items = [{"temperature": 20.0 + m, "timestamp": (START + timedelta(minutes=m)).isoformat()} for m in minutes]
+    res = client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps(items),
+                      content_type="application/json", **bearer(key))
+    assert res.status_code == 200
+
+@pytest.fixture
+def user_sensor(db):
+    u = User.objects.create_user(username="cache_user", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S1", type="Env", owner=u)
+    return u, s, tok.key
+
+@pytest.mark.django_db
+def test_readings_page_cached_until_next_write(client, user_sensor, django_assert_num_queries):
+    u, s, key = user_sensor
+    post_batch(client, s, key, [0, 1, 2])
+    url = f"/api/sensors/{s.id}/readings?limit=2"
+
+    first = client.get(url, **bearer(key))
+    # Only the version lookup runs on a hit, same body and cursor as before
+    with django_assert_num_queries(1):
+        second = client.get(url, **bearer(key))
+    assert second.content == first.content
+    assert second["X-Next-Cursor"] == first["X-Next-Cursor"]
+    assert second["ETag"] == first["ETag"]
+
+    # Query parameter order doesn't matter
+    with django_assert_num_queries(1):
+        client.get(f"/api/sensors/{s.id}/readings?limit=2&", **bearer(key))
+
+    post_batch(client, s, key, [3])
+    res = client.get(url, **bearer(key))
+    assert [r["temperature"] for r in res.json()] == [23.0, 22.0]
+
+@pytest.mark.django_db
+def test_aggregate_and_downsample_cached(client, user_sensor, django_assert_num_queries):
+    u, s, key = user_sensor
+    post_batch(client, s, key, [0, 1])
+    aggregate = f"/api/sensors/{s.id}/readings/aggregate?bucket=1h"
+    downsample = f"/api/sensors/{s.id}/readings/downsample?max_points=10"
+
+    assert client.get(aggregate, **bearer(key)).json()["buckets"][0]["count"] == 2
+    assert len(client.get(downsample, **bearer(key)).json()) == 2
+    with django_assert_num_queries(1):
+        assert client.get(aggregate, **bearer(key)).json()["buckets"][0]["count"] == 2
+    with django_assert_num_queries(1):
+        assert len(client.get(downsample, **bearer(key)).json()) == 2
+
+    payload = {"temperature": 30.0, "timestamp": (START + timedelta(minutes=5)).isoformat()}
+    client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(payload), content_type="application/json", **bearer(key))
+    assert client.get(aggregate, **bearer(key)).json()["buckets"][0]["count"] == 3
+    assert len(client.get(downsample, **bearer(key)).json()) == 3
+
+@pytest.mark.django_db
+def test_deleted_sensor_not_served_from_cache(client, user_sensor):
+    u, s, key = user_sensor
+    post_batch(client, s, key, [0])
+    url = f"/api/sensors/{s.id}/readings"
+    assert len(client.get(url, **bearer(key)).json()) == 1
+
+    assert client.delete(f"/api/sensors/{s.id}", **bearer(key)).status_code == 202
+    assert client.get(url, **bearer(key)).status_code == 404
+
+@pytest.mark.django_db
+def test_cache_can_be_turned_off(client, user_sensor, settings):
+    settings.READINGS_CACHE_TTL = 0
+    u, s, key = user_sensor
+    post_batch(client, s, key, [0])
+    url = f"/api/sensors/{s.id}/readings"
+    assert len(client.get(url, **bearer(key)).json()) == 1
+
+    # Written without bumping the version, only visible because nothing was cached
+    Reading.objects.create(sensor=s, temperature=25.0, timestamp=START + timedelta(minutes=1))
+    assert len(client.get(url, **bearer(key)).json()) == 2
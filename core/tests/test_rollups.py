@@ -0,0 +1,121 @@
+import pytest
+import importlib
+import json
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from core import rollups
+from core.models import Sensor, Reading, ReadingRollup
+from datetime import datetime, timedelta, timezone
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def rollup_values():
+    # Helper: all rollup rows as comparable tuples
+    return sorted(
+        ReadingRollup.objects.values_list(
+            "sensor_id", "resolution", "bucket_start", "count", "temperature_sum", "temperature_min",
+            "temperature_max", "humidity_count", "humidity_sum",
+        )
+    )
+
+@pytest.fixture
+def sensor_with_token(db):
+    # Create a user with a token and one sensor
+    u = User.objects.create_user(username="rollups", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    return s, tok.key
+
+def post_readings(client, s, key, start, minutes):
+    # Helper: uploads one reading per minute through the batch endpoint
+    payload = [
+        {
+            "temperature": 20 + (i % 7),
+            "humidity": None if i % 5 == 0 else 40.0 + i % 3,
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in minutes
+    ]
+    res = client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps(payload),
+                      content_type="application/json", **bearer(key))
+    assert res.status_code == 200
+
+
+@pytest.mark.django_db
+def test_ingest_keeps_rollups_equal_to_rebuild(client, sensor_with_token):
+    """Rollups written incrementally by the API match a full rebuild from raw readings"""
+    s, key = sensor_with_token
+    start = datetime(2024, 8, 1, 22, 0, tzinfo=timezone.utc)
+
+    # Two overlapping batches across midnight, plus one single reading
+    post_readings(client, s, key, start, range(0, 90))
+    post_readings(client, s, key, start, range(60, 180))
+    res = client.post(
+        f"/api/sensors/{s.id}/readings",
+        data={"temperature": 30.0, "timestamp": (start + timedelta(hours=5)).isoformat()},
+        content_type="application/json",
+        **bearer(key),
+    )
+    assert res.status_code == 201
+
+    # 3 hours of minute data + 1 reading: hourly buckets 22, 23, 00 and 03, daily 1 Aug and 2 Aug
+    hourly = ReadingRollup.objects.filter(sensor=s, resolution=ReadingRollup.HOUR)
+    assert sorted(r.count for r in hourly) == [1, 60, 60, 60]
+    daily = ReadingRollup.objects.filter(sensor=s, resolution=ReadingRollup.DAY)
+    assert sum(r.count for r in daily) == Reading.objects.filter(sensor=s).count() == 181
+
+    incremental = rollup_values()
+    call_command("rebuild_rollups")
+    assert rollup_values() == pytest.approx(incremental)
+
+
+@pytest.mark.django_db
+def test_aggregate_reads_rollups_when_they_fit(client, sensor_with_token):
+    """Aligned day buckets come from the rollups, unaligned ranges from raw readings"""
+    s, key = sensor_with_token
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    post_readings(client, s, key, start, range(0, 48 * 60, 30))  # Two days, every 30 minutes
+
+    url = f"/api/sensors/{s.id}/readings/aggregate"
+    aligned = {
+        "bucket": "1d",
+        "timestamp_from": start.isoformat(),
+        "timestamp_to": (start + timedelta(days=1)).isoformat(),
+    }
+    expected = client.get(url, aligned, **bearer(key)).json()
+    # The range end is inclusive, so the first reading of 2 Aug is counted too
+    assert [b["count"] for b in expected["buckets"]] == [48, 1]
+
+    # Remove raw readings of the first day behind the API's back, day buckets still answer
+    Reading.objects.filter(sensor=s, timestamp__lt=start + timedelta(days=1)).delete()
+    assert client.get(url, aligned, **bearer(key)).json() == expected
+
+    # A range that doesn't start on a day boundary has to use raw readings
+    unaligned = dict(aligned, timestamp_from=(start + timedelta(minutes=1)).isoformat())
+    assert [b["count"] for b in client.get(url, unaligned, **bearer(key)).json()["buckets"]] == [1]
+
+@pytest.mark.django_db
+def test_rollup_migration_fills_in_stored_readings(client, sensor_with_token):
+    """Readings stored before the rollup table existed get the rollups that rebuild computes"""
+    s, key = sensor_with_token
+    start = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    Reading.objects.bulk_create([
+        Reading(sensor=s, temperature=20.0 + i % 3, humidity=None if i % 4 else 40.0 + i % 5, timestamp=start + timedelta(minutes=i))
+        for i in range(120)
+    ])
+    url = f"/api/sensors/{s.id}/readings/aggregate"
+    aligned = {"bucket": "1h", "timestamp_from": start.isoformat(), "timestamp_to": (start + timedelta(hours=2)).isoformat()}
+    assert client.get(url, aligned, **bearer(key)).json()["buckets"] == []
+
+    importlib.import_module("core.migrations.0003_readingrollup").backfill_rollups(apps, None)
+    cache.clear()  # Migrations run before anything is cached
+    assert [b["count"] for b in client.get(url, aligned, **bearer(key)).json()["buckets"]] == [60, 60]
+    columns = ("sensor_id", "resolution", "bucket_start", *rollups.STAT_FIELDS)
+    backfilled = sorted(ReadingRollup.objects.values_list(*columns))
+    rollups.rebuild()
+    assert sorted(ReadingRollup.objects.values_list(*columns)) == backfilled
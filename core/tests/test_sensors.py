@@ -1,7 +1,10 @@
 import pytest
 import json
 from django.contrib.auth.models import User
+from django.db import connection
 from rest_framework.authtoken.models import Token
+from core.search import search_sensors
+from core.models import Sensor
 
 @pytest.mark.django_db
 def test_create_sensor_requires_auth(client):
@@ -32,4 +35,48 @@ def test_create_sensor_with_auth(client):
     # Should return 200 or 201 if sensor is created successfully
     assert res.status_code in (200, 201)
     data = res.json()
-    assert data["name"] == "Living Room"
\ No newline at end of file
+    assert data["name"] == "Living Room"
+
+@pytest.mark.django_db
+def test_list_sensors_cursor_mode(client, django_assert_num_queries):
+    """GET /api/sensors?cursor= pages by id without counting"""
+    user = User.objects.create_user(username="keyset_user", password="pw")
+    token, _ = Token.objects.get_or_create(user=user)
+    ids = [Sensor.objects.create(name=f"Room {i}", type="Env", owner=user).id for i in range(5)]
+    auth = {"HTTP_AUTHORIZATION": f"Bearer {token.key}"}
+    client.get("/api/sensors", **auth) # Fills the token cache
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        with django_assert_num_queries(1) as queries:
+            res = client.get(f"/api/sensors?cursor={cursor}&limit=2", **auth)
+        assert "COUNT" not in queries.captured_queries[0]["sql"].upper()
+        assert res.status_code == 200
+        assert "count" not in res.json()
+        seen += [s["id"] for s in res.json()["items"]]
+        cursor = res.get("X-Next-Cursor")
+    assert seen == ids
+
+    assert client.get("/api/sensors?cursor=nope", **auth).status_code == 400
+    assert client.get("/api/sensors?cursor=&limit=0", **auth).status_code == 400
+
+
+@pytest.mark.django_db
+def test_sensor_search_uses_index(client):
+    """Name/type search matches prefixes on SQLite with the NOCASE indexes"""
+    user = User.objects.create_user(username="search_user", password="pw")
+    token, _ = Token.objects.get_or_create(user=user)
+    Sensor.objects.create(name="Kitchen", type="Env", owner=user)
+    Sensor.objects.create(name="Hall", type="Kitchen-air", owner=user)
+    Sensor.objects.create(name="Basement", type="Env", owner=user)
+
+    res = client.get("/api/sensors?q=kit", HTTP_AUTHORIZATION=f"Bearer {token.key}")
+    assert sorted(s["name"] for s in res.json()["items"]) == ["Hall", "Kitchen"]
+    res = client.get("/api/sensors?q=kit&cursor=", HTTP_AUTHORIZATION=f"Bearer {token.key}")
+    assert len(res.json()["items"]) == 2
+
+    if connection.vendor == "sqlite":
+        plan = search_sensors(Sensor.objects.filter(owner=user), "kit").explain()
+        assert "sensor_name_search_idx" in plan
+        assert "sensor_type_search_idx" in plan
@@ -0,0 +1,96 @@
+import pytest
+import json
+import statistics
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from core.models import Sensor
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+TEMPERATURES = [21.5, 19.0, 24.0, 22.0, 19.0, 24.0, 20.5, 23.0]
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def at(minute):
+    return (START + timedelta(minutes=minute)).isoformat()
+
+def upload(client, key, sensor, rows):
+    return client.post(f"/api/sensors/{sensor.id}/readings/batch", data=json.dumps(rows),
+                       content_type="application/json", **bearer(key))
+
+def get_stats(client, key, sensor, **params):
+    return client.get(f"/api/sensors/{sensor.id}/readings/stats", params, **bearer(key))
+
+@pytest.fixture
+def sensor_with_readings(client):
+    u = User.objects.create_user(username="stats_user", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    rows = [{"timestamp": at(i), "temperature": t, "humidity": 40.0 + i if i % 2 else None}
+            for i, t in enumerate(TEMPERATURES)]
+    upload(client, key, s, rows)
+    return s, key
+
+@pytest.mark.django_db
+def test_stats_of_a_window(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    res = get_stats(client, key, s)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["count"] == 8
+    assert (body["first_timestamp"], body["last_timestamp"]) == ("2024-08-01T00:00:00Z", "2024-08-01T00:07:00Z")
+
+    t = body["temperature"]
+    assert t["count"] == 8
+    assert t["mean"] == pytest.approx(statistics.fmean(TEMPERATURES))
+    assert t["stddev"] == pytest.approx(statistics.stdev(TEMPERATURES))
+    # Ties go to the first reading that reached the extreme
+    assert (t["min"], t["min_at"], t["max"], t["max_at"]) == (19.0, "2024-08-01T00:01:00Z", 24.0, "2024-08-01T00:02:00Z")
+    # Linear interpolation between the closest ranks, like percentile_cont
+    assert (t["p5"], t["p25"], t["p50"], t["p75"], t["p95"]) == pytest.approx((19.0, 20.125, 21.75, 23.25, 24.0))
+
+    h = body["humidity"]
+    assert (h["count"], h["min"], h["max"], h["max_at"]) == (4, 41.0, 47.0, "2024-08-01T00:07:00Z")
+    assert h["p50"] == pytest.approx(44.0)
+
+    body = get_stats(client, key, s, timestamp_from=at(2), timestamp_to=at(3)).json()
+    assert body["count"] == 2
+    assert body["temperature"]["mean"] == pytest.approx(23.0)
+    assert body["humidity"]["stddev"] is None  # A single value
+
+    body = get_stats(client, key, s, timestamp_from=at(100)).json()
+    assert body["count"] == 0
+    assert body["temperature"] == {"count": 0, "mean": None, "stddev": None, "min": None, "min_at": None,
+                                   "max": None, "max_at": None, "p5": None, "p25": None, "p50": None, "p75": None, "p95": None}
+
+    assert get_stats(client, key, s, timestamp_to="yesterday").status_code == 400
+
+@pytest.mark.django_db
+def test_closed_windows_stay_cached_while_new_readings_arrive(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    closed = {"timestamp_from": at(0), "timestamp_to": at(3)}
+    first = get_stats(client, key, s, **closed).json()
+    open_window = get_stats(client, key, s).json()
+
+    upload(client, key, s, [{"timestamp": at(10), "temperature": 30.0}])
+    with CaptureQueriesContext(connection) as ctx:
+        assert get_stats(client, key, s, **closed).json() == first
+    assert not any("core_reading" in q["sql"] for q in ctx.captured_queries)  # Served from the cache
+    assert get_stats(client, key, s).json()["count"] == open_window["count"] + 1
+
+    # A late reading inside the window invalidates it
+    upload(client, key, s, [{"timestamp": (START + timedelta(minutes=1, seconds=30)).isoformat(), "temperature": 10.0}])
+    body = get_stats(client, key, s, **closed).json()
+    assert (body["count"], body["temperature"]["min"]) == (5, 10.0)
+
+@pytest.mark.django_db
+def test_naive_window_end_is_taken_in_the_default_time_zone(client, sensor_with_readings):
+    s, key = sensor_with_readings
+    naive = (START + timedelta(minutes=3)).replace(tzinfo=None).isoformat()
+    res = get_stats(client, key, s, timestamp_to=naive)
+    assert res.status_code == 200
+    assert res.json()["count"] == 4
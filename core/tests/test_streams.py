@@ -0,0 +1,126 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core.models import Sensor
+from core.pubsub import Hub, hub
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def events(chunk):
+    # Helper: parses the reading events of one stream chunk into (id, data) pairs
+    found = []
+    for block in chunk.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if fields.get("event") == "reading":
+            found.append((int(fields["id"]), json.loads(fields["data"])))
+    return found
+
+def post_reading(client, s, key, minute, temperature=20.0):
+    # Helper: creates one reading through the API
+    payload = {"temperature": temperature, "timestamp": (START + timedelta(minutes=minute)).isoformat()}
+    res = client.post(f"/api/sensors/{s.id}/readings", data=json.dumps(payload),
+                      content_type="application/json", **bearer(key))
+    assert res.status_code == 201
+    return res.json()["id"]
+
+@pytest.fixture
+def sensor_with_token(db, settings):
+    # Create a user with a token and a sensor, and keep stream waits short
+    settings.SSE_HEARTBEAT_SECONDS = 0.05
+    u = User.objects.create_user(username="streamer", password="p")
+    tok, _ = Token.objects.get_or_create(user=u)
+    s = Sensor.objects.create(name="S", type="Env", owner=u)
+    return s, tok.key
+
+def test_subscription_coalesces_backlog_of_slow_client():
+    h = Hub()
+    sub = h.subscribe([("sensor", 1)], maxsize=2)
+    h.publish([("sensor", 1), ("user", 9)], [(1, b"a"), (2, b"b")])
+    assert sub.take() == ([(1, b"a"), (2, b"b")], False)
+
+    # A third event while two wait: the backlog is dropped and the consumer must catch up
+    h.publish([("sensor", 1)], [(3, b"c"), (4, b"d"), (5, b"e")])
+    assert sub.take() == ([], True)
+    assert sub.dropped == 3
+
+    sub.close()
+    assert h.stats() == {"topics": 0, "subscribers": 0}
+
+@pytest.mark.django_db
+def test_sensor_stream_pushes_committed_readings(client, sensor_with_token, django_capture_on_commit_callbacks):
+    s, key = sensor_with_token
+    res = client.get(f"/api/sensors/{s.id}/readings/stream", **bearer(key))
+    assert res.status_code == 200
+    assert res["Content-Type"] == "text/event-stream"
+    stream = iter(res.streaming_content)
+    assert next(stream) == b"retry: 3000\n\n"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        reading_id = post_reading(client, s, key, 0, temperature=21.5)
+    received = events(next(stream))
+    assert [(event_id, data["temperature"], data["sensor_id"]) for event_id, data in received] == [(reading_id, 21.5, s.id)]
+    assert received[0][1]["timestamp"] == "2024-08-01T00:00:00Z"
+
+    # Nothing new: a keepalive comment
+    assert next(stream) == b": keepalive\n\n"
+    res.close()
+    assert hub.stats()["subscribers"] == 0
+
+@pytest.mark.django_db
+def test_stream_resumes_after_last_event_id(client, sensor_with_token):
+    s, key = sensor_with_token
+    ids = [post_reading(client, s, key, minute) for minute in range(4)]
+
+    res = client.get(f"/api/sensors/{s.id}/readings/stream", HTTP_LAST_EVENT_ID=str(ids[1]), **bearer(key))
+    stream = iter(res.streaming_content)
+    first = next(stream)
+    assert first.startswith(b"retry: 3000\n\n")
+    assert [event_id for event_id, _ in events(first)] == ids[2:]
+    res.close()
+
+@pytest.mark.django_db
+def test_stream_catches_up_from_database_after_overflow(client, sensor_with_token, settings, django_capture_on_commit_callbacks):
+    s, key = sensor_with_token
+    settings.SSE_QUEUE_SIZE = 2
+    res = client.get(f"/api/sensors/{s.id}/readings/stream?token={key}")  # EventSource style auth
+    assert res.status_code == 200
+    stream = iter(res.streaming_content)
+    next(stream)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ids = [post_reading(client, s, key, minute) for minute in range(5)]
+    assert [event_id for event_id, _ in events(next(stream))] == ids
+    res.close()
+
+    # A gap larger than SSE_REPLAY_LIMIT tells the client to reload instead
+    settings.SSE_REPLAY_LIMIT = 3
+    res = client.get(f"/api/sensors/{s.id}/readings/stream?last_event_id=0", **bearer(key))
+    stream = iter(res.streaming_content)
+    assert next(stream) == b"retry: 3000\n\nevent: reset\ndata: {}\n\n"
+    res.close()
+
+@pytest.mark.django_db
+def test_user_stream_covers_own_sensors_only(client, sensor_with_token, django_capture_on_commit_callbacks):
+    s, key = sensor_with_token
+    s2 = Sensor.objects.create(name="S2", type="Env", owner=s.owner)
+    other = User.objects.create_user(username="other", password="p")
+    other_key = Token.objects.create(user=other).key
+    other_sensor = Sensor.objects.create(name="O", type="Env", owner=other)
+
+    assert client.get("/api/readings/stream").status_code == 401
+    res = client.get("/api/readings/stream", **bearer(key))
+    stream = iter(res.streaming_content)
+    next(stream)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        post_reading(client, s, key, 0)
+        post_reading(client, s2, key, 0)
+        post_reading(client, other_sensor, other_key, 0)
+    assert sorted(data["sensor_id"] for _, data in events(next(stream))) == [s.id, s2.id]
+    res.close()
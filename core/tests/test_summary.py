@@ -0,0 +1,63 @@
+import pytest
+import json
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from core import partitions
+from core.models import Sensor, Reading
+from datetime import datetime, timedelta, timezone
+
+START = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+def bearer(t):
+    # Helper: adds the authorization header with the user's token
+    return {"HTTP_AUTHORIZATION": f"Bearer {t}"}
+
+def at(minute):
+    return (START + timedelta(minutes=minute)).isoformat()
+
+@pytest.mark.django_db
+def test_summary_follows_every_ingest_path(client, django_assert_num_queries):
+    u = User.objects.create_user(username="summary_user", password="p")
+    key = Token.objects.create(user=u).key
+    s1 = Sensor.objects.create(name="S1", type="Env", owner=u)
+    s2 = Sensor.objects.create(name="S2", type="Env", owner=u)
+    Sensor.objects.create(name="Other", type="Env", owner=User.objects.create_user(username="other", password="p"))
+
+    client.post(f"/api/sensors/{s1.id}/readings", data=json.dumps({"temperature": 20.0, "humidity": 40, "timestamp": at(5)}),
+                content_type="application/json", **bearer(key))
+    batch = [
+        {"temperature": 21.0, "humidity": None, "timestamp": at(10)},
+        {"temperature": 19.0, "timestamp": at(1)},
+        {"temperature": 99.0, "timestamp": "bad"},
+    ]
+    client.post(f"/api/sensors/{s1.id}/readings/batch", data=json.dumps(batch),
+                content_type="application/json", **bearer(key))
+    # A late upload doesn't replace the newest values
+    client.post(f"/api/sensors/{s1.id}/readings", data=json.dumps({"temperature": 15.0, "timestamp": at(0)}),
+                content_type="application/json", **bearer(key))
+
+    with django_assert_num_queries(1):
+        res = client.get("/api/sensors/summary", **bearer(key))
+    assert res.status_code == 200
+    first, second = res.json()
+    assert first["id"] == s1.id
+    assert first["reading_count"] == 4
+    assert first["last_timestamp"] == "2024-08-01T00:10:00Z"
+    assert first["last_temperature"] == 21.0
+    assert first["last_humidity"] is None
+    assert second == {"name": "S2", "type": "Env", "id": s2.id, "reading_count": 0,
+                      "last_timestamp": None, "last_temperature": None, "last_humidity": None}
+
+@pytest.mark.django_db
+def test_retention_recounts_snapshot(client):
+    u = User.objects.create_user(username="summary_user", password="p")
+    key = Token.objects.create(user=u).key
+    s = Sensor.objects.create(name="S1", type="Env", owner=u)
+    batch = [{"temperature": 20.0 + i, "timestamp": (START + timedelta(days=40 * i)).isoformat()} for i in range(3)]
+    client.post(f"/api/sensors/{s.id}/readings/batch", data=json.dumps(batch),
+                content_type="application/json", **bearer(key))
+
+    partitions.expire(1, now=START + timedelta(days=90))
+    s.refresh_from_db()
+    assert s.reading_count == Reading.objects.filter(sensor=s).count() == 2
+    assert s.last_temperature == 22.0
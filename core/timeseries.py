@@ -0,0 +1,90 @@
+# Helpers for time-bucketed aggregation and chart downsampling of readings
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.db import NotSupportedError
+from django.db.models import BigIntegerField, Func
+
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+BUCKET_RE = re.compile(r"^(\d+)([smhd])$")
+
+
+# Parses a bucket size like "30s", "5m", "1h" or "1d" into seconds, raises ValueError if invalid
+def parse_bucket(text):
+    match = BUCKET_RE.match((text or "").strip())
+    if not match or int(match.group(1)) < 1:
+        raise ValueError("Invalid bucket (use a number followed by s, m, h or d, e.g. 5m)")
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+
+
+# Inverse of parse_bucket: 300 -> "5m", 3600 -> "1h", using the largest unit that divides the size
+def format_bucket(seconds):
+    for unit, size in sorted(BUCKET_UNITS.items(), key=lambda item: -item[1]):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+
+
+# Turns the epoch seconds returned by EpochBucket back into a UTC datetime
+def bucket_start(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, tz=dt_timezone.utc)
+
+
+# Database expression for the start of the time bucket a timestamp falls in,
+# as whole seconds since the epoch. Buckets are aligned to 1970-01-01 UTC.
+class EpochBucket(Func):
+    output_field = BigIntegerField()
+
+    def __init__(self, expression, size, **extra):
+        super().__init__(expression, size=int(size), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"Time buckets are not supported on {connection.vendor}")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        template = "(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(size)s) * %(size)s)::bigint"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # "%%%%s" ends up as strftime('%s') after Django's placeholder conversion
+        template = "((CAST(strftime('%%%%s', %(expressions)s) AS INTEGER) / %(size)s) * %(size)s)"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+# Largest-Triangle-Three-Buckets downsampling.
+# Picks at most `threshold` of the given time-ordered points while keeping the visual shape
+# of the line (peaks and dips survive). `xs` and `ys` are the numeric coordinates of the points.
+def lttb(points, xs, ys, threshold):
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)  # Points per bucket, first and last point excluded
+    a = 0  # Index of the previously selected point
+
+    for i in range(threshold - 2):
+        # Average point of the next bucket, used as the third corner of the triangle
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_len = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_len
+        avg_y = sum(ys[avg_start:avg_end]) / avg_len
+
+        # Pick the point in the current bucket that forms the largest triangle
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        max_area = -1.0
+        chosen = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled